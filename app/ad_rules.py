@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import math
+import re
+import shlex
+from typing import Any, Dict, List, Optional, Sequence
+
+from .keywords import KeywordAutomaton
+from .parser import OlxAd
+
+# hryvnias per unit; overridden with FX_RATES
+DEFAULT_RATES = {"UAH": 1.0, "USD": 41.5, "EUR": 45.0}
+
+_CURRENCY_ALIASES = {
+    "uah": "UAH", "грн": "UAH", "₴": "UAH",
+    "usd": "USD", "$": "USD", "дол": "USD",
+    "eur": "EUR", "€": "EUR", "євро": "EUR",
+}
+_FIELD_ALIASES = {"price": "price", "ціна": "price", "цена": "price", "area": "area", "площа": "area"}
+_CONDITION_RE = re.compile(r"^(\w+)(<=|>=|<|>|=)([\d\s.,]+)(?:-([\d\s.,]+))?\s*(\S*)$")
+
+
+def parse_rates(text: str) -> Dict[str, float]:
+    """``"USD=41.5,EUR=45"`` -> hryvnias per unit, on top of DEFAULT_RATES."""
+    rates = dict(DEFAULT_RATES)
+    for item in text.split(","):
+        code, _, value = item.partition("=")
+        if code.strip() and value.strip():
+            rates[code.strip().upper()] = float(value)
+    return rates
+
+
+def _amount(text: str) -> float:
+    return float(text.replace(" ", "").replace(",", "."))
+
+
+def parse_rules(text: str) -> Dict[str, Any]:
+    """Reads rules typed in chat into the dict AdRules.from_dict takes.
+
+    ``ціна<60000$ площа>40 +балкон -подобово``: bounds as ``price``/``ціна`` or
+    ``area``/``площа`` with ``<``, ``>`` or ``=min-max`` (price may end in a currency),
+    ``+word`` for keywords of which the title needs at least one, ``-word`` for
+    keywords that drop the ad; quote phrases with spaces. Raises ValueError.
+    """
+    spec: Dict[str, Any] = {"include": [], "exclude": []}
+    for token in shlex.split(text):
+        if not token:
+            # an empty quoted phrase ("" or '')
+            continue
+        if token[0] in "+-" and token[1:].strip():
+            spec["include" if token[0] == "+" else "exclude"].append(token[1:].strip().lower())
+            continue
+        match = _CONDITION_RE.match(token.lower())
+        field = _FIELD_ALIASES.get(match.group(1)) if match else None
+        if field is None:
+            raise ValueError(f"Не розумію «{token}»")
+        op, first, second, unit = match.group(2), _amount(match.group(3)), match.group(4), match.group(5)
+        if field == "price" and unit:
+            if unit not in _CURRENCY_ALIASES:
+                raise ValueError(f"Невідома валюта «{unit}»")
+            spec["currency"] = _CURRENCY_ALIASES[unit]
+        if op == "=" and second is not None:
+            spec[f"min_{field}"], spec[f"max_{field}"] = first, _amount(second)
+        elif op in ("<", "<="):
+            spec[f"max_{field}"] = first
+        elif op in (">", ">="):
+            spec[f"min_{field}"] = first
+        else:
+            spec[f"min_{field}"] = spec[f"max_{field}"] = first
+    return {k: v for k, v in spec.items() if v not in (None, [])}
+
+
+def _bounds_text(lo: Optional[float], hi: Optional[float], unit: str) -> str:
+    def fmt(value: float) -> str:
+        return f"{value:.0f}" if value == int(value) else f"{value:g}"
+
+    if lo is not None and hi is not None:
+        return f"{fmt(lo)}–{fmt(hi)} {unit}"
+    if hi is not None:
+        return f"до {fmt(hi)} {unit}"
+    return f"від {fmt(lo)} {unit}"
+
+
+class AdRules:
+    """A filter's price, area and keyword rules, compiled once and applied per batch.
+
+    ``apply`` runs one pass per rule over the ads still left, cheapest first, so the
+    keyword automaton only sees ads that passed the numeric bounds. Ads whose price or
+    area could not be read ("Договірна", no area given) are kept rather than dropped.
+    """
+
+    def __init__(
+        self,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        currency: str = "UAH",
+        min_area: Optional[float] = None,
+        max_area: Optional[float] = None,
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        rates: Optional[Dict[str, float]] = None,
+    ):
+        self.min_price, self.max_price, self.currency = min_price, max_price, currency
+        self.min_area, self.max_area = min_area, max_area
+        self.include = KeywordAutomaton(include)
+        self.exclude = KeywordAutomaton(exclude)
+        rates = rates or DEFAULT_RATES
+        # bounds converted into every known currency, so an ad's price needs no conversion
+        self._price_bounds: Dict[str, tuple] = {}
+        if (min_price is not None or max_price is not None) and currency in rates:
+            base = rates[currency]
+            lo = -math.inf if min_price is None else min_price * base
+            hi = math.inf if max_price is None else max_price * base
+            self._price_bounds = {code: (lo / rate, hi / rate) for code, rate in rates.items() if rate > 0}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], rates: Optional[Dict[str, float]] = None) -> "AdRules":
+        data = data or {}
+        return cls(
+            min_price=data.get("min_price"),
+            max_price=data.get("max_price"),
+            currency=data.get("currency", "UAH"),
+            min_area=data.get("min_area"),
+            max_area=data.get("max_area"),
+            include=data.get("include", ()),
+            exclude=data.get("exclude", ()),
+            rates=rates,
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self._price_bounds or self.min_area is not None or self.max_area is not None
+                    or self.include or self.exclude)
+
+    def apply(self, ads: Sequence[OlxAd]) -> List[OlxAd]:
+        kept = list(ads)
+        if self._price_bounds:
+            bounds = self._price_bounds
+            priced = []
+            for ad in kept:
+                value = ad.price_value
+                if value is not None:
+                    lo_hi = bounds.get(ad.currency)
+                    if lo_hi is not None and not lo_hi[0] <= value <= lo_hi[1]:
+                        continue
+                priced.append(ad)
+            kept = priced
+        if self.min_area is not None or self.max_area is not None:
+            lo = -math.inf if self.min_area is None else self.min_area
+            hi = math.inf if self.max_area is None else self.max_area
+            kept = [a for a in kept if a.area_m2 is None or lo <= a.area_m2 <= hi]
+        if self.exclude:
+            search = self.exclude.search
+            kept = [a for a in kept if search(a.title) is None]
+        if self.include:
+            search = self.include.search
+            kept = [a for a in kept if search(a.title) is not None]
+        return kept
+
+    def describe(self) -> str:
+        parts = []
+        if self.min_price is not None or self.max_price is not None:
+            parts.append("ціна " + _bounds_text(self.min_price, self.max_price, self.currency))
+        if self.min_area is not None or self.max_area is not None:
+            parts.append("площа " + _bounds_text(self.min_area, self.max_area, "м²"))
+        if self.include:
+            parts.append("містить: " + ", ".join(self.include.keywords))
+        if self.exclude:
+            parts.append("без: " + ", ".join(self.exclude.keywords))
+        return "; ".join(parts) if parts else "без правил"
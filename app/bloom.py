@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import struct
+from typing import Iterable, Tuple
+
+
+def _hashes(item: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+    h1, h2 = struct.unpack("<QQ", digest)
+    return h1, h2 | 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (Kirsch–Mitzenmacher double hashing)."""
+
+    __slots__ = ("bits", "num_bits", "num_hashes", "count")
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def add(self, item: str) -> None:
+        h1, h2 = _hashes(item)
+        m = self.num_bits
+        bits = self.bits
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % m
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        h1, h2 = _hashes(item)
+        m = self.num_bits
+        bits = self.bits
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % m
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class RotatingBloomFilter:
+    """Two Bloom generations; when the current one fills up, the older one is dropped.
+
+    Memory stays constant, IDs are remembered for at least ``capacity`` insertions,
+    and the combined false-positive rate stays close to ``error_rate``.
+    """
+
+    _HEADER = struct.Struct("<IIdQQ")
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        # each generation gets half the budget since lookups consult both
+        self._current = BloomFilter(self.capacity, error_rate / 2)
+        self._previous = BloomFilter(self.capacity, error_rate / 2)
+
+    def add(self, item: str) -> None:
+        if item in self._current:
+            return
+        if self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate / 2)
+        self._current.add(item)
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._current or item in self._previous
+
+    def nbytes(self) -> int:
+        return len(self._current.bits) + len(self._previous.bits)
+
+    def to_bytes(self) -> bytes:
+        header = self._HEADER.pack(
+            self.capacity, 0, self.error_rate, self._current.count, self._previous.count)
+        return header + bytes(self._current.bits) + bytes(self._previous.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> RotatingBloomFilter:
+        capacity, _, error_rate, current_count, previous_count = cls._HEADER.unpack_from(data)
+        bloom = cls(capacity, error_rate)
+        offset = cls._HEADER.size
+        size = len(bloom._current.bits)
+        bloom._current.bits[:] = data[offset:offset + size]
+        bloom._previous.bits[:] = data[offset + size:offset + 2 * size]
+        bloom._current.count = current_count
+        bloom._previous.count = previous_count
+        return bloom
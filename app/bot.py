@@ -1,45 +1,118 @@
 from __future__ import annotations
 
 import asyncio
+import random
 from typing import Dict, Optional
 import logging
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command, CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message, CallbackQuery, BotCommand
 
 # Support running both as module (python -m app.bot) and as script (python app/bot.py)
 try:
+    from . import metrics
+    from .ad_rules import AdRules, parse_rates, parse_rules
     from .config import load_config
-    from .filters_storage import FiltersStorage
-    from .seen_storage import SeenStorage
+    from .delivery import DeliveryQueue
+    from .driver_pool import DriverPool, set_default_pool
+    from .http_fetch import HttpFetcher
+    from .image_cache import ImageCache
+    from .jobqueue import RedisBroker, RemoteFetcher, SocketBroker, redis_client
+    from .filters_storage import FiltersStorage, KVFiltersStorage
+    from .fingerprints import NEW, PRICE_CHANGED, REPOST, AdEvent, FingerprintStore
+    from .fsm_storage import KVStorage
+    from .kvstore import open_kv
+    from .leases import LeaseManager, default_instance_id, lease_name
+    from .seen_storage import BloomSeenStorage, KVSeenStorage, SeenStorage, SqliteSeenStorage
     from .keyboards import main_menu, filters_menu, filters_delete_menu, tracking_choice_menu, tracking_start_menu
     from .parser import OlxAd
-    from .tracker import Tracker
+    from .resilience import CircuitBreaker
+    from .scheduler import ScrapeScheduler, Subscription, normalize_url
+    from .tracker import AdaptiveInterval
+    from .tracking_storage import KVTrackingStorage, TrackedFilter, TrackingStorage
+    from .webhook import run_webhook
 except Exception:  # noqa: E722
     import os
     import sys
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from app import metrics
+    from app.ad_rules import AdRules, parse_rates, parse_rules
     from app.config import load_config
-    from app.filters_storage import FiltersStorage
-    from app.seen_storage import SeenStorage
+    from app.delivery import DeliveryQueue
+    from app.driver_pool import DriverPool, set_default_pool
+    from app.http_fetch import HttpFetcher
+    from app.image_cache import ImageCache
+    from app.jobqueue import RedisBroker, RemoteFetcher, SocketBroker, redis_client
+    from app.filters_storage import FiltersStorage, KVFiltersStorage
+    from app.fingerprints import NEW, PRICE_CHANGED, REPOST, AdEvent, FingerprintStore
+    from app.fsm_storage import KVStorage
+    from app.kvstore import open_kv
+    from app.leases import LeaseManager, default_instance_id, lease_name
+    from app.seen_storage import BloomSeenStorage, KVSeenStorage, SeenStorage, SqliteSeenStorage
     from app.keyboards import main_menu, filters_menu, filters_delete_menu, tracking_choice_menu, tracking_start_menu
     from app.parser import OlxAd
-    from app.tracker import Tracker
+    from app.resilience import CircuitBreaker
+    from app.scheduler import ScrapeScheduler, Subscription, normalize_url
+    from app.tracker import AdaptiveInterval
+    from app.tracking_storage import KVTrackingStorage, TrackedFilter, TrackingStorage
+    from app.webhook import run_webhook
+
+
+NEW_ADS = metrics.counter("olx_new_ads_total", "New ads found across all chats")
+ADS_DROPPED = metrics.counter("olx_ads_dropped_by_rules_total", "Ads dropped by filters' rules")
+
+RULES_HELP = """<b>Правила фільтра</b> відсіюють оголошення до надсилання:
+<code>/rules Київ-оренда ціна&lt;15000 площа&gt;40 +балкон -подобово</code>
+
+• <code>ціна&lt;60000$</code>, <code>ціна&gt;10000</code>, <code>ціна=10000-20000грн</code>
+• <code>площа&gt;40</code>, <code>площа=40-80</code>
+• <code>+слово</code> — у заголовку має бути хоча б одне з таких слів
+• <code>-слово</code> — оголошення з таким словом не надсилаються
+• фрази з пробілами беріть у лапки: <code>+"нова будова"</code>
+• <code>/rules Київ-оренда off</code> — прибрати правила
+
+Оголошення без ціни чи площі правила ціни та площі не відсіюють."""
+
+
+class NewFilter(StatesGroup):
+    name = State()
+    url = State()
 
 
 class AppState:
-    def __init__(self, filters_file: str, seen_file: str):
-        self.filters = FiltersStorage(filters_file)
-        self.seen = SeenStorage(seen_file)
-        # parallel trackers per chat (limit globally)
-        self.active_trackers: dict[int, Tracker] = {}
+    def __init__(self, filters: FiltersStorage | KVFiltersStorage,
+                 seen: SeenStorage | SqliteSeenStorage | BloomSeenStorage | KVSeenStorage, scheduler: ScrapeScheduler,
+                 delivery: DeliveryQueue, tracking: TrackingStorage | KVTrackingStorage, leases: LeaseManager,
+                 pool: Optional[DriverPool] = None, http_fetcher: Optional[HttpFetcher] = None,
+                 fingerprints: Optional[FingerprintStore] = None):
+        self.filters = filters
+        # what each chat tracks, restored on the next start and shared between instances
+        self.tracking = tracking
+        # feeds this instance scrapes; with a shared STATE_BACKEND other instances take the rest
+        self.leases = leases
+        self.seen = seen
+        # recent ads' title/size/price fingerprints; None when FINGERPRINT_DB is empty
+        self.fingerprints = fingerprints
+        # headless Chrome sessions shared by all trackers
+        self.pool = pool
+        # browserless engine, None when FETCH_ENGINE=selenium
+        self.http_fetcher = http_fetcher
+        # one subscription per chat; the scheduler polls each unique URL once for all chats
+        self.scheduler = scheduler
+        # trackers only enqueue; the delivery queue sends at Telegram-safe rates
+        self.delivery = delivery
+        self.active_trackers: dict[int, Subscription] = {}
         self.active_filters: dict[int, str] = {}
-        self.max_parallel: int = 3
-        # simple per-chat create filter state
-        self.awaiting_name: set[int] = set()
-        self.awaiting_url_for_name: dict[int, str] = {}
+        # compiled rules of each chat's tracked filter
+        self.active_rules: dict[int, AdRules] = {}
+        # the tracking entry each local subscription was started from
+        self.synced: dict[int, TrackedFilter] = {}
 
 
 def format_ad_caption(ad: OlxAd) -> str:
@@ -54,11 +127,60 @@ def format_ad_caption(ad: OlxAd) -> str:
     return "\n".join(parts)
 
 
+CURRENCY_SIGNS = {"UAH": "грн.", "USD": "$", "EUR": "€"}
+# Telegram's limit is 4096; leave room for the header
+CHANGES_MESSAGE_LIMIT = 3900
+
+
+def format_price(value: Optional[float], currency: Optional[str]) -> str:
+    if value is None:
+        return ""
+    amount = f"{value:,.0f}".replace(",", " ") if value == int(value) else f"{value:,.2f}".replace(",", " ")
+    return f"{amount} {CURRENCY_SIGNS.get(currency or '', currency or '')}".strip()
+
+
+def format_changes(events: list[AdEvent]) -> list[str]:
+    """Price changes and re-posts as compact text messages, several ads per message."""
+    lines = []
+    for event in events:
+        ad = event.ad
+        link = f"<a href=\"{ad.url}\">{escape_html(ad.title)}</a>"
+        old = escape_html(format_price(event.old_price, event.old_currency))
+        if event.kind == PRICE_CHANGED:
+            lines.append(f"💸 {link}: {old} → <b>{escape_html(ad.price)}</b>")
+        else:
+            lines.append(f"🔁 {link} — опубліковано повторно, <b>{escape_html(ad.price)}</b>"
+                         + (f" (було {old})" if old else ""))
+    messages, chunk, size = [], [], 0
+    for line in lines:
+        if chunk and size + len(line) > CHANGES_MESSAGE_LIMIT:
+            messages.append("\n".join(chunk))
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        messages.append("\n".join(chunk))
+    return messages
+
+
+def seen_key_owners(filters: FiltersStorage, tracking: TrackingStorage) -> dict[str, list[int]]:
+    """Filter name -> chats that have or track a filter by that name, for importing seen IDs
+    kept per bare filter name."""
+    owners: dict[str, set[int]] = {}
+    for key, space in filters.export().items():
+        if key:
+            for name in space["filters"]:
+                owners.setdefault(name, set()).add(int(key))
+    for chat_id, entry in tracking.all().items():
+        owners.setdefault(entry.filter_name, set()).add(chat_id)
+    return {name: sorted(chats) for name, chats in owners.items()}
+
+
 def escape_html(text: str) -> str:
     return (
         text.replace("&", "&amp;")
-        .replace("<", "<")
-        .replace(">", ">")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
     )
 
 
@@ -85,11 +207,12 @@ async def send_help(message: Message):
 3️⃣ <b>Керування фільтрами:</b>
    • Перегляд - "Мої фільтри"
    • Видалення - кнопка "Видалити" в меню фільтрів
+   • Ціна, площа, ключові слова - /rules
 
 ❗️ <b>Важливо:</b>
-• Можна відстежувати до 3 фільтрів одночасно
+• Одночасно відстежується один фільтр на чат
 • Для зупинки відстеження натисніть "⏹ Зупинити!"
-• Бот перевіряє нові оголошення кожну хвилину
+• Бот перевіряє нові оголошення приблизно щохвилини: активні пошуки частіше, тихі рідше
 
 🤗 Якщо бот вам сподобався і став у нагоді, ₿ підтримайте автора 🇺🇦\n
 🟣 <b>ETH:</b> <code>0xf4acece1ac6270cad690c8b0edfccccf640290ab</code>\n
@@ -107,22 +230,285 @@ async def run_bot():
     logging.info("Starting OLX bot...")
 
     cfg = load_config()
+    session = None
+    if cfg.telegram_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(cfg.telegram_api_url))
     bot = Bot(token=cfg.bot_token,
+              session=session,
               default=DefaultBotProperties(parse_mode="HTML"))
-    dp = Dispatcher()
-    state = AppState(filters_file=cfg.filters_file, seen_file=cfg.seen_file)
+    # filters, tracking, seen IDs, conversations and feed leases; in memory unless STATE_BACKEND shares them
+    kv = open_kv(cfg.state_backend, cfg.redis_url, cfg.state_prefix)
+    shared_state = cfg.state_backend in ("redis", "memory")
+    dp = Dispatcher(storage=KVStorage(kv))
+    rates = parse_rates(cfg.fx_rates)
+    metrics_server = None
+    if cfg.metrics_port:
+        metrics_server = metrics.start_http_server(cfg.metrics_port, cfg.metrics_host)
+    pool = DriverPool(size=cfg.driver_pool_size,
+                      max_pages=cfg.driver_max_pages,
+                      max_rss_mb=cfg.driver_max_rss_mb,
+                      block_resources=cfg.driver_block_resources,
+                      chromedriver_cache=cfg.chromedriver_cache or None)
+    set_default_pool(pool)
+    http_fetcher = None
+    if cfg.fetch_engine == "http":
+        http_fetcher = HttpFetcher(pool=pool,
+                                   max_connections=cfg.http_max_connections,
+                                   max_pages=cfg.max_pages,
+                                   page_concurrency=cfg.page_concurrency,
+                                   hedge_after_sec=cfg.fetch_hedge_sec)
+    fetcher = http_fetcher.fetch_today_ads if http_fetcher else None
+    # pages reach subscribers as they are parsed; None streams the Selenium path
+    streamer = http_fetcher.stream_today_ads if http_fetcher else None
+    broker = None
+    if cfg.job_broker == "socket":
+        broker = SocketBroker(cfg.job_broker_address, cfg.job_broker_authkey.encode("utf-8"))
+        broker.start()
+    elif cfg.job_broker == "redis":
+        broker = RedisBroker(redis_client(cfg.redis_url))
+    if broker is not None:
+        # scraping happens in app.worker processes; this process only schedules and sends
+        fetcher = RemoteFetcher(broker, timeout_sec=cfg.job_timeout_sec).fetch_today_ads
+        streamer = None
+    # referenced until shutdown so the task isn't garbage-collected mid-run
+    warm_up: Optional[asyncio.Task] = None
+    if broker is None:
+        # chromedriver resolution and Chrome start-up overlap with connecting to Telegram;
+        # the http engine only needs the driver path ready for its fallback
+        sessions = cfg.driver_prewarm if cfg.fetch_engine == "selenium" else 0
+        warm_up = asyncio.create_task(asyncio.to_thread(pool.warm, sessions))
+
+    def make_schedule() -> AdaptiveInterval:
+        return AdaptiveInterval(base_sec=cfg.poll_interval_sec,
+                                min_sec=cfg.poll_min_sec,
+                                max_sec=cfg.poll_max_sec,
+                                jitter=cfg.poll_jitter)
+
+    scheduler = ScrapeScheduler(
+        interval_sec=cfg.poll_interval_sec,
+        max_workers=cfg.scrape_workers,
+        pool=pool,
+        fetcher=fetcher,
+        schedule_factory=make_schedule if cfg.poll_adaptive else None,
+        watermark_size=cfg.watermark_size,
+        max_pages=cfg.max_pages,
+        page_concurrency=cfg.page_concurrency,
+        streamer=streamer,
+        queue_size=cfg.subscriber_queue_pages,
+        breaker=CircuitBreaker(failure_threshold=cfg.fetch_failure_threshold,
+                               base_sec=cfg.fetch_backoff_sec,
+                               max_sec=cfg.fetch_backoff_max_sec,
+                               captcha_sec=cfg.fetch_captcha_pause_sec),
+    )
+    if shared_state:
+        filters = KVFiltersStorage(kv, legacy_file=cfg.filters_file)
+        tracking = KVTrackingStorage(kv, legacy_file=cfg.tracking_file)
+    else:
+        filters = FiltersStorage(cfg.filters_file)
+        tracking = TrackingStorage(cfg.tracking_file)
+    if shared_state:
+        seen = KVSeenStorage(kv,
+                             legacy_db_path=cfg.seen_db if cfg.seen_backend == "sqlite" else None,
+                             max_age_days=cfg.seen_max_age_days,
+                             max_per_filter=cfg.seen_max_per_filter)
+    elif cfg.seen_backend == "json":
+        seen = SeenStorage(cfg.seen_file)
+    elif cfg.seen_backend == "bloom":
+        seen = BloomSeenStorage(cfg.seen_db,
+                                capacity=cfg.seen_bloom_capacity,
+                                error_rate=cfg.seen_bloom_error_rate,
+                                legacy_json_path=cfg.seen_file,
+                                legacy_owners=seen_key_owners(filters, tracking))
+    else:
+        seen = SqliteSeenStorage(cfg.seen_db,
+                                 legacy_json_path=cfg.seen_file,
+                                 max_age_days=cfg.seen_max_age_days,
+                                 max_per_filter=cfg.seen_max_per_filter,
+                                 legacy_owners=seen_key_owners(filters, tracking))
+    fingerprints = None
+    if cfg.fingerprint_db:
+        fingerprints = FingerprintStore(cfg.fingerprint_db, capacity=cfg.fingerprint_capacity)
+    images = None
+    if cfg.image_cache:
+        images = ImageCache(cfg.image_cache_dir, max_bytes=cfg.image_cache_mb * 1024 * 1024)
+    delivery = DeliveryQueue(bot, format_ad_caption,
+                             global_rate=cfg.send_global_rate,
+                             per_chat_rate=cfg.send_per_chat_rate,
+                             images=images)
+    leases = LeaseManager(kv, cfg.instance_id or default_instance_id(), ttl_sec=cfg.lease_ttl_sec)
+    app_state = AppState(filters=filters, seen=seen, scheduler=scheduler, delivery=delivery, tracking=tracking,
+                         leases=leases, pool=pool, http_fetcher=http_fetcher, fingerprints=fingerprints)
+
+    async def start_tracking(chat_id: int, filter_name: str, url: str, start_delay: float = 0) -> None:
+        if chat_id in app_state.active_trackers:
+            # also when its feed died, so the old subscription's page queue is released
+            await app_state.active_trackers.pop(chat_id).stop()
+
+        app_state.active_filters[chat_id] = filter_name
+        app_state.active_rules[chat_id] = AdRules.from_dict(
+            await asyncio.to_thread(app_state.filters.get_rules, filter_name, chat_id), rates)
+        # seen IDs are kept per chat so chats sharing a feed each get every new ad
+        seen_key = f"{chat_id}:{filter_name}"
+        # history saved before that is under the bare filter name
+        if await asyncio.to_thread(app_state.seen.adopt_legacy, filter_name, seen_key):
+            logging.info("Carried seen ads of filter '%s' over to chat %s", filter_name, chat_id)
+        logging.info("Tracking started for chat %s, filter '%s' -> %s", chat_id, filter_name, url)
+
+        # new ads queued during the current poll; the poll's summary message follows them
+        poll_new_ads = 0
+
+        async def on_new_ads(ads: list[OlxAd]):
+            nonlocal poll_new_ads
+            rules = app_state.active_rules.get(chat_id)
+            if rules:
+                # before dedup: dropped ads cost neither seen-storage lookups nor sends
+                kept = rules.apply(ads)
+                if len(kept) < len(ads):
+                    ADS_DROPPED.inc(len(ads) - len(kept))
+                ads = kept
+                if not ads:
+                    logging.info("No ads match the rules for chat %s, filter '%s'", chat_id, filter_name)
+                    return None
+            if app_state.fingerprints is not None:
+                events = await asyncio.to_thread(app_state.fingerprints.diff, seen_key, ads)
+            else:
+                events = [AdEvent(NEW, a) for a in ads]
+            # the seen store stays the judge of what is new: fingerprints record a batch as it is
+            # classified, so an ad whose batch was refused or cancelled is known there but still unseen
+            new_ids = await asyncio.to_thread(app_state.seen.unseen_only, seen_key, {a.ad_id for a in ads})
+            reposts = {e.ad.ad_id for e in events if e.kind == REPOST}
+            new_ads = [a for a in ads if a.ad_id in new_ids and a.ad_id not in reposts]
+            changes = [e for e in events if (e.kind == PRICE_CHANGED and e.ad.ad_id not in new_ids)
+                       or (e.kind == REPOST and e.ad.ad_id in new_ids)]
+            if changes or new_ads:
+                # a full queue holds the feed back; ads are marked seen only once they are queued
+                await app_state.delivery.wait_for_room(len(changes) + len(new_ads) + 1)
+            if new_ads and not app_state.delivery.enqueue_ads(chat_id, new_ads):
+                return None
+            if new_ids:
+                await asyncio.to_thread(app_state.seen.add_many, seen_key, new_ids)
+            for text in format_changes(changes):
+                app_state.delivery.enqueue_text(chat_id, text)
+            if changes:
+                logging.info("Queued %d price changes/re-posts for chat %s, filter '%s'",
+                             len(changes), chat_id, filter_name)
+            if not new_ads:
+                logging.info("No new ads for chat %s, filter '%s'",
+                             chat_id, filter_name)
+                return None
+            NEW_ADS.inc(len(new_ads))
+            poll_new_ads += len(new_ads)
+            logging.info("Found %d new ads for chat %s, filter '%s'", len(
+                new_ads), chat_id, filter_name)
+
+        def on_poll_done():
+            nonlocal poll_new_ads
+            if not poll_new_ads:
+                return None
+            poll_new_ads = 0
+            app_state.delivery.enqueue_text(
+                chat_id,
+                f"""Відстеження запущено для <b>{escape_html(filter_name)}</b>
+
+    🤗 Якщо бот вам сподобався і став у нагоді, ₿ підтримайте автора 🇺🇦\n
+    🟣 <b>ETH:</b> <code>0xf4acece1ac6270cad690c8b0edfccccf640290ab</code>\n
+    🔵 <b>TON:</b> <code>UQBdwmdnD9jx9h_SaOUrcEV-89G3o9RR16TPG_7WYyQ0jopu</code>\n
+    📧 <code>corvi11@proton.me</code>
+    """,
+                reply_markup=main_menu(tracking_running=True),
+            )
+            return None
+
+        app_state.active_trackers[chat_id] = await app_state.scheduler.subscribe(
+            url, on_new_ads, start_delay=start_delay, on_poll_done=on_poll_done)
+
+    async def stop_local(chat_id: int) -> None:
+        """Stops this instance's subscription for a chat, if it has one."""
+        tracker = app_state.active_trackers.pop(chat_id, None)
+        app_state.active_filters.pop(chat_id, None)
+        app_state.active_rules.pop(chat_id, None)
+        app_state.synced.pop(chat_id, None)
+        if tracker is not None:
+            await tracker.stop()
+
+    async def resume(chat_id: int, entry: TrackedFilter, start_delay: float = 0) -> None:
+        """Brings the local subscription in line with a chat's tracking entry."""
+        url = await asyncio.to_thread(app_state.filters.get, entry.filter_name, chat_id)
+        if not url:
+            logging.info("Not tracking chat %s: filter '%s' no longer exists", chat_id, entry.filter_name)
+            await asyncio.to_thread(app_state.tracking.remove, chat_id)
+            await stop_local(chat_id)
+            return
+        current = app_state.synced.get(chat_id)
+        tracker = app_state.active_trackers.get(chat_id)
+        if (current is not None and tracker is not None and tracker.is_running() and url == entry.url
+                and (current.filter_name, current.url) == (entry.filter_name, entry.url)):
+            # same feed, so only the rules can have changed
+            app_state.active_rules[chat_id] = AdRules.from_dict(
+                await asyncio.to_thread(app_state.filters.get_rules, entry.filter_name, chat_id), rates)
+        else:
+            await start_tracking(chat_id, entry.filter_name, url, start_delay=start_delay)
+        app_state.synced[chat_id] = entry
+
+    async def sync_tracking(start_window: float = 0) -> None:
+        """Runs the tracked chats whose feeds this instance holds a lease on and stops the rest.
+
+        Called on start (resuming tracking saved before the last shutdown) and, with a shared
+        STATE_BACKEND, every third of the lease TTL to renew leases, rebalance feeds as
+        instances come and go, and follow changes made on other instances. First polls of the chats
+        it starts are spread over ``start_window`` seconds.
+        """
+        saved = await asyncio.to_thread(app_state.tracking.all)
+        feeds = {chat_id: lease_name(normalize_url(entry.url)) for chat_id, entry in saved.items()}
+        owned = await asyncio.to_thread(app_state.leases.balance, set(feeds.values()))
+        for chat_id in list(app_state.active_trackers):
+            if chat_id not in saved or feeds[chat_id] not in owned:
+                await stop_local(chat_id)
+        pending = sorted(((chat_id, entry) for chat_id, entry in saved.items()
+                          if feeds[chat_id] in owned and app_state.synced.get(chat_id) != entry),
+                         key=lambda item: item[1].started_at)
+        for i, (chat_id, entry) in enumerate(pending):
+            # even spacing plus a little jitter so neighbouring feeds don't line up
+            await resume(chat_id, entry, start_delay=start_window * (i + random.random()) / len(pending))
+        if pending:
+            logging.info("Synced tracking for %d chats over %ss (%d of %d feeds held here)",
+                         len(pending), start_window, len(owned), len(set(feeds.values())))
+
+    async def sync_chat(chat_id: int) -> None:
+        """sync_tracking for one chat whose tracking just changed on this instance."""
+        entry = await asyncio.to_thread(app_state.tracking.get, chat_id)
+        if entry is None:
+            await stop_local(chat_id)
+            return
+        feed = lease_name(normalize_url(entry.url))
+        if app_state.leases.prefers(feed) and feed in await asyncio.to_thread(app_state.leases.claim, [feed]):
+            await resume(chat_id, entry)
+        else:
+            # the instance the feed belongs to starts it on its next sync
+            await stop_local(chat_id)
+
+    async def keep_leases() -> None:
+        while True:
+            await asyncio.sleep(cfg.lease_ttl_sec / 3)
+            try:
+                await sync_tracking(start_window=cfg.restore_window_sec)
+            except Exception:
+                logging.exception("Could not sync tracking with other instances")
 
     # Регистрация команд бота
     await bot.set_my_commands([
         BotCommand(command="start", description="Запустить бота"),
-        BotCommand(command="help", description="Показать инструкцию")
+        BotCommand(command="help", description="Показать инструкцию"),
+        BotCommand(command="rules", description="Цена, площадь и слова для фильтра")
     ])
 
     @dp.message(CommandStart())
     async def start(message: Message):
         logging.info("Bot started. Chat %s used /start", message.chat.id)
-        is_running = message.chat.id in state.active_trackers and state.active_trackers[message.chat.id].is_running(
-        )
+        tracker = app_state.active_trackers.get(message.chat.id)
+        # a chat tracked by another instance has no local subscription
+        is_running = (tracker.is_running() if tracker
+                      else await asyncio.to_thread(app_state.tracking.get, message.chat.id) is not None)
         await message.answer(
             "Привіт 🤗! Я бот для відстеження оголошень OLX. Виберіть дію:",
             reply_markup=main_menu(tracking_running=is_running),
@@ -130,7 +516,7 @@ async def run_bot():
 
     @dp.message(F.text == "🗃️ Мої фiльтри")
     async def show_filters(message: Message):
-        names = state.filters.list_names()
+        names = await asyncio.to_thread(app_state.filters.list_names, message.chat.id)
         logging.info("Show filters to chat %s", message.chat.id)
         await message.answer(
             "Ваші фільтри:",
@@ -140,7 +526,7 @@ async def run_bot():
     @dp.callback_query(F.data.startswith("filter:"))
     async def filters_click(callback: CallbackQuery):
         name = callback.data.split(":", 1)[1]
-        url = state.filters.read().get(name, "")
+        url = await asyncio.to_thread(app_state.filters.get, name, callback.message.chat.id)
         if url:
             await callback.message.answer(f"<b>{escape_html(name)}</b>\n{escape_html(url)}")
         logging.info("Filter clicked: %s (chat %s)",
@@ -148,51 +534,54 @@ async def run_bot():
         await callback.answer()
 
     @dp.callback_query(F.data == "filters:create")
-    async def filters_create(callback: CallbackQuery):
+    async def filters_create(callback: CallbackQuery, state: FSMContext):
         chat_id = callback.message.chat.id
-        state.awaiting_name.add(chat_id)
-        state.awaiting_url_for_name.pop(chat_id, None)
+        await state.set_state(NewFilter.name)
         await callback.message.answer("Введіть назву фільтра (наприклад, Київ_квартири):")
         logging.info("Create filter initiated by chat %s", chat_id)
         await callback.answer()
 
-    @dp.message(lambda m: m.chat.id in state.awaiting_name)
-    async def receive_filter_name(message: Message):
+    @dp.message(NewFilter.name)
+    async def receive_filter_name(message: Message, state: FSMContext):
         chat_id = message.chat.id
         text = (message.text or "").strip()
         if not text:
             await message.answer("Назва не може бути пустою. Спробуйте ще раз.")
             return
-        state.awaiting_name.discard(chat_id)
-        state.awaiting_url_for_name[chat_id] = text
+        await state.update_data(name=text)
+        await state.set_state(NewFilter.url)
         await message.answer("Надішліть посилання OLX з налаштованими параметрами пошуку:")
         logging.info("Filter name received from chat %s: %s", chat_id, text)
 
-    @dp.message(lambda m: m.chat.id in state.awaiting_url_for_name)
-    async def receive_filter_url(message: Message):
+    @dp.message(NewFilter.url)
+    async def receive_filter_url(message: Message, state: FSMContext):
         chat_id = message.chat.id
         text = (message.text or "").strip()
-        name = state.awaiting_url_for_name[chat_id]
+        name = (await state.get_data()).get("name")
         url = text
         if not (url.startswith("http://") or url.startswith("https://")):
             await message.answer("Потрібно коректне посилання (http/https). Спробуйте ще раз або /start")
             return
-        state.awaiting_url_for_name.pop(chat_id, None)
-        state.filters.upsert(name, url)
+        await state.clear()
+        if not name:
+            # the conversation expired or was finished by another instance
+            return
+        await asyncio.to_thread(app_state.filters.upsert, name, url, chat_id)
         await message.answer(f"✅ Збережено фільтр <b>{escape_html(name)}</b>")
-        await message.answer("Ваші фільтри:", reply_markup=filters_menu(state.filters.list_names()))
+        names = await asyncio.to_thread(app_state.filters.list_names, chat_id)
+        await message.answer("Ваші фільтри:", reply_markup=filters_menu(names))
         logging.info("Filter saved (chat %s): %s -> %s", chat_id, name, url)
 
     @dp.callback_query(F.data == "filters:delete")
     async def filters_delete(callback: CallbackQuery):
-        names = state.filters.list_names()
+        names = await asyncio.to_thread(app_state.filters.list_names, callback.message.chat.id)
         await callback.message.answer("Оберіть фільтр для видалення:", reply_markup=filters_delete_menu(names))
         await callback.answer()
 
     @dp.callback_query(F.data.startswith("filters:delete:"))
     async def filters_do_delete(callback: CallbackQuery):
         name = callback.data.split(":", 2)[2]
-        existed = state.filters.delete(name)
+        existed = await asyncio.to_thread(app_state.filters.delete, name, callback.message.chat.id)
         if existed:
             await callback.message.answer(f"🗑 Видалено фільтр <b>{escape_html(name)}</b>")
         else:
@@ -204,7 +593,7 @@ async def run_bot():
     @dp.message(F.text.regexp(r"(?i)отследить"))
     @dp.message(F.text == "/track")
     async def track_choose(message: Message):
-        names = state.filters.list_names()
+        names = await asyncio.to_thread(app_state.filters.list_names, message.chat.id)
         if names:
             await message.answer("Оберіть фільтр для відстеження нових оголошень:", reply_markup=tracking_choice_menu(names))
             logging.info(
@@ -219,61 +608,15 @@ async def run_bot():
         parts = callback.data.split(":")
         if parts[1] == "start":
             filter_name = parts[2]
-            url = state.filters.read().get(filter_name)
+            url = await asyncio.to_thread(app_state.filters.get, filter_name, callback.message.chat.id)
             if not url:
                 await callback.message.answer("Фільтр не знайдено")
                 await callback.answer()
                 return
 
             chat_id = callback.message.chat.id
-            if chat_id not in state.active_trackers and len(state.active_trackers) >= state.max_parallel:
-                await callback.message.answer("🚦 Перевищено ліміт одночасних відстежень. Спробуйте пізніше або зупиніть інше відстеження.")
-                await callback.answer()
-                return
-
-            if chat_id in state.active_trackers and state.active_trackers[chat_id].is_running():
-                await state.active_trackers[chat_id].stop()
-
-            tracker = Tracker(interval_sec=60)
-            state.active_trackers[chat_id] = tracker
-            state.active_filters[chat_id] = filter_name
-            logging.info("Tracking started for chat %s, filter '%s' -> %s",
-                         callback.message.chat.id, filter_name, url)
-
-            async def on_new_ads(ads: list[OlxAd]):
-                ad_ids = {a.ad_id for a in ads}
-                new_ids = state.seen.unseen_only(filter_name, ad_ids)
-                new_ads = [a for a in ads if a.ad_id in new_ids]
-                if not new_ads:
-                    logging.info("No new ads for chat %s, filter '%s'",
-                                 callback.message.chat.id, filter_name)
-                    return None
-                state.seen.add_many(filter_name, new_ids)
-                logging.info("Found %d new ads for chat %s, filter '%s'", len(
-                    new_ads), callback.message.chat.id, filter_name)
-                for ad in new_ads:
-                    caption = format_ad_caption(ad)
-                    try:
-                        if ad.image_url:
-                            await callback.message.answer_photo(photo=ad.image_url, caption=caption)
-                        else:
-                            await callback.message.answer(caption)
-                    except Exception:
-                        await callback.message.answer(caption)
-                logging.info("Sent %d new ads to chat %s", len(
-                    new_ads), callback.message.chat.id)
-                await callback.message.answer(
-                    f"""Відстеження запущено для <b>{escape_html(filter_name)}</b>
-
-    🤗 Якщо бот вам сподобався і став у нагоді, ₿ підтримайте автора 🇺🇦\n
-    🟣 <b>ETH:</b> <code>0xf4acece1ac6270cad690c8b0edfccccf640290ab</code>\n
-    🔵 <b>TON:</b> <code>UQBdwmdnD9jx9h_SaOUrcEV-89G3o9RR16TPG_7WYyQ0jopu</code>\n
-    📧 <code>corvi11@proton.me</code>
-    """,
-                    reply_markup=main_menu(tracking_running=True),
-                )
-
-            await tracker.start(url, on_new_ads)
+            await asyncio.to_thread(app_state.tracking.set, chat_id, filter_name, url)
+            await sync_chat(chat_id)
 
             await callback.message.answer(
                 f"Відстеження запущено для <b>{escape_html(filter_name)}</b>",
@@ -283,7 +626,7 @@ async def run_bot():
             await callback.answer("Старт")
         else:
             filter_name = parts[1]
-            state.active_filters[callback.message.chat.id] = filter_name
+            app_state.active_filters[callback.message.chat.id] = filter_name
             await callback.message.answer(
                 f"Фільтр: <b>{escape_html(filter_name)}</b>",
                 reply_markup=tracking_start_menu(filter_name),
@@ -293,11 +636,10 @@ async def run_bot():
     @dp.message(F.text == "⏹ Зупинити!")
     async def stop_tracking(message: Message):
         chat_id = message.chat.id
-        tracker = state.active_trackers.get(chat_id)
-        if tracker and tracker.is_running():
-            await tracker.stop()
-            state.active_trackers.pop(chat_id, None)
-            state.active_filters.pop(chat_id, None)
+        if chat_id in app_state.active_trackers or await asyncio.to_thread(app_state.tracking.get, chat_id) is not None:
+            # an instance holding the feed elsewhere drops the chat on its next sync
+            await asyncio.to_thread(app_state.tracking.remove, chat_id)
+            await stop_local(chat_id)
             await message.answer("⏹ Зупинено відстеження", reply_markup=main_menu(tracking_running=False))
             logging.info("Tracking stopped for chat %s", chat_id)
         else:
@@ -305,6 +647,48 @@ async def run_bot():
             logging.info(
                 "Stop requested but nothing running for chat %s", message.chat.id)
 
+    @dp.message(Command(commands=["rules"]))
+    async def rules_command(message: Message):
+        chat_id = message.chat.id
+        args = (message.text or "").partition(" ")[2].strip()
+        names = await asyncio.to_thread(app_state.filters.list_names, chat_id)
+        if not args:
+            specs = await asyncio.to_thread(lambda: [app_state.filters.get_rules(n, chat_id) for n in names])
+            lines = [f"<b>{escape_html(n)}</b>: {escape_html(AdRules.from_dict(spec, rates).describe())}"
+                     for n, spec in zip(names, specs)]
+            await message.answer("\n".join([RULES_HELP, ""] + lines))
+            return
+        # filter names may contain spaces: take the longest one the arguments start with
+        name = next((n for n in sorted(names, key=len, reverse=True)
+                     if args == n or args.startswith(n + " ")), None)
+        if name is None:
+            await message.answer("Фільтр не знайдено. Назва фільтра йде першою: /rules Назва ціна&lt;15000")
+            return
+        spec_text = args[len(name):].strip()
+        if not spec_text:
+            rules = AdRules.from_dict(await asyncio.to_thread(app_state.filters.get_rules, name, chat_id), rates)
+            await message.answer(f"<b>{escape_html(name)}</b>: {escape_html(rules.describe())}")
+            return
+        if spec_text.lower() in ("off", "вимк", "0"):
+            spec = None
+        else:
+            try:
+                spec = parse_rules(spec_text)
+            except ValueError as e:
+                await message.answer(f"{escape_html(str(e))}\n\n{RULES_HELP}")
+                return
+        await asyncio.to_thread(app_state.filters.set_rules, name, spec, chat_id)
+        rules = AdRules.from_dict(spec, rates)
+        entry = await asyncio.to_thread(app_state.tracking.get, chat_id)
+        if entry is not None and entry.filter_name == name:
+            if chat_id in app_state.active_trackers:
+                app_state.active_rules[chat_id] = rules
+            else:
+                # a fresh entry makes the instance tracking the chat reload its rules
+                await asyncio.to_thread(app_state.tracking.set, chat_id, name, entry.url)
+        await message.answer(f"✅ Правила для <b>{escape_html(name)}</b>: {escape_html(rules.describe())}")
+        logging.info("Rules for filter '%s' (chat %s): %s", name, chat_id, spec)
+
     # === ИСПРАВЛЕННЫЕ ОБРАБОТЧИКИ ДЛЯ /help ===
     @dp.message(Command(commands=["help"]))
     async def help_command(message: Message):
@@ -315,7 +699,53 @@ async def run_bot():
         await send_help(message)
     # ==========================================
 
-    await dp.start_polling(bot)
+    lease_keeper: Optional[asyncio.Task] = None
+    try:
+        await sync_tracking(start_window=cfg.restore_window_sec)
+        if shared_state:
+            lease_keeper = asyncio.create_task(keep_leases())
+        if cfg.webhook_url:
+            await run_webhook(bot, dp, cfg.webhook_url,
+                              path=cfg.webhook_path,
+                              secret=cfg.webhook_secret,
+                              host=cfg.webhook_host,
+                              port=cfg.webhook_port,
+                              register=cfg.webhook_register,
+                              health=lambda: {
+                                  "feeds": scheduler.feed_count(),
+                                  "trackers": len(app_state.active_trackers),
+                                  "leases": len(app_state.leases.held()),
+                                  "pending_messages": delivery.pending(),
+                              })
+        else:
+            # a webhook left over from webhook mode would make getUpdates fail
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if lease_keeper is not None:
+            lease_keeper.cancel()
+        await scheduler.close()
+        try:
+            # other instances take the feeds over on their next sync instead of after the TTL
+            await asyncio.to_thread(leases.release_all)
+        except Exception:
+            logging.exception("Could not release feed leases")
+        await delivery.close()
+        if images is not None:
+            await images.close()
+        if broker is not None:
+            broker.close()
+        if http_fetcher is not None:
+            await http_fetcher.close()
+        if warm_up is not None and not warm_up.done():
+            logging.info("Shutting down while Chrome sessions are still starting")
+        pool.close()
+        seen.close()
+        if fingerprints is not None:
+            fingerprints.close()
+        kv.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
 
 
 if __name__ == "__main__":
@@ -8,15 +8,169 @@ class Config:
     bot_token: str
     filters_file: str = "filters.json"
     seen_file: str = "seen_ads.json"
+    # chats' active tracking, resumed on start with first polls spread over restore_window_sec
+    tracking_file: str = "tracking.json"
+    restore_window_sec: int = 60
+    # "sqlite" (default, imports seen_file once), "bloom" (constant memory) or "json"
+    seen_backend: str = "sqlite"
+    seen_db: str = "seen_ads.sqlite3"
+    # retention for the sqlite backend; 0 keeps IDs forever
+    seen_max_age_days: float = 30
+    seen_max_per_filter: int = 10000
+    # per-generation capacity and false-positive rate for the bloom backend
+    seen_bloom_capacity: int = 20000
+    seen_bloom_error_rate: float = 0.001
+    # per-ad fingerprints of the newest ads per filter, for price changes and re-posts ("" disables)
+    fingerprint_db: str = "fingerprints.sqlite3"
+    fingerprint_capacity: int = 1000
+    driver_pool_size: int = 2
+    driver_max_pages: int = 50
+    driver_max_rss_mb: int = 700
+    # skip images, fonts, analytics and ads in Chrome
+    driver_block_resources: bool = True
+    # Chrome sessions launched at startup, before the first fetch asks for one (0 = on demand)
+    driver_prewarm: int = 1
+    chromedriver_cache: str = ".chromedriver.json"
+    # "selenium" or "http" (browserless, falls back to Selenium when a page can't be parsed)
+    fetch_engine: str = "selenium"
+    http_max_connections: int = 20
+    # how many listing fetches may run at the same time across all feeds
+    scrape_workers: int = 3
+    # per-host backoff: failures in a row before the circuit opens, backoff start/cap,
+    # and the pause after a captcha
+    fetch_failure_threshold: int = 5
+    fetch_backoff_sec: float = 5
+    fetch_backoff_max_sec: float = 900
+    fetch_captcha_pause_sec: float = 300
+    # http engine: send a duplicate request when a page takes longer than this (0 disables)
+    fetch_hedge_sec: float = 4
+    # per-feed polling adapts to how often new ads appear, within these bounds
+    poll_interval_sec: int = 60
+    poll_adaptive: bool = True
+    poll_min_sec: int = 20
+    poll_max_sec: int = 600
+    poll_jitter: float = 0.15
+    # recent ad IDs per feed used to stop parsing newest-first pages early (0 disables)
+    watermark_size: int = 100
+    # hryvnias per unit, for price rules across currencies ("USD=41.5,EUR=45")
+    fx_rates: str = "USD=41.5,EUR=45"
+    # result pages crawled per poll, and how many of them load at once
+    max_pages: int = 3
+    page_concurrency: int = 2
+    # result pages waiting per chat between scraping and dedup/delivery; a full queue holds the feed back
+    subscriber_queue_pages: int = 4
+    # outbound Telegram limits (messages per second)
+    send_global_rate: float = 25
+    send_per_chat_rate: float = 1
+    # prefetch ad photos to a bounded on-disk cache and resend them by Telegram file_id
+    image_cache: bool = True
+    image_cache_dir: str = "image_cache"
+    image_cache_mb: int = 200
+    # "" scrapes in the bot process; "socket" or "redis" hands fetches to app.worker processes
+    job_broker: str = ""
+    job_broker_address: str = "127.0.0.1:8765"
+    # shared secret between the bot and socket workers; required with job_broker="socket"
+    job_broker_authkey: str = ""
+    redis_url: str = "redis://localhost:6379/0"
+    job_timeout_sec: int = 120
+    worker_processes: int = 1
+    worker_concurrency: int = 2
+    # "" keeps filters, tracking and seen IDs in local files for a single instance; "redis" shares
+    # them, conversations and feed leases through redis_url so several instances can run side by
+    # side; "memory" runs the shared code paths in process memory only (tests, trials)
+    state_backend: str = ""
+    state_prefix: str = "olx"
+    # this instance's name on feed leases ("" = host:pid); a dead instance's feeds move after lease_ttl_sec
+    instance_id: str = ""
+    lease_ttl_sec: int = 30
+    # Bot API server base URL ("" = api.telegram.org), e.g. a local telegram-bot-api or a test double
+    telegram_api_url: str = ""
+    # public HTTPS base URL; set to receive updates by webhook instead of long polling
+    webhook_url: str = ""
+    webhook_path: str = "/telegram/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    # set the webhook at Telegram on start; off for local runs fed with recorded updates
+    webhook_register: bool = True
+    # 0 disables the /metrics endpoint; worker processes use worker_metrics_port + their index
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+    worker_metrics_port: int = 0
 
 
-def load_config() -> Config:
+def load_config(require_token: bool = True) -> Config:
     load_dotenv()
     # Fallback: hardcode your token below if you don't want to use .env
     DEFAULT_BOT_TOKEN = ""  # e.g. "123456:ABC..." (leave empty to require env)
     token = os.getenv("BOT_TOKEN") or DEFAULT_BOT_TOKEN
-    if not token:
+    if not token and require_token:
         raise RuntimeError("BOT_TOKEN env variable is required")
-    return Config(bot_token=token)
+    cfg = Config(
+        bot_token=token,
+        tracking_file=os.getenv("TRACKING_FILE", "tracking.json"),
+        restore_window_sec=int(os.getenv("RESTORE_WINDOW_SEC", "60")),
+        seen_backend=os.getenv("SEEN_BACKEND", "sqlite").lower(),
+        seen_db=os.getenv("SEEN_DB", "seen_ads.sqlite3"),
+        seen_max_age_days=float(os.getenv("SEEN_MAX_AGE_DAYS", "30")),
+        seen_max_per_filter=int(os.getenv("SEEN_MAX_PER_FILTER", "10000")),
+        seen_bloom_capacity=int(os.getenv("SEEN_BLOOM_CAPACITY", "20000")),
+        seen_bloom_error_rate=float(os.getenv("SEEN_BLOOM_ERROR_RATE", "0.001")),
+        fingerprint_db=os.getenv("FINGERPRINT_DB", "fingerprints.sqlite3"),
+        fingerprint_capacity=int(os.getenv("FINGERPRINT_CAPACITY", "1000")),
+        driver_pool_size=int(os.getenv("DRIVER_POOL_SIZE", "2")),
+        driver_max_pages=int(os.getenv("DRIVER_MAX_PAGES", "50")),
+        driver_max_rss_mb=int(os.getenv("DRIVER_MAX_RSS_MB", "700")),
+        driver_block_resources=os.getenv("DRIVER_BLOCK_RESOURCES", "1").lower() not in ("0", "false", "no"),
+        driver_prewarm=int(os.getenv("DRIVER_PREWARM", "1")),
+        chromedriver_cache=os.getenv("CHROMEDRIVER_CACHE", ".chromedriver.json"),
+        fetch_engine=os.getenv("FETCH_ENGINE", "selenium").lower(),
+        http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+        scrape_workers=int(os.getenv("SCRAPE_WORKERS", "3")),
+        fetch_failure_threshold=int(os.getenv("FETCH_FAILURE_THRESHOLD", "5")),
+        fetch_backoff_sec=float(os.getenv("FETCH_BACKOFF_SEC", "5")),
+        fetch_backoff_max_sec=float(os.getenv("FETCH_BACKOFF_MAX_SEC", "900")),
+        fetch_captcha_pause_sec=float(os.getenv("FETCH_CAPTCHA_PAUSE_SEC", "300")),
+        fetch_hedge_sec=float(os.getenv("FETCH_HEDGE_SEC", "4")),
+        poll_interval_sec=int(os.getenv("POLL_INTERVAL_SEC", "60")),
+        poll_adaptive=os.getenv("POLL_ADAPTIVE", "1").lower() not in ("0", "false", "no"),
+        poll_min_sec=int(os.getenv("POLL_MIN_SEC", "20")),
+        poll_max_sec=int(os.getenv("POLL_MAX_SEC", "600")),
+        poll_jitter=float(os.getenv("POLL_JITTER", "0.15")),
+        watermark_size=int(os.getenv("WATERMARK_SIZE", "100")),
+        fx_rates=os.getenv("FX_RATES", "USD=41.5,EUR=45"),
+        max_pages=int(os.getenv("MAX_PAGES", "3")),
+        page_concurrency=int(os.getenv("PAGE_CONCURRENCY", "2")),
+        subscriber_queue_pages=int(os.getenv("SUBSCRIBER_QUEUE_PAGES", "4")),
+        send_global_rate=float(os.getenv("SEND_GLOBAL_RATE", "25")),
+        send_per_chat_rate=float(os.getenv("SEND_PER_CHAT_RATE", "1")),
+        image_cache=os.getenv("IMAGE_CACHE", "1").lower() not in ("0", "false", "no"),
+        image_cache_dir=os.getenv("IMAGE_CACHE_DIR", "image_cache"),
+        image_cache_mb=int(os.getenv("IMAGE_CACHE_MB", "200")),
+        job_broker=os.getenv("JOB_BROKER", "").lower(),
+        job_broker_address=os.getenv("JOB_BROKER_ADDRESS", "127.0.0.1:8765"),
+        job_broker_authkey=os.getenv("JOB_BROKER_AUTHKEY", ""),
+        redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        job_timeout_sec=int(os.getenv("JOB_TIMEOUT_SEC", "120")),
+        worker_processes=int(os.getenv("WORKER_PROCESSES", "1")),
+        worker_concurrency=int(os.getenv("WORKER_CONCURRENCY", "2")),
+        state_backend=os.getenv("STATE_BACKEND", "").lower(),
+        state_prefix=os.getenv("STATE_PREFIX", "olx"),
+        instance_id=os.getenv("INSTANCE_ID", ""),
+        lease_ttl_sec=int(os.getenv("LEASE_TTL_SEC", "30")),
+        telegram_api_url=os.getenv("TELEGRAM_API_URL", ""),
+        webhook_url=os.getenv("WEBHOOK_URL", ""),
+        webhook_path=os.getenv("WEBHOOK_PATH", "/telegram/webhook"),
+        webhook_secret=os.getenv("WEBHOOK_SECRET", ""),
+        webhook_host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        webhook_port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        webhook_register=os.getenv("WEBHOOK_REGISTER", "1").lower() not in ("0", "false", "no"),
+        metrics_port=int(os.getenv("METRICS_PORT", "0")),
+        metrics_host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        worker_metrics_port=int(os.getenv("WORKER_METRICS_PORT", "0")),
+    )
+    if cfg.job_broker == "socket" and not cfg.job_broker_authkey:
+        raise RuntimeError("JOB_BROKER=socket needs a JOB_BROKER_AUTHKEY secret shared with the workers")
+    return cfg
 
 
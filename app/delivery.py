@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import InputMediaPhoto
+
+from . import metrics
+from .parser import OlxAd
+
+if TYPE_CHECKING:
+    from .image_cache import ImageCache, PhotoSource
+
+# Telegram allows at most 10 items per album
+MEDIA_GROUP_LIMIT = 10
+# 429s in two different chats this close together mean the bot-wide limit was hit
+GLOBAL_FLOOD_WINDOW_SEC = 1.0
+
+SEND_SECONDS = metrics.histogram("olx_send_seconds", "Bot API call latency", ("method",))
+SEND_FAILURES = metrics.counter("olx_send_failures_total", "Failed Bot API calls, including retried ones",
+                                ("method", "reason"))
+DELIVERY_PENDING = metrics.gauge("olx_delivery_pending", "Messages waiting in the delivery queue")
+
+
+class TokenBucket:
+    """Async token bucket; ``penalize`` blocks it entirely for a server-imposed retry_after.
+
+    ``slow_down`` cuts the rate when the server says it is too high; ``recover`` brings it
+    back towards the configured rate a step at a time.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._max_rate = rate
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self._rate)
+
+    def penalize(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    def drain(self) -> None:
+        """Spends the saved-up burst, so the next sends go out at the steady rate."""
+        self._tokens = 0
+        self._updated = time.monotonic()
+
+    def slow_down(self, factor: float = 0.5) -> None:
+        self._rate = max(self._max_rate * 0.05, self._rate * factor)
+
+    def recover(self, fraction: float = 0.01) -> None:
+        self._rate = min(self._max_rate, self._rate + self._max_rate * fraction)
+
+
+class _TextJob:
+    __slots__ = ("text", "reply_markup")
+
+    def __init__(self, text: str, reply_markup: Any = None):
+        self.text = text
+        self.reply_markup = reply_markup
+
+
+class _PhotoJob:
+    __slots__ = ("ads",)
+
+    def __init__(self, ads: List[OlxAd]):
+        self.ads = ads
+
+
+class DeliveryQueue:
+    """Outbound Telegram pipeline: producers enqueue, per-chat tasks send at safe rates.
+
+    A global bucket keeps the bot under Telegram's overall limit and a bucket per chat
+    keeps each conversation under its own. Photo ads are batched into albums of up to
+    10. Flood errors honour retry_after: a 429 drains the global bucket's burst, and 429s
+    in two chats at once block every chat for retry_after and halve the global rate,
+    which successful sends then restore. Network and server errors back
+    off exponentially. At most ``max_pending`` messages wait; ``enqueue_ads`` refuses what
+    does not fit and ``wait_for_room`` lets producers hold back until it does. With an
+    ``images`` cache, photos are prefetched at enqueue time and resent by file_id.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        format_caption: Callable[[OlxAd], str],
+        global_rate: float = 25,
+        per_chat_rate: float = 1,
+        per_chat_burst: float = 3,
+        max_retries: int = 4,
+        max_pending: int = 10000,
+        images: Optional[ImageCache] = None,
+    ):
+        self._bot = bot
+        self._images = images
+        self._format_caption = format_caption
+        self._global = TokenBucket(global_rate, global_rate)
+        self._per_chat_rate = per_chat_rate
+        self._per_chat_burst = per_chat_burst
+        self._max_retries = max_retries
+        self._max_pending = max_pending
+        self._pending: Dict[int, Deque[_TextJob | _PhotoJob]] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._size = 0
+        self._room = asyncio.Event()
+        self._room.set()
+        # (chat, monotonic time) of the last flood error
+        self._last_flood: Optional[Tuple[int, float]] = None
+        DELIVERY_PENDING.set_function(self.pending)
+
+    def pending(self) -> int:
+        return self._size
+
+    def has_room(self, count: int) -> bool:
+        return self._size + min(count, self._max_pending) <= self._max_pending
+
+    async def wait_for_room(self, count: int) -> None:
+        """Waits until ``count`` more messages fit in the queue (or the queue is empty)."""
+        while not self.has_room(count):
+            self._room.clear()
+            await self._room.wait()
+
+    def enqueue_ads(self, chat_id: int, ads: List[OlxAd]) -> bool:
+        """Queues ``ads`` for ``chat_id``; False, with nothing queued, if they do not fit."""
+        jobs: List[_TextJob | _PhotoJob] = []
+        group: List[OlxAd] = []
+        for ad in ads:
+            if ad.image_url:
+                group.append(ad)
+                if len(group) == MEDIA_GROUP_LIMIT:
+                    jobs.append(_PhotoJob(group))
+                    group = []
+            else:
+                if group:
+                    jobs.append(_PhotoJob(group))
+                    group = []
+                jobs.append(_TextJob(self._format_caption(ad)))
+        if group:
+            jobs.append(_PhotoJob(group))
+        if self._size and self._size + len(jobs) > self._max_pending:
+            logging.warning("Delivery queue full (%d); refusing %d ads for chat %s", self._size, len(ads), chat_id)
+            return False
+        if self._images is not None:
+            self._images.prefetch(ad.image_url for ad in ads if ad.image_url)
+        for job in jobs:
+            self._push(chat_id, job, force=True)
+        return True
+
+    def enqueue_text(self, chat_id: int, text: str, reply_markup: Any = None) -> None:
+        self._push(chat_id, _TextJob(text, reply_markup))
+
+    async def close(self, timeout: float = 5) -> None:
+        tasks = list(self._tasks.values())
+        if tasks:
+            _, still_running = await asyncio.wait(tasks, timeout=timeout)
+            for task in still_running:
+                task.cancel()
+        self._tasks.clear()
+
+    def _push(self, chat_id: int, job: _TextJob | _PhotoJob, force: bool = False) -> None:
+        if self._size >= self._max_pending and not force:
+            logging.warning("Delivery queue full (%d); dropping message for chat %s", self._size, chat_id)
+            return
+        self._pending.setdefault(chat_id, deque()).append(job)
+        self._size += 1
+        task = self._tasks.get(chat_id)
+        if task is None or task.done():
+            self._tasks[chat_id] = asyncio.create_task(self._drain(chat_id))
+
+    async def _drain(self, chat_id: int) -> None:
+        jobs = self._pending.get(chat_id)
+        try:
+            while jobs:
+                job = jobs.popleft()
+                self._size -= 1
+                self._room.set()
+                try:
+                    if isinstance(job, _PhotoJob):
+                        await self._send_photos(chat_id, job.ads)
+                    else:
+                        await self._call(chat_id, "sendMessage", lambda: self._bot.send_message(
+                            chat_id, job.text, reply_markup=job.reply_markup))
+                except TelegramForbiddenError:
+                    logging.info("Chat %s blocked the bot; dropping %d queued messages", chat_id, len(jobs))
+                    self._size -= len(jobs)
+                    jobs.clear()
+                    self._room.set()
+                except Exception:
+                    logging.exception("Failed to deliver message to chat %s", chat_id)
+        finally:
+            if not jobs:
+                self._pending.pop(chat_id, None)
+                self._buckets.pop(chat_id, None)
+            if self._tasks.get(chat_id) is asyncio.current_task():
+                self._tasks.pop(chat_id, None)
+
+    async def _send_photos(self, chat_id: int, ads: List[OlxAd]) -> None:
+        if self._images is None:
+            sources: List[Optional[PhotoSource]] = [ad.image_url for ad in ads]
+        else:
+            sources = list(await asyncio.gather(*(self._images.source(ad.image_url) for ad in ads)))
+        photos = [(ad, source) for ad, source in zip(ads, sources) if source is not None]
+        if len(photos) > 1:
+            media = [InputMediaPhoto(media=source, caption=self._format_caption(ad)) for ad, source in photos]
+            try:
+                messages = await self._call(chat_id, "sendMediaGroup",
+                                            lambda: self._bot.send_media_group(chat_id, media), cost=len(media))
+                for (ad, _), message in zip(photos, messages):
+                    self._remember_photo(ad, message)
+                photos = []
+            except TelegramBadRequest as e:
+                # one bad image fails the whole album; retry the ads one by one
+                logging.info("Album to chat %s rejected (%s); sending ads individually", chat_id, e)
+        for ad, source in photos:
+            caption = self._format_caption(ad)
+            try:
+                message = await self._call(chat_id, "sendPhoto",
+                                           lambda: self._bot.send_photo(chat_id, source, caption=caption))
+                self._remember_photo(ad, message)
+            except TelegramBadRequest:
+                if self._images is not None:
+                    self._images.forget(ad.image_url)
+                await self._call(chat_id, "sendMessage", lambda: self._bot.send_message(chat_id, caption))
+        # images that could not be downloaded go out as text without a failed photo attempt first
+        for ad, source in zip(ads, sources):
+            if source is None:
+                caption = self._format_caption(ad)
+                await self._call(chat_id, "sendMessage", lambda: self._bot.send_message(chat_id, caption))
+
+    def _remember_photo(self, ad: OlxAd, message: Any) -> None:
+        photo = getattr(message, "photo", None)
+        if self._images is not None and photo:
+            # sizes are ordered smallest to largest; the largest is what was sent
+            self._images.remember(ad.image_url, photo[-1].file_id)
+
+    async def _call(self, chat_id: int, method: str, make_call: Callable[[], Awaitable[Any]], cost: float = 1) -> Any:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self._per_chat_rate, self._per_chat_burst)
+        for attempt in range(self._max_retries + 1):
+            await bucket.acquire(min(cost, bucket.capacity))
+            await self._global.acquire(min(cost, self._global.capacity))
+            try:
+                with SEND_SECONDS.time(method=method):
+                    result = await make_call()
+                self._global.recover()
+                return result
+            except TelegramRetryAfter as e:
+                SEND_FAILURES.inc(method=method, reason="flood")
+                if attempt == self._max_retries:
+                    raise
+                logging.warning("Flood limit for chat %s; retrying after %ss", chat_id, e.retry_after)
+                bucket.penalize(e.retry_after)
+                self._global_flood(chat_id, e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                SEND_FAILURES.inc(method=method, reason="network" if isinstance(e, TelegramNetworkError) else "server")
+                if attempt == self._max_retries:
+                    raise
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+                logging.info("Send to chat %s failed (%s); retrying in %.1fs", chat_id, e, delay)
+                await asyncio.sleep(delay)
+            except TelegramForbiddenError:
+                SEND_FAILURES.inc(method=method, reason="forbidden")
+                raise
+            except TelegramBadRequest:
+                SEND_FAILURES.inc(method=method, reason="bad_request")
+                raise
+
+    def _global_flood(self, chat_id: int, retry_after: float) -> None:
+        """Slows every chat after a 429; when the limit looks bot-wide, stops them all for
+        retry_after and halves the global rate."""
+        now = time.monotonic()
+        last, self._last_flood = self._last_flood, (chat_id, now)
+        if last is not None and last[0] != chat_id and now - last[1] < GLOBAL_FLOOD_WINDOW_SEC:
+            logging.warning("Flood limits in several chats; pausing all sends for %ss", retry_after)
+            self._global.penalize(retry_after)
+            self._global.slow_down()
+        else:
+            self._global.drain()
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Iterator, List, Optional
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+
+DRIVERS_DISCARDED = metrics.counter("olx_driver_discards_total", "Chrome sessions dropped after raising mid-page")
+
+
+class _PooledDriver:
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages = 0
+
+
+def _process_tree_rss_mb(root_pid: int) -> float:
+    """Sums VmRSS of a process and all its descendants (Linux /proc only)."""
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0.0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read().decode("utf-8", "replace")
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total_kb = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, ()))
+        try:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class DriverPool:
+    """Keeps a bounded set of headless Chrome sessions that fetches borrow and return.
+
+    A session is replaced when it fails a health check, after serving
+    ``max_pages`` pages, or when its process tree grows past ``max_rss_mb``. One that
+    raises while borrowed (crashed Chrome, page-load timeout) is not trusted again: it
+    is dropped without a health check and quit in the background, so its slot is free
+    for a fresh session at once.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_pages: int = 50,
+        max_rss_mb: int = 700,
+        block_resources: bool = True,
+        factory: Optional[Callable[[], webdriver.Chrome]] = None,
+        chromedriver_cache: Optional[str] = None,
+    ):
+        self._chromedriver_cache = chromedriver_cache
+        self._custom_factory = factory is not None
+        if factory is None:
+            from .parser import _build_driver
+            factory = partial(_build_driver, block_resources=block_resources, chromedriver_cache=chromedriver_cache)
+        self._size = max(1, size)
+        self._max_pages = max_pages
+        self._max_rss_mb = max_rss_mb
+        self._factory = factory
+        self._idle: Deque[_PooledDriver] = deque()
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @contextmanager
+    def borrow(self, timeout: Optional[float] = None) -> Iterator[webdriver.Chrome]:
+        pooled = self._acquire(timeout)
+        try:
+            yield pooled.driver
+        except Exception:
+            self._discard(pooled)
+            raise
+        except BaseException:
+            self._release(pooled)
+            raise
+        else:
+            self._release(pooled)
+
+    def warm(self, sessions: int = 0) -> int:
+        """Resolves chromedriver and starts up to ``sessions`` Chrome sessions ahead of the first fetch.
+
+        Blocking; run it in a thread. Returns how many sessions were started.
+        """
+        if not self._custom_factory:
+            from .parser import _chromedriver_path
+            try:
+                _chromedriver_path(self._chromedriver_cache)
+            except Exception:
+                logging.exception("Could not resolve chromedriver during warm-up")
+                return 0
+        target = min(sessions, self._size)
+        started = 0
+        while True:
+            with self._cond:
+                if self._closed or self._created >= target:
+                    return started
+                self._created += 1
+            try:
+                pooled = _PooledDriver(self._factory())
+            except Exception:
+                logging.exception("Could not pre-launch a Chrome session")
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                return started
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(pooled)
+                    self._cond.notify()
+                    pooled = None
+                else:
+                    self._created -= 1
+            if pooled is not None:
+                self._quit(pooled)
+                return started
+            started += 1
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+
+    def _acquire(self, timeout: Optional[float]) -> _PooledDriver:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("DriverPool is closed")
+                if self._idle:
+                    pooled = self._idle.popleft()
+                    break
+                if self._created < self._size:
+                    self._created += 1
+                    pooled = None
+                    break
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("No Chrome session became available in time")
+
+        if pooled is not None and self._is_alive(pooled):
+            return pooled
+        if pooled is not None:
+            logging.info("Replacing unhealthy Chrome session")
+            self._quit(pooled)
+        try:
+            return _PooledDriver(self._factory())
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, pooled: _PooledDriver) -> None:
+        pooled.pages += 1
+        reason = self._recycle_reason(pooled)
+        with self._cond:
+            if reason is None and not self._closed:
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+            self._created -= 1
+            self._cond.notify()
+        if reason:
+            logging.info("Recycling Chrome session: %s", reason)
+        self._quit(pooled)
+
+    def _discard(self, pooled: _PooledDriver) -> None:
+        DRIVERS_DISCARDED.inc()
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+        # quitting a hung Chrome can block for a long time; nobody needs to wait for it
+        threading.Thread(target=self._quit, args=(pooled,), name="chrome-quit", daemon=True).start()
+
+    def _recycle_reason(self, pooled: _PooledDriver) -> Optional[str]:
+        if self._max_pages and pooled.pages >= self._max_pages:
+            return f"served {pooled.pages} pages"
+        if not self._is_alive(pooled):
+            return "health check failed"
+        if self._max_rss_mb:
+            rss = self._rss_mb(pooled)
+            if rss > self._max_rss_mb:
+                return f"RSS {rss:.0f} MB over limit"
+        return None
+
+    @staticmethod
+    def _is_alive(pooled: _PooledDriver) -> bool:
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _rss_mb(pooled: _PooledDriver) -> float:
+        try:
+            pid = pooled.driver.service.process.pid
+        except Exception:
+            return 0.0
+        return _process_tree_rss_mb(pid)
+
+    @staticmethod
+    def _quit(pooled: _PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+
+_default_pool: Optional[DriverPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> DriverPool:
+    """Returns the process-wide pool, creating it with default settings on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = DriverPool()
+        return _default_pool
+
+
+def set_default_pool(pool: DriverPool) -> None:
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = pool
@@ -1,48 +1,269 @@
 from __future__ import annotations
 
 import json
+import logging
 import threading
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .jsonfile import write_json_atomic
+
+FORMAT_VERSION = 2
 
 
 class FiltersStorage:
+    """Saved search filters (name -> OLX URL), kept per chat.
+
+    The file is parsed once and served from memory; it is re-read only when its mtime
+    changes (someone edited it by hand) and every write replaces it atomically.
+    Filters saved before chats had their own lists live in a shared namespace that a
+    chat sees until its first change, when the chat gets its own copy. A filter may also
+    carry post-filter rules (see ad_rules), stored next to it and dropped with it.
+    """
+
     def __init__(self, file_path: str):
         self._path = Path(file_path)
         self._lock = threading.RLock()
+        self._chats: Dict[str, Dict[str, str]] = {}
+        self._shared: Dict[str, str] = {}
+        # chat key ("" for the shared namespace) -> filter name -> rules
+        self._rules: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._stamp: Optional[Tuple[int, int]] = None
         self._ensure_file()
 
     def _ensure_file(self) -> None:
         if not self._path.exists():
-            self._path.write_text("{}", encoding="utf-8")
+            self._write()
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self._path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _refresh(self) -> None:
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        chats: Dict[str, Dict[str, str]] = {}
+        shared: Dict[str, str] = {}
+        rules: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception:
+            data = {}
+        if isinstance(data, dict) and data.get("version") == FORMAT_VERSION:
+            for chat, filters in (data.get("chats") or {}).items():
+                if isinstance(filters, dict):
+                    chats[str(chat)] = {str(k): str(v) for k, v in filters.items()}
+            if isinstance(data.get("shared"), dict):
+                shared = {str(k): str(v) for k, v in data["shared"].items()}
+            for chat, by_name in (data.get("rules") or {}).items():
+                if isinstance(by_name, dict):
+                    rules[str(chat)] = {str(k): v for k, v in by_name.items() if isinstance(v, dict)}
+        elif isinstance(data, dict):
+            # original flat format: keys: names, values: urls
+            shared = {str(k): str(v) for k, v in data.items()}
+        self._chats, self._shared, self._rules, self._stamp = chats, shared, rules, stamp
+
+    def _write(self) -> None:
+        data = {"version": FORMAT_VERSION, "chats": self._chats}
+        if self._shared:
+            data["shared"] = self._shared
+        rules = {chat: by_name for chat, by_name in self._rules.items() if by_name}
+        if rules:
+            data["rules"] = rules
+        write_json_atomic(self._path, data)
+        self._stamp = self._file_stamp()
+
+    def _view(self, chat_id: Optional[int]) -> Dict[str, str]:
+        if chat_id is None:
+            return self._shared
+        return self._chats.get(str(chat_id), self._shared)
+
+    def read(self, chat_id: Optional[int] = None) -> Dict[str, str]:
+        with self._lock:
+            self._refresh()
+            return dict(self._view(chat_id))
 
-    def read(self) -> Dict[str, str]:
+    def get(self, name: str, chat_id: Optional[int] = None) -> Optional[str]:
         with self._lock:
-            try:
-                data = json.loads(self._path.read_text(encoding="utf-8"))
-                if not isinstance(data, dict):
-                    return {}
-                # keys: names, values: urls
-                return {str(k): str(v) for k, v in data.items()}
-            except Exception:
-                return {}
+            self._refresh()
+            return self._view(chat_id).get(name)
 
-    def list_names(self) -> List[str]:
-        return sorted(self.read().keys())
+    def list_names(self, chat_id: Optional[int] = None) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return sorted(self._view(chat_id))
+
+    def _rules_key(self, chat_id: Optional[int]) -> str:
+        if chat_id is None or str(chat_id) not in self._chats:
+            return ""
+        return str(chat_id)
+
+    def _writable(self, chat_id: Optional[int]) -> Dict[str, str]:
+        if chat_id is None:
+            return self._shared
+        key = str(chat_id)
+        if key not in self._chats:
+            self._chats[key] = dict(self._shared)
+            if self._rules.get(""):
+                self._rules[key] = {name: dict(spec) for name, spec in self._rules[""].items()}
+        return self._chats[key]
+
+    def upsert(self, name: str, url: str, chat_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._refresh()
+            self._writable(chat_id)[name] = url
+            self._persist()
+
+    def delete(self, name: str, chat_id: Optional[int] = None) -> bool:
+        with self._lock:
+            self._refresh()
+            if name not in self._view(chat_id):
+                return False
+            self._writable(chat_id).pop(name)
+            self._rules.get(self._rules_key(chat_id), {}).pop(name, None)
+            self._persist()
+            return True
+
+    def get_rules(self, name: str, chat_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            spec = self._rules.get(self._rules_key(chat_id), {}).get(name)
+            return dict(spec) if spec is not None else None
 
-    def upsert(self, name: str, url: str) -> None:
+    def set_rules(self, name: str, rules: Optional[Dict[str, Any]], chat_id: Optional[int] = None) -> bool:
+        """Replaces a filter's rules; empty or None clears them. False if there is no such filter."""
         with self._lock:
-            data = self.read()
-            data[name] = url
-            self._path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            self._refresh()
+            if name not in self._view(chat_id):
+                return False
+            self._writable(chat_id)
+            by_name = self._rules.setdefault(self._rules_key(chat_id), {})
+            if rules:
+                by_name[name] = dict(rules)
+            else:
+                by_name.pop(name, None)
+            self._persist()
+            return True
 
-    def delete(self, name: str) -> bool:
+    def export(self) -> Dict[str, Dict[str, Any]]:
+        """Every namespace ("" is the shared one) as {"filters": ..., "rules": ...}."""
         with self._lock:
-            data = self.read()
-            existed = name in data
-            if existed:
-                data.pop(name)
-                self._path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-            return existed
+            self._refresh()
+            spaces = {"": self._shared, **self._chats}
+            return {key: {"filters": dict(filters), "rules": dict(self._rules.get(key, {}))}
+                    for key, filters in spaces.items() if filters or key}
+
+    def _persist(self) -> None:
+        try:
+            self._write()
+        except OSError:
+            logging.exception("Could not save filters to %s", self._path)
+            # drop the in-memory change so memory and disk agree
+            self._stamp = None
+            self._refresh()
+            raise
+
+
+class KVFiltersStorage:
+    """FiltersStorage on a shared key-value store, so every replica sees every change.
+
+    Each namespace (a chat, or "" for the shared one) is one field of a hash holding its
+    filters and rules as JSON, so a change rewrites only that chat's entry. A change is
+    written only if the entry is still what it was read as, and is redone on the new
+    entry otherwise, so replicas editing the same chat don't lose each other's writes.
+    Semantics match FiltersStorage; ``legacy_file`` is imported by the first replica
+    that starts against an empty store.
+    """
+
+    KEY = "filters"
+    MAX_ATTEMPTS = 20
+
+    def __init__(self, kv: Any, legacy_file: Optional[str] = None):
+        self._kv = kv
+        if legacy_file and Path(legacy_file).exists() and kv.set("imported:filters", legacy_file, only_new=True):
+            spaces = FiltersStorage(legacy_file).export()
+            kv.hset_many(self.KEY, {key: json.dumps(space, ensure_ascii=False) for key, space in spaces.items()})
+            logging.info("Imported filters of %d chats from %s", len(spaces), legacy_file)
+
+    @staticmethod
+    def _parse(key: str, raw: Optional[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        if raw is None:
+            return None
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            logging.warning("Unreadable filters for chat '%s'", key)
+            return None
+        return {"filters": dict(data.get("filters") or {}), "rules": dict(data.get("rules") or {})}
+
+    def _load(self, key: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        return self._parse(key, self._kv.hget(self.KEY, key))
+
+    def _space(self, chat_id: Optional[int]) -> Dict[str, Dict[str, Any]]:
+        """The namespace a chat reads from: its own, or the shared one until its first change."""
+        space = self._load(str(chat_id)) if chat_id is not None else None
+        if space is None:
+            space = self._load("") or {"filters": {}, "rules": {}}
+        return space
+
+    def _update(self, chat_id: Optional[int], change: Callable[[Dict[str, Dict[str, Any]]], bool]) -> bool:
+        """Applies ``change`` to the chat's namespace and saves it unless ``change`` returns
+        False; retried on a fresh copy while another replica writes the entry in between."""
+        key = "" if chat_id is None else str(chat_id)
+        for _ in range(self.MAX_ATTEMPTS):
+            raw = self._kv.hget(self.KEY, key)
+            space = self._parse(key, raw)
+            if space is None:
+                # a chat's first change starts from the shared namespace
+                space = (self._load("") if key else None) or {"filters": {}, "rules": {}}
+            if not change(space):
+                return False
+            if self._kv.hcas(self.KEY, key, raw, json.dumps(space, ensure_ascii=False)):
+                return True
+        raise RuntimeError(f"Filters of chat '{key}' keep changing; gave up after {self.MAX_ATTEMPTS} attempts")
+
+    def read(self, chat_id: Optional[int] = None) -> Dict[str, str]:
+        return dict(self._space(chat_id)["filters"])
+
+    def get(self, name: str, chat_id: Optional[int] = None) -> Optional[str]:
+        return self._space(chat_id)["filters"].get(name)
+
+    def list_names(self, chat_id: Optional[int] = None) -> List[str]:
+        return sorted(self._space(chat_id)["filters"])
+
+    def upsert(self, name: str, url: str, chat_id: Optional[int] = None) -> None:
+        def change(space: Dict[str, Dict[str, Any]]) -> bool:
+            space["filters"][name] = url
+            return True
+
+        self._update(chat_id, change)
+
+    def delete(self, name: str, chat_id: Optional[int] = None) -> bool:
+        def change(space: Dict[str, Dict[str, Any]]) -> bool:
+            if space["filters"].pop(name, None) is None:
+                return False
+            space["rules"].pop(name, None)
+            return True
+
+        return self._update(chat_id, change)
+
+    def get_rules(self, name: str, chat_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        spec = self._space(chat_id)["rules"].get(name)
+        return dict(spec) if isinstance(spec, dict) else None
 
+    def set_rules(self, name: str, rules: Optional[Dict[str, Any]], chat_id: Optional[int] = None) -> bool:
+        """Replaces a filter's rules; empty or None clears them. False if there is no such filter."""
+        def change(space: Dict[str, Dict[str, Any]]) -> bool:
+            if name not in space["filters"]:
+                return False
+            if rules:
+                space["rules"][name] = dict(rules)
+            else:
+                space["rules"].pop(name, None)
+            return True
 
+        return self._update(chat_id, change)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+from . import metrics
+from .parser import OlxAd
+from .seen_storage import SEEN_OP_SECONDS, _open_db
+
+NEW = "new"
+PRICE_CHANGED = "price_changed"
+REPOST = "repost"
+
+# index 0: no price or a currency not listed here
+_CURRENCIES = ("", "UAH", "USD", "EUR")
+_CURRENCY_INDEX = {code: i for i, code in enumerate(_CURRENCIES)}
+_WORD_RE = re.compile(r"\w+")
+
+FINGERPRINT_EVENTS = metrics.counter("olx_fingerprint_events_total", "Ads classified against fingerprints", ("kind",))
+
+
+class AdEvent(NamedTuple):
+    kind: str
+    ad: OlxAd
+    # what the fingerprint remembered, for price changes and re-posts
+    old_price: Optional[float] = None
+    old_currency: Optional[str] = None
+
+
+def _hash(text: str) -> int:
+    # 63 bits so it fits SQLite's signed INTEGER; never 0, which marks an empty slot
+    return (int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little") >> 1) | 1
+
+
+def content_key(ad: OlxAd) -> str:
+    """What stays the same when a seller re-posts: title words, area and place, not ID or price."""
+    title = " ".join(_WORD_RE.findall(ad.title.lower()))
+    area = f"{ad.area_m2:.1f}" if ad.area_m2 is not None else (ad.size or "").strip().lower()
+    place = ad.location_date.split(" - ")[0].strip().lower()
+    return f"{title}|{area}|{place}"
+
+
+class FingerprintTable:
+    """Fingerprints of the last ``capacity`` ads of one feed, kept in flat arrays.
+
+    A slot holds the hash of the ad ID, the hash of ``content_key`` and the last parsed
+    price. Slots form a ring, so the oldest ad is forgotten first. Two open-addressing
+    indexes map ID and content hashes to slots; entries are not removed when a slot is
+    reused (a lookup checks the slot still holds the hash) and both indexes are rebuilt
+    once stale entries pile up.
+    """
+
+    __slots__ = ("capacity", "ids", "contents", "prices", "currencies", "next_seq",
+                 "_mask", "_by_id", "_by_content", "_entries", "_dirty")
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(1, capacity)
+        self.ids = array("q", bytes(8 * self.capacity))
+        self.contents = array("q", bytes(8 * self.capacity))
+        self.prices = array("d", [math.nan]) * self.capacity
+        self.currencies = array("B", bytes(self.capacity))
+        self.next_seq = 0
+        # at most half full right after a rebuild
+        size = 1 << (2 * self.capacity).bit_length()
+        self._mask = size - 1
+        self._by_id = array("i", [-1]) * size
+        self._by_content = array("i", [-1]) * size
+        self._entries = 0
+        self._dirty: Set[int] = set()
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.ids, self.contents, self.prices, self.currencies,
+                                                 self._by_id, self._by_content))
+
+    def _find(self, index: array, keys: array, h: int) -> int:
+        mask = self._mask
+        i = h & mask
+        while True:
+            slot = index[i]
+            if slot < 0:
+                return -1
+            if keys[slot] == h:
+                return slot
+            i = (i + 1) & mask
+
+    def _find_all(self, index: array, keys: array, h: int) -> Iterator[int]:
+        mask = self._mask
+        i = h & mask
+        while True:
+            slot = index[i]
+            if slot < 0:
+                return
+            if keys[slot] == h:
+                yield slot
+            i = (i + 1) & mask
+
+    def _put(self, index: array, h: int, slot: int) -> None:
+        mask = self._mask
+        i = h & mask
+        while index[i] >= 0:
+            i = (i + 1) & mask
+        index[i] = slot
+
+    def _rebuild(self) -> None:
+        self._by_id = array("i", [-1]) * (self._mask + 1)
+        self._by_content = array("i", [-1]) * (self._mask + 1)
+        self._entries = 0
+        for slot in range(self.capacity):
+            if self.ids[slot]:
+                self._put(self._by_id, self.ids[slot], slot)
+                self._put(self._by_content, self.contents[slot], slot)
+                self._entries += 1
+
+    def put(self, seq: int, ad_hash: int, content_hash: int, price: float, currency: int) -> int:
+        """Stores a fingerprint in the slot for ``seq``; used when loading and by diff."""
+        slot = seq % self.capacity
+        self.ids[slot] = ad_hash
+        self.contents[slot] = content_hash
+        self.prices[slot] = price
+        self.currencies[slot] = currency
+        self.next_seq = max(self.next_seq, seq + 1)
+        self._dirty.add(slot)
+        if self._entries >= (self._mask + 1) * 3 // 4:
+            self._rebuild()
+        else:
+            self._put(self._by_id, ad_hash, slot)
+            self._put(self._by_content, content_hash, slot)
+            self._entries += 1
+        return slot
+
+    def diff(self, ads: Iterable[OlxAd]) -> List[AdEvent]:
+        """Classifies a batch in one pass and records it: every ad not seen before becomes
+        NEW or REPOST, a known ad whose price moved becomes PRICE_CHANGED; unchanged ads
+        produce nothing.
+
+        An ad is a re-post only of an ad recorded before this batch that is not in the
+        batch itself, so several live ads with the same wording all stay NEW."""
+        events: List[AdEvent] = []
+        ids, prices, currencies = self.ids, self.prices, self.currencies
+        ads = list(ads)
+        hashes = [_hash(ad.ad_id) for ad in ads]
+        in_batch = set(hashes)
+        added: Set[int] = set()
+        for ad, ad_hash in zip(ads, hashes):
+            price = math.nan if ad.price_value is None else ad.price_value
+            currency = _CURRENCY_INDEX.get(ad.currency or "", 0)
+            slot = self._find(self._by_id, ids, ad_hash)
+            if slot >= 0:
+                old = prices[slot]
+                if price == price:  # not NaN
+                    if old == old and (old != price or currencies[slot] != currency):
+                        events.append(AdEvent(PRICE_CHANGED, ad, old, _CURRENCIES[currencies[slot]] or None))
+                    if old != price or currencies[slot] != currency:
+                        prices[slot] = price
+                        currencies[slot] = currency
+                        self._dirty.add(slot)
+                continue
+            content_hash = _hash(content_key(ad))
+            prev = next((s for s in self._find_all(self._by_content, self.contents, content_hash)
+                         if s not in added and ids[s] not in in_batch), -1)
+            if prev >= 0:
+                old = prices[prev]
+                events.append(AdEvent(REPOST, ad, old if old == old else None,
+                                      _CURRENCIES[currencies[prev]] or None))
+            else:
+                events.append(AdEvent(NEW, ad))
+            added.add(self.put(self.next_seq, ad_hash, content_hash, price, currency))
+        return events
+
+    def take_dirty(self) -> Set[int]:
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+
+class FingerprintStore:
+    """A FingerprintTable per seen key, persisted to SQLite one row per slot.
+
+    Tables load on first use and stay in memory (about 41 KB each at the default
+    capacity of 1000); a diff writes back only the slots it touched.
+    """
+
+    def __init__(self, db_path: str, capacity: int = 1000):
+        self._lock = threading.RLock()
+        self._capacity = capacity
+        self._tables: Dict[str, FingerprintTable] = {}
+        self._conn = _open_db(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            " key TEXT NOT NULL,"
+            " slot INTEGER NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " ad INTEGER NOT NULL,"
+            " content INTEGER NOT NULL,"
+            " price REAL,"
+            " currency INTEGER NOT NULL,"
+            " PRIMARY KEY (key, slot)"
+            ") WITHOUT ROWID"
+        )
+
+    def _table(self, key: str) -> FingerprintTable:
+        table = self._tables.get(key)
+        if table is None:
+            table = FingerprintTable(self._capacity)
+            rows = self._conn.execute(
+                "SELECT seq, ad, content, price, currency FROM fingerprints WHERE key = ? ORDER BY seq", (key,))
+            for seq, ad_hash, content_hash, price, currency in rows:
+                table.put(seq, ad_hash, content_hash, math.nan if price is None else price, currency)
+            table.take_dirty()
+            # rows left over from a larger capacity
+            self._conn.execute("DELETE FROM fingerprints WHERE key = ? AND slot >= ?", (key, self._capacity))
+            self._tables[key] = table
+        return table
+
+    @SEEN_OP_SECONDS.timed(backend="fingerprints", op="diff")
+    def diff(self, key: str, ads: Iterable[OlxAd]) -> List[AdEvent]:
+        with self._lock:
+            table = self._table(key)
+            events = table.diff(ads)
+            dirty = table.take_dirty()
+            if dirty:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO fingerprints (key, slot, seq, ad, content, price, currency)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        ((key, slot, self._seq(table, slot), table.ids[slot], table.contents[slot],
+                          None if math.isnan(table.prices[slot]) else table.prices[slot], table.currencies[slot])
+                         for slot in dirty),
+                    )
+        for event in events:
+            FINGERPRINT_EVENTS.inc(kind=event.kind)
+        return events
+
+    @staticmethod
+    def _seq(table: FingerprintTable, slot: int) -> int:
+        # the newest sequence number that maps to this slot
+        last = table.next_seq - 1
+        return last - (last - slot) % table.capacity
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+class KVStorage(BaseStorage):
+    """aiogram FSM storage on the bot's key-value store (RedisKV or MemoryKV), so a
+    conversation started on one replica can finish on another.
+
+    Abandoned conversations expire after ``ttl_sec``. Calls run in a thread, since the
+    Redis client blocks and FSM state is looked up on every update.
+    """
+
+    def __init__(self, kv: Any, ttl_sec: float = 86400):
+        self._kv = kv
+        self._ttl = ttl_sec
+
+    @staticmethod
+    def _key(key: StorageKey, part: str) -> str:
+        thread = f":{key.thread_id}" if key.thread_id else ""
+        return f"fsm:{key.bot_id}:{key.chat_id}:{key.user_id}{thread}:{key.destiny}:{part}"
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        if value is None:
+            await asyncio.to_thread(self._kv.delete, self._key(key, "state"))
+        else:
+            await asyncio.to_thread(self._kv.set, self._key(key, "state"), value, self._ttl)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await asyncio.to_thread(self._kv.get, self._key(key, "state"))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not data:
+            await asyncio.to_thread(self._kv.delete, self._key(key, "data"))
+        else:
+            await asyncio.to_thread(self._kv.set, self._key(key, "data"),
+                                    json.dumps(data, ensure_ascii=False), self._ttl)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        raw = await asyncio.to_thread(self._kv.get, self._key(key, "data"))
+        return json.loads(raw) if raw else {}
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import AsyncIterator, Collection, Dict, List, Optional, TYPE_CHECKING
+
+import aiohttp
+
+from . import metrics
+from .parser import (
+    PAGE_LOAD_SECONDS,
+    OlxAd,
+    _Watermark,
+    _absolute_url,
+    _ad_from_fields,
+    _ads_from_rows,
+    _count_cards,
+    _is_captcha_page,
+    _load_page,
+    _page_exhausted,
+    _page_watermark,
+    _unseen,
+    page_url,
+)
+from .resilience import CaptchaDetected, Throttled, hedged
+
+if TYPE_CHECKING:
+    from .driver_pool import DriverPool
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "uk-UA,uk;q=0.9",
+}
+
+_VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "source", "track", "wbr",
+})
+
+BROWSER_FALLBACKS = metrics.counter(
+    "olx_http_browser_fallbacks_total", "Pages the http engine handed to Selenium", ("reason",))
+
+_STATE_RE = re.compile(r'window\.__PRERENDERED_STATE__\s*=\s*("(?:[^"\\]|\\.)*")', re.S)
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _CardsParser(HTMLParser):
+    """Collects l-card fields from server-rendered HTML using the same selectors as the Selenium path.
+
+    With a watermark, feeding stops (``_StopParsing``) as soon as the watermark is reached.
+    """
+
+    def __init__(self, watermark: Optional[_Watermark] = None):
+        super().__init__(convert_charrefs=True)
+        self._watermark = watermark
+        self.cards: List[Dict[str, Optional[str]]] = []
+        self._stack: List[str] = []
+        self._card: Optional[Dict[str, Optional[str]]] = None
+        self._card_depth = 0
+        # field name -> depth of the element whose text is being captured
+        self._capturing: Dict[str, int] = {}
+        self._buffers: Dict[str, List[str]] = {}
+        self._title_depth = 0
+        self._size_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attr = dict(attrs)
+        if tag not in _VOID_TAGS:
+            self._stack.append(tag)
+        depth = len(self._stack)
+
+        if self._card is None:
+            if attr.get("data-testid") == "l-card" and attr.get("id") and tag not in _VOID_TAGS:
+                self._card = {"id": attr["id"]}
+                self._card_depth = depth
+            return
+
+        card = self._card
+        classes = (attr.get("class") or "").split()
+        testid = attr.get("data-testid")
+        if testid == "adCard-featured":
+            card["promoted"] = True
+        if testid == "location-date" and "location_date" not in card:
+            self._start_capture("location_date", depth)
+        elif testid == "ad-price" and "price" not in card:
+            self._start_capture("price", depth)
+        if attr.get("data-cy") == "ad-card-title" and not self._title_depth:
+            self._title_depth = depth
+        elif tag == "h4" and self._title_depth and "title" not in card:
+            self._start_capture("title", depth)
+        if "css-1kfqt7f" in classes and not self._size_depth:
+            self._size_depth = depth
+        elif tag == "span" and self._size_depth and "size" not in card:
+            self._start_capture("size", depth)
+        if tag == "a" and "css-1tqlkj0" in classes and "href" not in card:
+            card["href"] = attr.get("href") or ""
+        if tag == "img" and "image_url" not in card:
+            src = attr.get("src")
+            card["image_url"] = _absolute_url(src) if src else src
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return
+        while self._stack:
+            depth = len(self._stack)
+            closed = self._stack.pop()
+            self._close_element(depth)
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        for field in self._capturing:
+            self._buffers[field].append(data)
+
+    def _start_capture(self, field: str, depth: int) -> None:
+        self._capturing[field] = depth
+        self._buffers[field] = []
+
+    def _close_element(self, depth: int) -> None:
+        if self._card is None:
+            return
+        for field, field_depth in list(self._capturing.items()):
+            if field_depth == depth:
+                self._card[field] = " ".join("".join(self._buffers.pop(field)).split())
+                del self._capturing[field]
+        if self._title_depth == depth:
+            self._title_depth = 0
+        if self._size_depth == depth:
+            self._size_depth = 0
+        if depth == self._card_depth:
+            card = self._card
+            self._card = None
+            self._capturing.clear()
+            self._buffers.clear()
+            self._title_depth = self._size_depth = 0
+            if self._watermark is not None and self._watermark.should_stop(
+                    card["id"] or "", bool(card.get("promoted")), card.get("location_date") or ""):
+                raise _StopParsing()
+            self.cards.append(card)
+
+
+def _today_label(raw: str) -> Optional[str]:
+    try:
+        created = datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        return None
+    try:
+        from zoneinfo import ZoneInfo
+        now = datetime.now(ZoneInfo("Europe/Kyiv"))
+    except Exception:
+        now = datetime.now().astimezone()
+    if created.tzinfo is not None:
+        created = created.astimezone(now.tzinfo)
+    if created.date() != now.date():
+        return None
+    return f"Сьогодні о {created:%H:%M}"
+
+
+def _ads_from_state(html: str, watermark: Optional[_Watermark] = None) -> Optional[List[OlxAd]]:
+    """Reads ads from the embedded page-state JSON; None if it is absent or has an unexpected shape."""
+    match = _STATE_RE.search(html)
+    if not match:
+        return None
+    try:
+        state = json.loads(json.loads(match.group(1)))
+        raw_ads = state["listing"]["listing"]["ads"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(raw_ads, list):
+        return None
+
+    ads: List[OlxAd] = []
+    seen = incomplete = 0
+    for raw in raw_ads:
+        try:
+            when = _today_label(raw.get("lastRefreshTime") or raw.get("createdTime"))
+            location = raw.get("location") or {}
+            place = ", ".join(p for p in (location.get("cityName"), location.get("districtName")) if p)
+            size = None
+            for param in raw.get("params") or []:
+                if param.get("key") == "total_area":
+                    size = param.get("value") or param.get("normalizedValue")
+                    break
+            regular = (raw.get("price") or {}).get("regularPrice") or {}
+            photos = raw.get("photos") or []
+            image_url = photos[0].replace("{width}", "1000").replace("{height}", "700") if photos else None
+            fields = {
+                "id": str(raw["id"]),
+                "promoted": bool(raw.get("isPromoted")),
+                "location_date": f"{place} - {when}" if when else place,
+                "title": raw.get("title") or "",
+                "price": (raw.get("price") or {}).get("displayValue") or "",
+                "price_value": regular.get("value"),
+                "currency": regular.get("currencyCode"),
+                "size": str(size) if size is not None else None,
+                "href": raw.get("url") or "",
+                "image_url": image_url,
+            }
+        except (AttributeError, KeyError, TypeError):
+            seen += 1
+            incomplete += 1
+            continue
+        if watermark is not None and watermark.should_stop(
+                fields["id"], fields["promoted"], fields["location_date"]):
+            break
+        seen += 1
+        ad = _ad_from_fields(fields)
+        if ad is not None:
+            ads.append(ad)
+    _count_cards(seen, len(ads), incomplete)
+    return ads
+
+
+def parse_listing_html(
+    html: str,
+    known_ids: Optional[Collection[str]] = None,
+    stop_after_known: int = 3,
+) -> Optional[List[OlxAd]]:
+    """Parses today's ads out of a listing page.
+
+    Returns None when neither the rendered cards nor the page-state JSON can be found,
+    which callers treat as "needs a real browser".
+    """
+    watermark = _Watermark(known_ids, stop_after_known) if known_ids is not None else None
+    return _parse_page(html, watermark)
+
+
+def _parse_page(html: str, watermark: Optional[_Watermark]) -> Optional[List[OlxAd]]:
+    parser = _CardsParser(watermark)
+    try:
+        parser.feed(html)
+        parser.close()
+    except _StopParsing:
+        return _ads_from_rows(parser.cards)
+    if parser.cards:
+        return _ads_from_rows(parser.cards)
+    return _ads_from_state(html, watermark)
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        # the HTTP-date form; the breaker's own backoff applies
+        return None
+
+
+class HttpFetcher:
+    """Fetches listings over pooled HTTP connections and falls back to Selenium when a page can't be parsed.
+
+    A request still running after ``hedge_after_sec`` gets a duplicate and the first
+    response wins. Throttling (HTTP 429/403) and captcha pages raise Throttled and
+    CaptchaDetected instead of falling back: a browser would be refused the same way.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[DriverPool] = None,
+        max_connections: int = 20,
+        fallback_workers: int = 2,
+        max_pages: int = 1,
+        page_concurrency: int = 2,
+        hedge_after_sec: float = 0,
+    ):
+        self._pool = pool
+        self._hedge_after = hedge_after_sec
+        self._max_connections = max_connections
+        self._max_pages = max_pages
+        self._page_concurrency = max(1, page_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._fallback_executor = ThreadPoolExecutor(max_workers=fallback_workers)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._max_connections, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+        return self._session
+
+    async def fetch_today_ads(
+        self,
+        listing_url: str,
+        timeout_sec: int = 20,
+        known_ids: Optional[Collection[str]] = None,
+        stop_after_known: int = 3,
+    ) -> List[OlxAd]:
+        """Same contract as parser.fetch_today_ads; extra pages are requested concurrently."""
+        ads: List[OlxAd] = []
+        async for page in self.stream_today_ads(listing_url, timeout_sec, known_ids, stop_after_known):
+            ads.extend(page)
+        return ads
+
+    async def stream_today_ads(
+        self,
+        listing_url: str,
+        timeout_sec: int = 20,
+        known_ids: Optional[Collection[str]] = None,
+        stop_after_known: int = 3,
+    ) -> AsyncIterator[List[OlxAd]]:
+        """Same contract as parser.iter_today_ads: each page's ads as soon as it is parsed."""
+
+        async def load(page: int):
+            watermark = _page_watermark(listing_url, self._max_pages, known_ids, stop_after_known)
+            return await self._fetch_page(page_url(listing_url, page), timeout_sec, watermark), watermark
+
+        first, watermark = await load(1)
+        yield first
+        if self._max_pages <= 1 or _page_exhausted(first, watermark, set()):
+            return
+
+        collected = {ad.ad_id for ad in first}
+        next_page = 2
+        while next_page <= self._max_pages:
+            batch = range(next_page, min(self._max_pages, next_page + self._page_concurrency - 1) + 1)
+            next_page = batch[-1] + 1
+            for ads, watermark in await asyncio.gather(*(load(page) for page in batch)):
+                exhausted = _page_exhausted(ads, watermark, collected)
+                fresh = _unseen(ads, collected)
+                if fresh:
+                    yield fresh
+                if exhausted:
+                    return
+
+    async def _fetch_page(self, url: str, timeout_sec: int, watermark: Optional[_Watermark]) -> List[OlxAd]:
+        loop = asyncio.get_running_loop()
+        ads: Optional[List[OlxAd]] = None
+        reason = "unparsed"
+        timeout = aiohttp.ClientTimeout(total=timeout_sec)
+
+        async def download() -> str:
+            with PAGE_LOAD_SECONDS.time(engine="http"):
+                async with self._get_session().get(url, timeout=timeout) as resp:
+                    if resp.status in (403, 429):
+                        raise Throttled(f"HTTP {resp.status} for {url}", _retry_after(resp.headers.get("Retry-After")))
+                    resp.raise_for_status()
+                    return await resp.text()
+
+        try:
+            html = await hedged(download, self._hedge_after)
+            # html.parser is CPU bound; keep it off the event loop
+            ads = await loop.run_in_executor(None, _parse_page, html, watermark)
+            if ads is None and _is_captcha_page(html):
+                raise CaptchaDetected(f"Captcha instead of listing on {url}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.info("HTTP fetch failed for %s (%s); using browser", url, e)
+            reason = "http_error"
+        if ads is not None:
+            return ads
+        BROWSER_FALLBACKS.inc(reason=reason)
+        logging.info("Falling back to Selenium for %s", url)
+        if watermark is not None:
+            # the HTML pass may have advanced it before giving up
+            watermark.reset()
+        pool = self._pool
+        if pool is None:
+            from .driver_pool import default_pool
+            pool = default_pool()
+        return await loop.run_in_executor(
+            self._fallback_executor, _load_page, url, timeout_sec, pool, "script", watermark)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+        self._fallback_executor.shutdown(wait=False)
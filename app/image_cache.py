@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+import aiohttp
+from aiogram.types import FSInputFile
+
+from . import metrics
+from .http_fetch import DEFAULT_HEADERS
+
+# Telegram rejects photos over 10 MB
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+IMAGE_LOOKUPS = metrics.counter("olx_image_lookups_total", "Photo sources chosen for a send", ("source",))
+IMAGE_DOWNLOADS = metrics.counter("olx_image_downloads_total", "Ad image prefetches", ("outcome",))
+IMAGE_CACHE_BYTES = metrics.gauge("olx_image_cache_bytes", "Bytes of ad images cached on disk")
+
+PhotoSource = Union[str, FSInputFile]
+
+
+class ImageCache:
+    """Prefetches ad photos so sends never wait on, or fail because of, the OLX CDN.
+
+    Images land in a size-bounded LRU directory. After the first successful send the
+    Telegram ``file_id`` is remembered, so every later send of the same image is a
+    reference instead of an upload.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 200 * 1024 * 1024,
+        max_connections: int = 8,
+        max_file_ids: int = 50000,
+        timeout_sec: float = 15,
+    ):
+        self._dir = Path(cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._max_connections = max_connections
+        self._max_file_ids = max_file_ids
+        self._timeout = aiohttp.ClientTimeout(total=timeout_sec)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # file name -> size, least recently used first
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self._file_ids: OrderedDict[str, str] = OrderedDict()
+        # URL -> download in progress (result: file name or None)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # URLs whose download failed; sent as text instead of letting Telegram fail on them too
+        self._failed: OrderedDict[str, None] = OrderedDict()
+        self._load_index()
+        IMAGE_CACHE_BYTES.set_function(lambda: self._bytes)
+
+    def _load_index(self) -> None:
+        entries = []
+        for path in self._dir.glob("*.img"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path.name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    @staticmethod
+    def _name(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".img"
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._max_connections, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS,
+                                                  timeout=self._timeout)
+        return self._session
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        """Starts background downloads for images that have neither a file_id nor a cached file."""
+        for url in urls:
+            if not url or url in self._file_ids or url in self._inflight or url in self._failed:
+                continue
+            if self._name(url) not in self._files:
+                task = asyncio.create_task(self._download(url))
+                self._inflight[url] = task
+                task.add_done_callback(lambda _t, u=url: self._inflight.pop(u, None))
+
+    def _mark_failed(self, url: str) -> None:
+        self._failed[url] = None
+        while len(self._failed) > self._max_file_ids:
+            self._failed.popitem(last=False)
+
+    async def _download(self, url: str) -> Optional[str]:
+        name = self._name(url)
+        try:
+            async with self._get_session().get(url) as resp:
+                if resp.status == 429 or resp.status >= 500:
+                    # the CDN is busy, not the image gone: a later send may try again
+                    IMAGE_DOWNLOADS.inc(outcome="error")
+                    logging.info("Image %s not cached: HTTP %s", url, resp.status)
+                    return None
+                if resp.status != 200 or not resp.content_type.startswith("image/"):
+                    IMAGE_DOWNLOADS.inc(outcome="rejected")
+                    logging.info("Image %s not cached: HTTP %s, %s", url, resp.status, resp.content_type)
+                    self._mark_failed(url)
+                    return None
+                if resp.content_length is not None and resp.content_length > MAX_IMAGE_BYTES:
+                    IMAGE_DOWNLOADS.inc(outcome="rejected")
+                    self._mark_failed(url)
+                    return None
+                # chunked responses have no length up front; stop reading once past the limit
+                data = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    data += chunk
+                    if len(data) > MAX_IMAGE_BYTES:
+                        break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # possibly transient; the send falls back to the URL
+            IMAGE_DOWNLOADS.inc(outcome="error")
+            logging.info("Image %s not cached: %s", url, e)
+            return None
+        if not data or len(data) > MAX_IMAGE_BYTES:
+            IMAGE_DOWNLOADS.inc(outcome="rejected")
+            self._mark_failed(url)
+            return None
+        tmp = self._dir / f".{name}.tmp"
+        try:
+            await asyncio.to_thread(self._write, tmp, self._dir / name, data)
+        except OSError:
+            logging.exception("Could not write image cache file for %s", url)
+            return None
+        IMAGE_DOWNLOADS.inc(outcome="ok")
+        self._files[name] = len(data)
+        self._bytes += len(data)
+        self._evict()
+        return name if name in self._files else None
+
+    @staticmethod
+    def _write(tmp: Path, path: Path, data: bytes | bytearray) -> None:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _evict(self) -> None:
+        while self._bytes > self._max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                (self._dir / name).unlink()
+            except OSError:
+                pass
+
+    async def source(self, url: str, wait_sec: float = 5) -> Optional[PhotoSource]:
+        """What to hand to send_photo for ``url``: a file_id, a cached upload, or None if the image is unusable.
+
+        Waits up to ``wait_sec`` for a prefetch still in flight; when nothing usable was
+        downloaded (no prefetch, slow CDN, network error) the URL itself is returned.
+        """
+        file_id = self._file_ids.get(url)
+        if file_id is not None:
+            self._file_ids.move_to_end(url)
+            IMAGE_LOOKUPS.inc(source="file_id")
+            return file_id
+        name = self._name(url)
+        task = self._inflight.get(url)
+        if task is not None and name not in self._files:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), wait_sec)
+            except asyncio.TimeoutError:
+                pass
+        if url in self._failed:
+            IMAGE_LOOKUPS.inc(source="unavailable")
+            return None
+        if name in self._files:
+            self._files.move_to_end(name)
+            path = self._dir / name
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            IMAGE_LOOKUPS.inc(source="disk")
+            return FSInputFile(path, filename="photo.jpg")
+        IMAGE_LOOKUPS.inc(source="url")
+        return url
+
+    def remember(self, url: str, file_id: str) -> None:
+        self._file_ids[url] = file_id
+        self._file_ids.move_to_end(url)
+        while len(self._file_ids) > self._max_file_ids:
+            self._file_ids.popitem(last=False)
+
+    def forget(self, url: str) -> None:
+        """Drops a file_id Telegram no longer accepts."""
+        self._file_ids.pop(url, None)
+
+    async def close(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import logging
+import math
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Collection, Deque, Dict, List, Optional, Tuple
+
+from .parser import OlxAd
+from .resilience import CaptchaDetected, Throttled
+
+
+def ad_to_dict(ad: OlxAd) -> Dict[str, Any]:
+    return dataclasses.asdict(ad)
+
+
+def ad_from_dict(data: Dict[str, Any]) -> OlxAd:
+    names = {f.name for f in dataclasses.fields(OlxAd)}
+    return OlxAd(**{k: v for k, v in data.items() if k in names})
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _send(conn: Connection, message: Any) -> None:
+    conn.send_bytes(json.dumps(message).encode("utf-8"))
+
+
+def _recv(conn: Connection) -> Any:
+    return json.loads(conn.recv_bytes())
+
+
+class SocketBroker:
+    """Job queue hosted in the bot process; workers connect with SocketBrokerClient.
+
+    Uses multiprocessing.connection, so the transport is authenticated with ``authkey``
+    (which must not be empty). Messages are JSON, never pickles, so a peer that gets past
+    the handshake still cannot run code in the other process.
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        if not authkey:
+            raise ValueError("SocketBroker needs a non-empty authkey")
+        self._address = parse_address(address)
+        self._authkey = authkey
+        self._jobs: queue.Queue = queue.Queue()
+        self._waiters: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[Listener] = None
+
+    def start(self) -> None:
+        self._listener = Listener(self._address, authkey=self._authkey)
+        threading.Thread(target=self._accept_loop, name="job-broker", daemon=True).start()
+        logging.info("Job broker listening on %s:%s", *self._address)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    async def run(self, job: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._waiters[job["id"]] = (loop, future)
+        self._jobs.put(job)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            with self._lock:
+                self._waiters.pop(job["id"], None)
+
+    def _resolve(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            waiter = self._waiters.get(job_id)
+        if waiter is None:
+            return
+        loop, future = waiter
+        loop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+    def _accept_loop(self) -> None:
+        while self._listener is not None:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._listener is not None:
+                    logging.exception("Job broker failed to accept a worker")
+                    continue
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    message = _recv(conn)
+                except (EOFError, OSError):
+                    return
+                except ValueError:
+                    logging.warning("Job broker dropped a worker that sent a malformed message")
+                    return
+                if not _well_formed(message):
+                    logging.warning("Job broker dropped a worker that sent an unknown message")
+                    return
+                if message[0] == "take":
+                    try:
+                        _send(conn, self._jobs.get(timeout=message[1]))
+                    except queue.Empty:
+                        _send(conn, None)
+                elif message[0] == "done":
+                    self._resolve(message[1], message[2])
+
+
+def _well_formed(message: Any) -> bool:
+    # what SocketBrokerClient sends: ["take", timeout] or ["done", job_id, result]
+    if not isinstance(message, list) or not message:
+        return False
+    if message[0] == "take":
+        return (len(message) == 2 and isinstance(message[1], (int, float))
+                and not isinstance(message[1], bool) and math.isfinite(message[1]) and message[1] >= 0)
+    if message[0] == "done":
+        return len(message) == 3 and isinstance(message[1], str) and isinstance(message[2], dict)
+    return False
+
+
+class SocketBrokerClient:
+    """Worker side of SocketBroker; one connection per consumer."""
+
+    def __init__(self, address: str, authkey: bytes):
+        if not authkey:
+            raise ValueError("SocketBrokerClient needs a non-empty authkey")
+        self._conn = Client(parse_address(address), authkey=authkey)
+        self._lock = threading.Lock()
+
+    def take(self, timeout: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            _send(self._conn, ["take", timeout])
+            return _recv(self._conn)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            _send(self._conn, ["done", job_id, result])
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class LocalRedis:
+    """In-process stand-in for the few Redis list commands RedisBroker uses."""
+
+    def __init__(self):
+        self._lists: Dict[str, Deque[bytes]] = {}
+        self._expires: Dict[str, float] = {}
+        self._cond = threading.Condition()
+
+    def lpush(self, key: str, *values: Any) -> int:
+        with self._cond:
+            items = self._lists.setdefault(key, deque())
+            for value in values:
+                items.appendleft(value.encode("utf-8") if isinstance(value, str) else value)
+            self._cond.notify_all()
+            return len(items)
+
+    def brpop(self, key: str, timeout: float = 0) -> Optional[Tuple[bytes, bytes]]:
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while True:
+                self._drop_expired()
+                items = self._lists.get(key)
+                if items:
+                    value = items.pop()
+                    if not items:
+                        self._lists.pop(key, None)
+                    return key.encode("utf-8"), value
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._cond:
+            self._expires[key] = time.monotonic() + seconds
+            return key in self._lists
+
+    def _drop_expired(self) -> None:
+        now = time.monotonic()
+        for key, at in list(self._expires.items()):
+            if at <= now:
+                self._expires.pop(key, None)
+                self._lists.pop(key, None)
+
+
+class RedisBroker:
+    """Job queue on a Redis-compatible server (LPUSH/BRPOP), shared by bot and workers.
+
+    ``client`` is a synchronous redis-py style client or a LocalRedis.
+    """
+
+    def __init__(self, client: Any, prefix: str = "olx", result_ttl_sec: int = 300):
+        self._client = client
+        self._jobs_key = f"{prefix}:jobs"
+        self._prefix = prefix
+        self._result_ttl = result_ttl_sec
+
+    def _result_key(self, job_id: str) -> str:
+        return f"{self._prefix}:result:{job_id}"
+
+    async def run(self, job: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        await asyncio.to_thread(self._client.lpush, self._jobs_key, json.dumps(job))
+        reply = await asyncio.to_thread(self._client.brpop, self._result_key(job["id"]), max(1, int(timeout)))
+        if reply is None:
+            raise asyncio.TimeoutError(f"No worker answered job {job['id']}")
+        return json.loads(reply[1])
+
+    def take(self, timeout: float) -> Optional[Dict[str, Any]]:
+        reply = self._client.brpop(self._jobs_key, max(1, int(timeout)))
+        return json.loads(reply[1]) if reply is not None else None
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        key = self._result_key(job_id)
+        self._client.lpush(key, json.dumps(result))
+        self._client.expire(key, self._result_ttl)
+
+    def close(self) -> None:
+        pass
+
+
+def redis_client(url: str) -> Any:
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError("JOB_BROKER=redis needs the 'redis' package (pip install redis)") from e
+    return redis.Redis.from_url(url)
+
+
+class RemoteFetcher:
+    """Fetcher that hands jobs to scraper workers instead of scraping in this process."""
+
+    def __init__(self, broker: Any, timeout_sec: float = 120):
+        self._broker = broker
+        self._timeout = timeout_sec
+
+    async def fetch_today_ads(
+        self,
+        listing_url: str,
+        timeout_sec: int = 20,
+        known_ids: Optional[Collection[str]] = None,
+    ) -> List[OlxAd]:
+        job = {
+            "id": uuid.uuid4().hex,
+            "url": listing_url,
+            "timeout_sec": timeout_sec,
+            "known_ids": sorted(known_ids) if known_ids is not None else None,
+            # workers skip jobs nobody is waiting for any more
+            "expires_at": time.time() + self._timeout,
+        }
+        result = await self._broker.run(job, self._timeout)
+        if "error" in result:
+            message = f"Worker failed on {listing_url}: {result['error']}"
+            # the scheduler's breaker treats these differently from other failures
+            if result["error"].startswith("CaptchaDetected"):
+                raise CaptchaDetected(message)
+            if result["error"].startswith("Throttled"):
+                raise Throttled(message)
+            raise RuntimeError(message)
+        return [ad_from_dict(d) for d in result.get("ads", [])]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable, List, Optional
+
+
+class KeywordAutomaton:
+    """Aho–Corasick automaton over lower-cased keywords.
+
+    Built once per rule set; a search is a single pass over the text however many
+    keywords there are, so a filter with hundreds of exclusions costs the same per ad
+    as one with a single keyword.
+    """
+
+    __slots__ = ("keywords", "_delta", "_out")
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = sorted({k.strip().lower() for k in keywords if k and k.strip()})
+        goto: List[dict] = [{}]
+        # the keyword ending at each node, directly or through its fail chain
+        self._out: List[Optional[str]] = [None]
+        for word in self.keywords:
+            node = 0
+            for ch in word:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    self._out.append(None)
+                node = nxt
+            self._out[node] = word
+        fail = [0] * len(goto)
+        # BFS order: a node's fail target is finished before the node itself
+        order = []
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for ch, child in goto[node].items():
+                queue.append(child)
+                target = fail[node]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                target = goto[target].get(ch, 0)
+                fail[child] = target if target != child else 0
+                if self._out[child] is None:
+                    self._out[child] = self._out[fail[child]]
+        # full transition table, so a search never walks fail links; moves back to the
+        # root are left out and come from the .get default
+        delta: List[dict] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        for node in order:
+            moves = dict(delta[fail[node]])
+            moves.update(goto[node])
+            delta[node] = moves
+        self._delta = delta
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def search(self, text: str) -> Optional[str]:
+        """The first keyword found in ``text`` (case-insensitive), or None."""
+        delta, out = self._delta, self._out
+        node = 0
+        for ch in text.lower():
+            node = delta[node].get(ch, 0)
+            if out[node] is not None:
+                return out[node]
+        return None
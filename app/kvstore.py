@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# SET the lease to us if it is free or already ours; PX renews it either way
+_ACQUIRE_LUA = """
+local holder = redis.call('GET', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+# HSET the field only if it still holds ARGV[2] (or is missing, when ARGV[3] is 1)
+_HCAS_LUA = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if (current == false and ARGV[3] == '1') or current == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[4])
+    return 1
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+class RedisKV:
+    """Shared state on a Redis-compatible server: strings, hashes, sorted sets and leases.
+
+    ``client`` is a synchronous redis-py client (see jobqueue.redis_client); every key is
+    put under ``prefix``. Calls block, like the file storages they replace, so callers
+    on the event loop should keep them to a few per update or move them to a thread.
+    """
+
+    def __init__(self, client: Any, prefix: str = "olx"):
+        self._client = client
+        self._prefix = prefix
+        self._acquire = client.register_script(_ACQUIRE_LUA)
+        self._release = client.register_script(_RELEASE_LUA)
+        self._hcas = client.register_script(_HCAS_LUA)
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}:{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        return _text(self._client.get(self._key(key)))
+
+    def set(self, key: str, value: str, ttl_sec: Optional[float] = None, only_new: bool = False) -> bool:
+        """Sets ``key``; with ``only_new`` only if it does not exist. True if it was set."""
+        px = int(ttl_sec * 1000) if ttl_sec else None
+        return bool(self._client.set(self._key(key), value, px=px, nx=only_new))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self._key(key))
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return _text(self._client.hget(self._key(key), field))
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        return {_text(k): _text(v) for k, v in self._client.hgetall(self._key(key)).items()}
+
+    def hset(self, key: str, field: str, value: str) -> None:
+        self._client.hset(self._key(key), field, value)
+
+    def hset_many(self, key: str, mapping: Dict[str, str]) -> None:
+        if mapping:
+            self._client.hset(self._key(key), mapping=mapping)
+
+    def hdel(self, key: str, field: str) -> bool:
+        return bool(self._client.hdel(self._key(key), field))
+
+    def hcas(self, key: str, field: str, expected: Optional[str], value: str) -> bool:
+        """Sets ``field`` to ``value`` only if it still holds ``expected`` (None: is missing)."""
+        args = [field, expected or "", "1" if expected is None else "0", value]
+        return bool(self._hcas(keys=[self._key(key)], args=args))
+
+    def zadd_new(self, key: str, members: Dict[str, float]) -> int:
+        """Adds members that are not in the sorted set yet (ZADD NX); returns how many."""
+        if not members:
+            return 0
+        return int(self._client.zadd(self._key(key), members, nx=True))
+
+    def zscores(self, key: str, members: Sequence[str]) -> List[Optional[float]]:
+        if not members:
+            return []
+        return list(self._client.zmscore(self._key(key), list(members)))
+
+    def zcard(self, key: str) -> int:
+        return int(self._client.zcard(self._key(key)))
+
+    def zcopy(self, src: str, dst: str) -> None:
+        """Replaces sorted set ``dst`` with a copy of ``src``."""
+        self._client.zunionstore(self._key(dst), [self._key(src)])
+
+    def ztrim(self, key: str, max_count: int = 0, min_score: Optional[float] = None) -> None:
+        """Drops members scored below ``min_score`` and all but the ``max_count`` highest."""
+        pipe = self._client.pipeline(transaction=False)
+        if min_score is not None:
+            pipe.zremrangebyscore(self._key(key), "-inf", f"({min_score}")
+        if max_count:
+            pipe.zremrangebyrank(self._key(key), 0, -max_count - 1)
+        pipe.execute()
+
+    def acquire(self, keys: Sequence[str], owner: str, ttl_sec: float) -> List[bool]:
+        """Takes or renews a lease on each key for ``ttl_sec``; False where another owner holds it."""
+        if not keys:
+            return []
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            self._acquire(keys=[self._key(key)], args=[owner, int(ttl_sec * 1000)], client=pipe)
+        return [bool(ok) for ok in pipe.execute()]
+
+    def release(self, keys: Sequence[str], owner: str) -> None:
+        """Gives up the leases on ``keys`` that ``owner`` still holds."""
+        if not keys:
+            return
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            self._release(keys=[self._key(key)], args=[owner], client=pipe)
+        pipe.execute()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class MemoryKV:
+    """In-process stand-in for RedisKV with the same methods and semantics.
+
+    State lives in this process only, so it serves tests and single-instance runs; leases
+    still expire, which lets tests play several replicas against one MemoryKV.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._strings: Dict[str, str] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        # member -> score, plus (score, member) pairs kept sorted for trimming
+        self._zsets: Dict[str, Tuple[Dict[str, float], List[Tuple[float, str]]]] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        at = self._expires.get(key)
+        if at is not None and at <= self._clock():
+            self._expires.pop(key, None)
+            self._strings.pop(key, None)
+        return self._strings.get(key)
+
+    def _put(self, key: str, value: str, ttl_sec: Optional[float]) -> None:
+        self._strings[key] = value
+        if ttl_sec:
+            self._expires[key] = self._clock() + ttl_sec
+        else:
+            self._expires.pop(key, None)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: str, ttl_sec: Optional[float] = None, only_new: bool = False) -> bool:
+        with self._lock:
+            if only_new and self._live(key) is not None:
+                return False
+            self._put(key, value, ttl_sec)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._strings.pop(key, None)
+            self._expires.pop(key, None)
+            self._hashes.pop(key, None)
+            self._zsets.pop(key, None)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(key, {}).get(field)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+    def hset(self, key: str, field: str, value: str) -> None:
+        with self._lock:
+            self._hashes.setdefault(key, {})[field] = value
+
+    def hset_many(self, key: str, mapping: Dict[str, str]) -> None:
+        with self._lock:
+            if mapping:
+                self._hashes.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key: str, field: str) -> bool:
+        with self._lock:
+            fields = self._hashes.get(key, {})
+            existed = fields.pop(field, None) is not None
+            if not fields:
+                self._hashes.pop(key, None)
+            return existed
+
+    def hcas(self, key: str, field: str, expected: Optional[str], value: str) -> bool:
+        with self._lock:
+            if self._hashes.get(key, {}).get(field) != expected:
+                return False
+            self._hashes.setdefault(key, {})[field] = value
+            return True
+
+    def zadd_new(self, key: str, members: Dict[str, float]) -> int:
+        with self._lock:
+            scores, ordered = self._zsets.setdefault(key, ({}, []))
+            added = 0
+            for member, score in members.items():
+                if member not in scores:
+                    scores[member] = score
+                    bisect.insort(ordered, (score, member))
+                    added += 1
+            return added
+
+    def zscores(self, key: str, members: Sequence[str]) -> List[Optional[float]]:
+        with self._lock:
+            scores = self._zsets.get(key, ({}, []))[0]
+            return [scores.get(m) for m in members]
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._zsets.get(key, ({}, []))[0])
+
+    def zcopy(self, src: str, dst: str) -> None:
+        with self._lock:
+            scores, ordered = self._zsets.get(src, ({}, []))
+            if scores:
+                self._zsets[dst] = (dict(scores), list(ordered))
+            else:
+                self._zsets.pop(dst, None)
+
+    def ztrim(self, key: str, max_count: int = 0, min_score: Optional[float] = None) -> None:
+        with self._lock:
+            if key not in self._zsets:
+                return
+            scores, ordered = self._zsets[key]
+            drop = bisect.bisect_left(ordered, (min_score, "")) if min_score is not None else 0
+            if max_count:
+                drop = max(drop, len(ordered) - max_count)
+            for _, member in ordered[:drop]:
+                del scores[member]
+            del ordered[:drop]
+
+    def acquire(self, keys: Sequence[str], owner: str, ttl_sec: float) -> List[bool]:
+        with self._lock:
+            granted = []
+            for key in keys:
+                holder = self._live(key)
+                ok = holder is None or holder == owner
+                if ok:
+                    self._put(key, owner, ttl_sec)
+                granted.append(ok)
+            return granted
+
+    def release(self, keys: Sequence[str], owner: str) -> None:
+        with self._lock:
+            for key in keys:
+                if self._live(key) == owner:
+                    self._strings.pop(key, None)
+                    self._expires.pop(key, None)
+
+    def close(self) -> None:
+        pass
+
+
+def open_kv(backend: str, redis_url: str = "", prefix: str = "olx") -> Any:
+    """The key-value store for STATE_BACKEND: RedisKV for "redis", otherwise a MemoryKV."""
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis needs the 'redis' package (pip install redis)") from e
+        return RedisKV(redis.Redis.from_url(redis_url), prefix=prefix)
+    return MemoryKV()
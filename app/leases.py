@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Any, Iterable, List, Set
+
+from . import metrics
+
+LEASES_HELD = metrics.gauge("olx_leases_held", "Feed leases this instance holds")
+LEASES_LOST = metrics.counter("olx_leases_lost_total", "Feed leases that another instance took over")
+LIVE_INSTANCES = metrics.gauge("olx_live_instances", "Bot instances seen sharing the state backend")
+
+
+def default_instance_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def lease_name(url: str) -> str:
+    """Short, stable lease name for a feed, from its normalized URL."""
+    return "feed:" + hashlib.blake2b(url.encode("utf-8"), digest_size=10).hexdigest()
+
+
+def _weight(owner: str, name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{owner}|{name}".encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class LeaseManager:
+    """Time-limited ownership of feeds in a shared key-value store.
+
+    Each replica claims the feeds it scrapes; a claim lasts ``ttl_sec`` and the owner
+    renews it by claiming again well before then. A replica that dies stops renewing,
+    and once its leases expire another replica claims them, so every feed has one
+    owner and its chats are notified once. Replicas also announce themselves with the
+    same TTL, and ``balance`` gives each feed to the live replica that rendezvous
+    hashing picks for it, so the feeds spread evenly and only the departed or new
+    replica's share moves. ``kv`` is a RedisKV or MemoryKV.
+    """
+
+    def __init__(self, kv: Any, owner: str, ttl_sec: float = 30):
+        self._kv = kv
+        self.owner = owner
+        self.ttl_sec = ttl_sec
+        self._held: Set[str] = set()
+        self._live: List[str] = [owner]
+        LEASES_HELD.set_function(lambda: len(self._held))
+        LIVE_INSTANCES.set_function(lambda: len(self._live))
+
+    def held(self) -> Set[str]:
+        return set(self._held)
+
+    def _heartbeat(self) -> List[str]:
+        """Announces this replica for another TTL and returns every replica still announced."""
+        now = time.time()
+        self._kv.hset("instances", self.owner, str(now + self.ttl_sec))
+        live = []
+        for owner, until in self._kv.hgetall("instances").items():
+            try:
+                alive = float(until) > now
+            except ValueError:
+                alive = False
+            if alive:
+                live.append(owner)
+            else:
+                self._kv.hdel("instances", owner)
+        return live or [self.owner]
+
+    def prefers(self, name: str) -> bool:
+        """Whether ``name`` belongs with this replica among the replicas last seen live."""
+        return max(self._live, key=lambda owner: _weight(owner, name)) == self.owner
+
+    def balance(self, names: Iterable[str]) -> Set[str]:
+        """Claims this replica's share of ``names``, releases every other lease it holds,
+        and returns the names it now holds."""
+        self._live = self._heartbeat()
+        mine = {n for n in names if self.prefers(n)}
+        self.release(self._held - mine)
+        return self.claim(mine)
+
+    def claim(self, names: Iterable[str]) -> Set[str]:
+        """Takes or renews a lease on each name; returns the ones this replica now holds."""
+        names = list(dict.fromkeys(names))
+        granted = self._kv.acquire([f"lease:{n}" for n in names], self.owner, self.ttl_sec)
+        won = {n for n, ok in zip(names, granted) if ok}
+        lost = (self._held & set(names)) - won
+        if lost:
+            LEASES_LOST.inc(len(lost))
+            logging.warning("Lost %d feed leases to other instances", len(lost))
+        self._held = (self._held - set(names)) | won
+        return won
+
+    def release(self, names: Iterable[str]) -> None:
+        names = [n for n in names if n in self._held]
+        if names:
+            self._kv.release([f"lease:{n}" for n in names], self.owner)
+            self._held.difference_update(names)
+
+    def release_all(self) -> None:
+        """Gives everything up on shutdown, so the other replicas take over at their next sync."""
+        self.release(list(self._held))
+        self._kv.hdel("instances", self.owner)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# seconds; wide enough for Chrome start-up and slow listing pages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        """Reads the value from ``fn`` at scrape time, e.g. a queue length."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        fn = self._functions.get(key)
+        return fn() if fn is not None else self._values.get(key, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                logging.exception("Gauge %s callback failed", self.name)
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Decorator form of ``time``."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, **labels) -> int:
+        row = self._values.get(self._key(labels))
+        return int(sum(row[:-1])) if row else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines: List[str] = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), row[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    """Process-wide set of metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Optional[Registry] = None) -> ThreadingHTTPServer:
+    """Serves ``GET /metrics`` from a daemon thread; call ``shutdown()`` on the result to stop it."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or REGISTRY
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info("Metrics available at http://%s:%s/metrics", host, server.server_address[1])
+    return server
@@ -1,17 +1,29 @@
 from __future__ import annotations
 
+import json
+import logging
+import os
+import re
+import threading
 import time
 from dataclasses import dataclass
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+from . import metrics
+from .resilience import CaptchaDetected
 
+# selenium and webdriver_manager are imported where they are used: importing them costs
+# far more than the rest of the bot, and the http engine or a job broker may never need them
+if TYPE_CHECKING:
+    from selenium import webdriver
 
-@dataclass
+    from .driver_pool import DriverPool
+
+
+# frozen and slotted: one listing's ads are shared by every subscriber of the feed
+@dataclass(frozen=True, slots=True)
 class OlxAd:
     ad_id: str
     title: str
@@ -20,83 +32,589 @@ class OlxAd:
     size: Optional[str]
     url: str
     image_url: Optional[str]
+    # numbers behind price/size for per-filter rules; None when the text has none ("Договірна")
+    price_value: Optional[float] = None
+    currency: Optional[str] = None
+    area_m2: Optional[float] = None
+
+
+_NUMBER_RE = re.compile(r"\d[\d \u00a0\u202f]*(?:[.,]\d+)?")
+_CURRENCY_MARKS = (("грн", "UAH"), ("$", "USD"), ("usd", "USD"), ("€", "EUR"), ("eur", "EUR"))
+
+
+def _number(text: str) -> Optional[float]:
+    match = _NUMBER_RE.search(text)
+    if match is None:
+        return None
+    digits = match.group().replace(" ", "").replace("\u00a0", "").replace("\u202f", "").replace(",", ".")
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def parse_price(text: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """``"60 000 $"`` -> ``(60000.0, "USD")``; prices without a currency mark are hryvnias."""
+    if not text:
+        return None, None
+    lowered = text.lower()
+    if "безкоштовно" in lowered:
+        return 0.0, "UAH"
+    value = _number(lowered)
+    if value is None:
+        return None, None
+    for mark, code in _CURRENCY_MARKS:
+        if mark in lowered:
+            return value, code
+    return value, "UAH"
+
+
+def parse_area(text: Optional[str]) -> Optional[float]:
+    """``"45,5 м²"`` -> ``45.5``."""
+    return _number(text) if text else None
+
+
+DRIVER_BUILD_SECONDS = metrics.histogram("olx_driver_build_seconds", "Time to start a Chrome session")
+PAGE_LOAD_SECONDS = metrics.histogram(
+    "olx_page_load_seconds", "Time from request to listing cards being available", ("engine",))
+CARDS_SEEN = metrics.counter("olx_cards_seen_total", "Listing cards read from result pages")
+CARDS_PARSED = metrics.counter("olx_cards_parsed_total", "Cards turned into today's ads")
+# today's cards missing a required field; a jump usually means OLX changed its markup
+CARDS_INCOMPLETE = metrics.counter("olx_cards_incomplete_total", "Today's cards that could not be parsed")
+
+_driver_path: Optional[str] = None
+_driver_path_cached = False
+_driver_path_lock = threading.Lock()
+# re-resolve now and then so Chrome updates pick up a matching driver
+CHROMEDRIVER_CACHE_MAX_AGE_SEC = 7 * 24 * 3600
+
+
+def _read_driver_cache(cache_file: str) -> Optional[str]:
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            data = json.load(f)
+        path = data["path"]
+        fresh = time.time() - float(data["resolved_at"]) < CHROMEDRIVER_CACHE_MAX_AGE_SEC
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if fresh and os.access(path, os.X_OK):
+        return path
+    return None
+
+
+def _write_driver_cache(cache_file: str, path: str) -> None:
+    tmp = f"{cache_file}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"path": path, "resolved_at": time.time()}, f)
+        os.replace(tmp, cache_file)
+    except OSError:
+        logging.warning("Could not write chromedriver cache %s", cache_file)
+
+
+def _chromedriver_path(cache_file: Optional[str] = None) -> str:
+    """Resolves chromedriver once per process, reusing the path saved in ``cache_file`` across restarts."""
+    # ChromeDriverManager().install() hits the network/cache and takes seconds
+    global _driver_path, _driver_path_cached
+    with _driver_path_lock:
+        if _driver_path is None and cache_file:
+            _driver_path = _read_driver_cache(cache_file)
+            _driver_path_cached = _driver_path is not None
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+            if cache_file:
+                _write_driver_cache(cache_file, _driver_path)
+        return _driver_path
+
+
+def _forget_cached_driver_path(cache_file: Optional[str]) -> bool:
+    """Drops a path that came from the disk cache; False if it was resolved in this process."""
+    global _driver_path, _driver_path_cached
+    with _driver_path_lock:
+        if not _driver_path_cached:
+            return False
+        _driver_path = None
+        _driver_path_cached = False
+        if cache_file:
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+        return True
+
+
+# Requests the parser never needs: media, fonts, analytics and ad networks.
+# Blocking downloads does not change the DOM, so img src attributes are still read.
+BLOCKED_URL_PATTERNS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm",
+    "*apollo.olxcdn.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*googlesyndication.com*",
+    "*doubleclick.net*", "*adservice.google.*", "*facebook.net*", "*connect.facebook.*",
+    "*hotjar.com*", "*criteo.*", "*adnxs.com*", "*scorecardresearch.com*", "*tiktok.com*",
+]
 
 
-def _build_driver() -> webdriver.Chrome:
+@DRIVER_BUILD_SECONDS.timed()
+def _build_driver(block_resources: bool = True, chromedriver_cache: Optional[str] = None) -> webdriver.Chrome:
+    from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
     options = Options()
     options.add_argument("--headless=new")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
     options.add_argument("--window-size=1366,768")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    if block_resources:
+        # cards are server-rendered; don't wait for subresources before handing the page back
+        options.page_load_strategy = "eager"
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+        })
+    try:
+        driver = webdriver.Chrome(service=Service(_chromedriver_path(chromedriver_cache)), options=options)
+    except WebDriverException:
+        # a cached driver stops matching once Chrome updates; resolve it again once
+        if not _forget_cached_driver_path(chromedriver_cache):
+            raise
+        logging.info("Cached chromedriver could not start Chrome; resolving it again")
+        driver = webdriver.Chrome(service=Service(_chromedriver_path(chromedriver_cache)), options=options)
     driver.set_page_load_timeout(30)
+    if block_resources:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception:
+            logging.warning("Could not enable request blocking for Chrome session")
     return driver
 
 
-def fetch_today_ads(listing_url: str, timeout_sec: int = 20) -> List[OlxAd]:
-    driver = _build_driver()
-    try:
-        driver.get(listing_url)
-        # allow dynamic content to load
-        time.sleep(3)
-        ads: List[OlxAd] = []
+OLX_BASE_URL = "https://www.olx.ua"
+CARD_SELECTOR = '[data-testid="l-card"][id]'
+# "ТОП" badge on paid cards, which are pinned above the newest-first order
+PROMOTED_SELECTOR = '[data-testid="adCard-featured"]'
 
-        cards = driver.find_elements(By.CSS_SELECTOR, '[data-testid="l-card"][id]')
-        for card in cards:
-            try:
-                ad_id = card.get_attribute("id") or ""
-                if not ad_id:
-                    continue
+# bot checks OLX (and its CDN) serves instead of a listing
+CAPTCHA_SELECTOR = (
+    'iframe[src*="captcha"], iframe[src*="challenges.cloudflare.com"], '
+    '#captcha, [class*="captcha"], #challenge-form, #cf-challenge-running'
+)
+_CAPTCHA_RE = re.compile(r"captcha|challenge-platform|cf-chl-", re.I)
+
+# a captcha counts as ready too, so a blocked page doesn't hold a session for the whole timeout
+_CARDS_READY_JS = (
+    "return document.querySelector(arguments[0]) !== null"
+    " || document.readyState === 'complete'"
+    " || document.querySelector(arguments[1]) !== null;"
+)
+_CAPTCHA_SHOWN_JS = "return document.querySelector(arguments[0]) !== null || /captcha/i.test(document.title);"
+
+# WebDriverException messages (and urllib3 errors) that mean the session itself is gone
+_DEAD_SESSION_MARKERS = (
+    "invalid session id", "chrome not reachable", "session deleted", "tab crashed",
+    "disconnected", "no such window", "connection refused", "max retries exceeded",
+)
+
+# Collects the same fields as _extract_cards_webdriver, for every card, in one round trip.
+# With a watermark (arguments[2] = known IDs) it stops where _Watermark would and returns
+# the card it stopped on as a bare row, so _until_watermark stops (and sets .stopped) there too.
+_EXTRACT_CARDS_JS = """
+const pick = (card, sel) => card.querySelector(sel);
+const text = (el) => el ? el.innerText : null;
+const known = arguments[2] ? new Set(arguments[2]) : null;
+const stopAfter = arguments[3];
+const rows = [];
+let run = 0;
+for (const card of document.querySelectorAll(arguments[0])) {
+    const id = card.getAttribute('id') || '';
+    const promoted = pick(card, arguments[1]) !== null;
+    const locationDate = text(pick(card, '[data-testid="location-date"]'));
+    if (known && !promoted) {
+        const today = (locationDate || '').includes('Сьогодні');
+        run = today && known.has(id) ? run + 1 : 0;
+        if (!today || run >= stopAfter) {
+            rows.push({id: id, promoted: promoted, location_date: locationDate});
+            break;
+        }
+    }
+    const link = pick(card, 'a.css-1tqlkj0');
+    const img = pick(card, 'img');
+    rows.push({
+        id: id,
+        promoted: promoted,
+        location_date: locationDate,
+        title: text(pick(card, '[data-cy="ad-card-title"] h4')),
+        price: text(pick(card, '[data-testid="ad-price"]')),
+        size: text(pick(card, '.css-1kfqt7f span')),
+        href: link ? (link.href || link.getAttribute('href') || '') : null,
+        image_url: img ? (img.src || img.getAttribute('src')) : null,
+    });
+}
+return rows;
+"""
+
+
+def is_newest_first(listing_url: str) -> bool:
+    """True when the search is sorted by creation date, so early termination is safe."""
+    return "created_at:desc" in unquote(listing_url)
+
+
+class _Watermark:
+    """Early-stop rule for newest-first listings.
+
+    Parsing stops at the first non-promoted card that is not from today, or once
+    ``stop_after_known`` consecutive non-promoted cards are already known.
+    Promoted cards are pinned out of order, so they never end the scan.
+    """
+
+    def __init__(self, known_ids: Collection[str], stop_after_known: int = 3):
+        self.known = known_ids
+        self.stop_after = max(1, stop_after_known)
+        self.stopped = False
+        self._run = 0
+
+    def reset(self) -> None:
+        self.stopped = False
+        self._run = 0
+
+    def should_stop(self, ad_id: str, promoted: bool, location_date: str) -> bool:
+        if promoted:
+            return False
+        if "Сьогодні" not in location_date:
+            self.stopped = True
+        elif ad_id in self.known:
+            self._run += 1
+            self.stopped = self._run >= self.stop_after
+        else:
+            self._run = 0
+        return self.stopped
+
+
+def page_url(listing_url: str, page: int) -> str:
+    """The listing URL for a given 1-based results page."""
+    parts = urlsplit(listing_url)
+    pairs = parse_qsl(parts.query, keep_blank_values=True)
+    if page <= 1 and all(k != "page" for k, _ in pairs):
+        return listing_url
+    query = [(k, v) for k, v in pairs if k != "page"]
+    if page > 1:
+        query.append(("page", str(page)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+def _unseen(ads: List[OlxAd], collected: set[str]) -> List[OlxAd]:
+    """The ads of a later page not already returned, recording them in ``collected``."""
+    fresh = [ad for ad in ads if ad.ad_id not in collected]
+    collected.update(ad.ad_id for ad in fresh)
+    return fresh
+
+
+def _until_watermark(rows: Iterable[dict], watermark: Optional[_Watermark]) -> Iterator[dict]:
+    for fields in rows:
+        if watermark is not None and watermark.should_stop(
+                fields.get("id") or "", bool(fields.get("promoted")), fields.get("location_date") or ""):
+            return
+        yield fields
 
-                # Location-date line must contain "Сьогодні"
-                loc_date_el = card.find_element(By.CSS_SELECTOR, '[data-testid="location-date"]')
-                loc_date = loc_date_el.text.strip()
-                if "Сьогодні" not in loc_date:
-                    continue
 
-                title_el = card.find_element(By.CSS_SELECTOR, '[data-cy="ad-card-title"] h4')
-                title = title_el.text.strip()
+def _absolute_url(href: str) -> str:
+    if href.startswith("/"):
+        return OLX_BASE_URL + href
+    return href
 
-                price_el = card.find_element(By.CSS_SELECTOR, '[data-testid="ad-price"]')
-                price = price_el.text.strip()
 
-                # size is optional, appears with blueprint icon sibling span
+def _ad_from_fields(fields: dict) -> Optional[OlxAd]:
+    """Builds an OlxAd from raw card fields, or None if the card is not from today."""
+    ad_id = fields.get("id") or ""
+    if not ad_id:
+        return None
+    loc_date = fields.get("location_date")
+    if loc_date is None:
+        return None
+    loc_date = loc_date.strip()
+    # Location-date line must contain "Сьогодні"
+    if "Сьогодні" not in loc_date:
+        return None
+    title = fields.get("title")
+    price = fields.get("price")
+    href = fields.get("href")
+    if title is None or price is None or href is None:
+        return None
+    size = fields.get("size")
+    price_value, currency = parse_price(price)
+    if isinstance(fields.get("price_value"), (int, float)):
+        # page state carries the number itself
+        price_value, currency = float(fields["price_value"]), fields.get("currency") or currency
+    return OlxAd(
+        ad_id=ad_id,
+        title=title.strip(),
+        price=price.strip(),
+        location_date=loc_date,
+        size=size.strip() if size is not None else None,
+        url=_absolute_url(href),
+        image_url=fields.get("image_url"),
+        price_value=price_value,
+        currency=currency,
+        area_m2=parse_area(size),
+    )
+
+
+def _count_cards(seen: int, parsed: int, incomplete: int) -> None:
+    CARDS_SEEN.inc(seen)
+    CARDS_PARSED.inc(parsed)
+    if incomplete:
+        CARDS_INCOMPLETE.inc(incomplete)
+
+
+def _ads_from_rows(rows: Iterable[dict], watermark: Optional[_Watermark] = None) -> List[OlxAd]:
+    ads: List[OlxAd] = []
+    seen = incomplete = 0
+    for row in _until_watermark(rows, watermark):
+        seen += 1
+        ad = _ad_from_fields(row)
+        if ad is not None:
+            ads.append(ad)
+        elif "Сьогодні" in (row.get("location_date") or ""):
+            incomplete += 1
+    _count_cards(seen, len(ads), incomplete)
+    return ads
+
+
+def _extract_cards_script(driver: webdriver.Chrome, watermark: Optional[_Watermark] = None) -> List[OlxAd]:
+    known = list(watermark.known) if watermark is not None else None
+    stop_after = watermark.stop_after if watermark is not None else 0
+    rows = driver.execute_script(_EXTRACT_CARDS_JS, CARD_SELECTOR, PROMOTED_SELECTOR, known, stop_after) or []
+    return _ads_from_rows(rows, watermark)
+
+
+def _extract_cards_webdriver(driver: webdriver.Chrome, watermark: Optional[_Watermark] = None) -> List[OlxAd]:
+    from selenium.webdriver.common.by import By
+
+    ads: List[OlxAd] = []
+    seen = incomplete = 0
+
+    cards = driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR)
+    for card in cards:
+        loc_date = ""
+        try:
+            ad_id = card.get_attribute("id") or ""
+            if not ad_id:
+                continue
+
+            # Location-date line must contain "Сьогодні"
+            loc_date_el = card.find_element(By.CSS_SELECTOR, '[data-testid="location-date"]')
+            loc_date = loc_date_el.text.strip()
+            if watermark is not None:
+                promoted = bool(card.find_elements(By.CSS_SELECTOR, PROMOTED_SELECTOR))
+                if watermark.should_stop(ad_id, promoted, loc_date):
+                    break
+            seen += 1
+            if "Сьогодні" not in loc_date:
+                continue
+
+            title_el = card.find_element(By.CSS_SELECTOR, '[data-cy="ad-card-title"] h4')
+            title = title_el.text.strip()
+
+            price_el = card.find_element(By.CSS_SELECTOR, '[data-testid="ad-price"]')
+            price = price_el.text.strip()
+
+            # size is optional, appears with blueprint icon sibling span
+            size_text = None
+            try:
+                size_span = card.find_element(By.CSS_SELECTOR, '.css-1kfqt7f span')
+                size_text = size_span.text.strip()
+            except Exception:
                 size_text = None
-                try:
-                    size_span = card.find_element(By.CSS_SELECTOR, '.css-1kfqt7f span')
-                    size_text = size_span.text.strip()
-                except Exception:
-                    size_text = None
-
-                # url inside main anchor
-                link_el = card.find_element(By.CSS_SELECTOR, 'a.css-1tqlkj0')
-                href = link_el.get_attribute("href") or ""
-                if href.startswith("/"):
-                    href = "https://www.olx.ua" + href
-
-                # image url if present
+
+            # url inside main anchor
+            link_el = card.find_element(By.CSS_SELECTOR, 'a.css-1tqlkj0')
+            href = _absolute_url(link_el.get_attribute("href") or "")
+
+            # image url if present
+            image_url = None
+            try:
+                img_el = card.find_element(By.CSS_SELECTOR, 'img')
+                image_url = img_el.get_attribute("src")
+            except Exception:
                 image_url = None
-                try:
-                    img_el = card.find_element(By.CSS_SELECTOR, 'img')
-                    image_url = img_el.get_attribute("src")
-                except Exception:
-                    image_url = None
-
-                ads.append(OlxAd(
-                    ad_id=ad_id,
-                    title=title,
-                    price=price,
-                    location_date=loc_date,
-                    size=size_text,
-                    url=href,
-                    image_url=image_url,
-                ))
+
+            price_value, currency = parse_price(price)
+            ads.append(OlxAd(
+                ad_id=ad_id,
+                title=title,
+                price=price,
+                location_date=loc_date,
+                size=size_text,
+                url=href,
+                image_url=image_url,
+                price_value=price_value,
+                currency=currency,
+                area_m2=parse_area(size_text),
+            ))
+        except Exception:
+            if "Сьогодні" in loc_date:
+                incomplete += 1
+            continue
+
+    _count_cards(seen, len(ads), incomplete)
+    return ads
+
+
+def _load_page(
+    listing_url: str,
+    timeout_sec: int,
+    pool: DriverPool,
+    extraction: str,
+    watermark: Optional[_Watermark],
+) -> List[OlxAd]:
+    """Reads one result page in a pooled session. A session that dies mid-page is
+    dropped by the pool and the page is tried once more in a fresh one."""
+    try:
+        return _read_page(listing_url, timeout_sec, pool, extraction, watermark)
+    except Exception as e:
+        if not _session_died(e):
+            raise
+        logging.warning("Chrome session died on %s (%s); retrying in a fresh one", listing_url, e)
+    if watermark is not None:
+        watermark.reset()
+    return _read_page(listing_url, timeout_sec, pool, extraction, watermark)
+
+
+def _session_died(exc: BaseException) -> bool:
+    if type(exc).__name__ == "TimeoutException":
+        # a slow page, not a dead browser; retrying here would only hold the slot longer
+        return False
+    text = str(exc).lower()
+    return isinstance(exc, ConnectionError) or any(marker in text for marker in _DEAD_SESSION_MARKERS)
+
+
+def _read_page(
+    listing_url: str,
+    timeout_sec: int,
+    pool: DriverPool,
+    extraction: str,
+    watermark: Optional[_Watermark],
+) -> List[OlxAd]:
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    with pool.borrow() as driver:
+        with PAGE_LOAD_SECONDS.time(engine="selenium"):
+            driver.get(listing_url)
+            # wait until cards are in the DOM, or the page finished loading without any
+            try:
+                WebDriverWait(driver, timeout_sec, poll_frequency=0.2).until(
+                    lambda d: d.execute_script(_CARDS_READY_JS, CARD_SELECTOR, CAPTCHA_SELECTOR))
+            except TimeoutException:
+                logging.info("No listing cards after %ss on %s", timeout_sec, listing_url)
+        if extraction == "webdriver":
+            ads = _extract_cards_webdriver(driver, watermark)
+        else:
+            try:
+                ads = _extract_cards_script(driver, watermark)
             except Exception:
-                continue
+                logging.exception("Script extraction failed for %s; falling back to per-element reads", listing_url)
+                if watermark is not None:
+                    watermark.reset()
+                ads = _extract_cards_webdriver(driver, watermark)
+        blocked = not ads and driver.execute_script(_CAPTCHA_SHOWN_JS, CAPTCHA_SELECTOR)
+    if blocked:
+        raise CaptchaDetected(f"Captcha instead of listing on {listing_url}")
+    return ads
+
 
-        return ads
+def _is_captcha_page(html: str) -> bool:
+    """For HTML that yielded no ads: does it look like a bot check rather than a listing?"""
+    return bool(_CAPTCHA_RE.search(html))
+
+
+def _page_watermark(
+    listing_url: str,
+    max_pages: int,
+    known_ids: Optional[Collection[str]],
+    stop_after_known: int,
+) -> Optional[_Watermark]:
+    # multi-page crawls of newest-first listings always need the stop rule to know where to end
+    if known_ids is None and max_pages > 1 and is_newest_first(listing_url):
+        known_ids = ()
+    return _Watermark(known_ids, stop_after_known) if known_ids is not None else None
+
+
+def _page_exhausted(ads: List[OlxAd], watermark: Optional[_Watermark], collected: set[str]) -> bool:
+    """True when later pages can't hold anything new: the stop rule fired, the page had
+    no ads from today, or OLX served a page we already have (past the last page)."""
+    if watermark is not None and watermark.stopped:
+        return True
+    return not ads or all(ad.ad_id in collected for ad in ads)
+
+
+def iter_today_ads(
+    listing_url: str,
+    timeout_sec: int = 20,
+    pool: Optional[DriverPool] = None,
+    extraction: str = "script",
+    known_ids: Optional[Collection[str]] = None,
+    stop_after_known: int = 3,
+    max_pages: int = 1,
+    page_concurrency: int = 2,
+) -> Iterator[List[OlxAd]]:
+    """Loads a listing and yields today's ads page by page, as soon as each page is read.
+
+    ``extraction="script"`` reads all cards with a single in-page script call;
+    ``"webdriver"`` walks the cards element by element. Passing ``known_ids``
+    (only valid for newest-first listings) stops parsing at the watermark.
+    With ``max_pages > 1`` further pages are fetched ``page_concurrency`` at a time
+    until one of them has nothing new; ads that shifted onto a later page mid-crawl
+    are yielded once.
+    """
+    if pool is None:
+        from .driver_pool import default_pool
+        pool = default_pool()
+
+    def load(page: int) -> Tuple[List[OlxAd], Optional[_Watermark]]:
+        watermark = _page_watermark(listing_url, max_pages, known_ids, stop_after_known)
+        return _load_page(page_url(listing_url, page), timeout_sec, pool, extraction, watermark), watermark
+
+    first, watermark = load(1)
+    yield first
+    if max_pages <= 1 or _page_exhausted(first, watermark, set()):
+        return
+
+    collected = {ad.ad_id for ad in first}
+    next_page = 2
+    workers = max(1, min(page_concurrency, pool.size))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while next_page <= max_pages:
+            batch = range(next_page, min(max_pages, next_page + workers - 1) + 1)
+            next_page = batch[-1] + 1
+            for ads, watermark in executor.map(load, batch):
+                exhausted = _page_exhausted(ads, watermark, collected)
+                fresh = _unseen(ads, collected)
+                if fresh:
+                    yield fresh
+                if exhausted:
+                    return
     finally:
-        driver.quit()
+        # a consumer that stops early doesn't wait for page loads nobody will read
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
+def fetch_today_ads(
+    listing_url: str,
+    timeout_sec: int = 20,
+    pool: Optional[DriverPool] = None,
+    extraction: str = "script",
+    known_ids: Optional[Collection[str]] = None,
+    stop_after_known: int = 3,
+    max_pages: int = 1,
+    page_concurrency: int = 2,
+) -> List[OlxAd]:
+    """Loads a listing and returns today's ads; iter_today_ads without the streaming."""
+    return [ad for page in iter_today_ads(listing_url, timeout_sec, pool, extraction, known_ids,
+                                          stop_after_known, max_pages, page_concurrency)
+            for ad in page]
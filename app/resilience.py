@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+from . import metrics
+
+T = TypeVar("T")
+
+FETCH_FAILURES = metrics.counter("olx_fetch_failures_total", "Failed listing fetches by kind", ("kind",))
+FETCHES_REFUSED = metrics.counter("olx_fetch_refused_total", "Fetches refused while their host was backing off")
+OPEN_CIRCUITS = metrics.gauge("olx_open_circuits", "Hosts whose circuit breaker is open")
+HEDGED_REQUESTS = metrics.counter("olx_hedged_requests_total", "Duplicate requests sent for slow pages", ("outcome",))
+
+
+class CaptchaDetected(RuntimeError):
+    """OLX answered with a captcha or bot challenge instead of a listing."""
+
+
+class Throttled(RuntimeError):
+    """OLX refused the request outright (HTTP 429 or 403)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of fetching while the host is backing off."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is backing off for another {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def failure_kind(exc: BaseException) -> str:
+    if isinstance(exc, CaptchaDetected):
+        return "captcha"
+    if isinstance(exc, Throttled):
+        return "throttled"
+    # selenium's TimeoutException is not a TimeoutError
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or type(exc).__name__ == "TimeoutException":
+        return "timeout"
+    return "error"
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def backoff_delay(failures: int, base_sec: float, max_sec: float) -> float:
+    """Exponential backoff with equal jitter: half of the delay is fixed, half random,
+    so retries spread out without any of them coming straight back."""
+    delay = min(max_sec, base_sec * 2 ** max(0, failures - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class _HostState:
+    __slots__ = ("failures", "blocked_until", "probing")
+
+    def __init__(self):
+        self.failures = 0
+        self.blocked_until = 0.0
+        self.probing = False
+
+
+class CircuitBreaker:
+    """Per-host backoff and circuit breaker shared by every feed fetching from that host.
+
+    Each failure blocks the host for an exponentially growing, jittered delay, so feeds
+    that all hit a throttled site spread out instead of retrying in lockstep. After
+    ``failure_threshold`` failures in a row, or at once on a captcha, the circuit opens:
+    when the delay runs out a single probe fetch is let through, and everything else is
+    refused until that probe succeeds. ``check`` refuses with CircuitOpen, so callers
+    can do it before taking a worker slot.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        base_sec: float = 5,
+        max_sec: float = 900,
+        captcha_sec: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._threshold = max(1, failure_threshold)
+        self._base = base_sec
+        self._max = max(max_sec, base_sec)
+        self._captcha = captcha_sec
+        self._clock = clock
+        self._hosts: Dict[str, _HostState] = {}
+        OPEN_CIRCUITS.set_function(self.open_count)
+
+    def open_count(self) -> int:
+        return sum(1 for s in list(self._hosts.values()) if s.failures >= self._threshold)
+
+    def check(self, url: str) -> None:
+        """Raises CircuitOpen when ``url``'s host may not be fetched now; otherwise the
+        caller must report back with ``success``, ``failure`` or ``release``."""
+        host = host_of(url)
+        state = self._hosts.get(host)
+        if state is None:
+            return
+        wait = state.blocked_until - self._clock()
+        if wait <= 0 and state.failures >= self._threshold:
+            if not state.probing:
+                state.probing = True
+                logging.info("Probing %s after %d failures", host, state.failures)
+                return
+            # the probe is still out; look again in a little while
+            wait = self._base
+        if wait > 0:
+            FETCHES_REFUSED.inc()
+            raise CircuitOpen(host, wait)
+
+    def success(self, url: str) -> None:
+        state = self._hosts.pop(host_of(url), None)
+        if state is not None and state.failures >= self._threshold:
+            logging.info("Circuit for %s closed", host_of(url))
+
+    def failure(self, url: str, exc: BaseException) -> None:
+        kind = failure_kind(exc)
+        FETCH_FAILURES.inc(kind=kind)
+        host = host_of(url)
+        state = self._hosts.setdefault(host, _HostState())
+        was_open = state.failures >= self._threshold
+        state.probing = False
+        state.failures += 1
+        if kind == "captcha":
+            state.failures = max(state.failures, self._threshold)
+        delay = backoff_delay(state.failures, self._base, self._max)
+        if kind == "captcha":
+            delay = max(delay, self._captcha)
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(retry_after, self._max))
+        state.blocked_until = max(state.blocked_until, self._clock() + delay)
+        if state.failures >= self._threshold:
+            logging.warning("Circuit for %s %s after %s (%d failures); next try in %.0fs",
+                            host, "stays open" if was_open else "opened", kind, state.failures, delay)
+
+    def release(self, url: str) -> None:
+        """Gives up a check without an outcome (the fetch was cancelled), freeing the probe."""
+        state = self._hosts.get(host_of(url))
+        if state is not None:
+            state.probing = False
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float, attempts: int = 2) -> T:
+    """Awaits ``call()``, starting another copy each time ``delay`` seconds pass without
+    a result, up to ``attempts`` copies. The first copy to succeed wins and the others
+    are cancelled; a copy that fails only fails the call once no other is left running.
+    """
+    if delay <= 0 or attempts <= 1:
+        return await call()
+    primary = asyncio.ensure_future(call())
+    running: List[asyncio.Future] = [primary]
+    launched = 1
+    error: Optional[BaseException] = None
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, timeout=delay if launched < attempts else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                running.append(asyncio.ensure_future(call()))
+                launched += 1
+                HEDGED_REQUESTS.inc(outcome="sent")
+                continue
+            for task in done:
+                running.remove(task)
+                if task.exception() is None:
+                    if launched > 1:
+                        HEDGED_REQUESTS.inc(outcome="lost" if task is primary else "won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in running:
+            task.cancel()
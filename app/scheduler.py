@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Collection, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from . import metrics
+from .driver_pool import DriverPool
+from .parser import OlxAd, iter_today_ads
+from .resilience import CircuitBreaker
+from .tracker import AdaptiveInterval, Fetcher, Streamer, Tracker, iterate_in_executor, single_batch
+
+ACTIVE_FEEDS = metrics.gauge("olx_active_feeds", "Unique listing URLs being polled")
+ACTIVE_SUBSCRIPTIONS = metrics.gauge("olx_active_trackers", "Chats with tracking switched on")
+FETCH_SECONDS = metrics.histogram("olx_fetch_seconds", "Full listing fetch, all pages, including queueing")
+FIRST_PAGE_SECONDS = metrics.histogram("olx_fetch_first_page_seconds",
+                                       "From the start of a poll to its first page of ads, including queueing")
+FETCH_ERRORS = metrics.counter("olx_fetch_errors_total", "Listing fetches that raised")
+
+OnNewAds = Callable[[List[OlxAd]], Optional[Awaitable[None]]]
+OnPollDone = Callable[[], Optional[Awaitable[None]]]
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a listing URL so equivalent searches share one feed."""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    path = parts.path or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+class Subscription:
+    """Handle returned by ScrapeScheduler.subscribe; quacks like a Tracker for callers.
+
+    Pages of ads wait in a bounded queue and a task per subscription runs ``on_new_ads``
+    on them in order, so the feed goes on to its next page while this chat's dedup and
+    sends happen; a full queue holds the feed back instead of buffering without limit.
+    ``on_poll_done`` runs in the same order, after the last page of each poll.
+    """
+
+    def __init__(self, scheduler: ScrapeScheduler, key: str, on_new_ads: OnNewAds, queue_size: int = 4,
+                 on_poll_done: Optional[OnPollDone] = None):
+        self._scheduler = scheduler
+        self.key = key
+        self.on_new_ads = on_new_ads
+        self.on_poll_done = on_poll_done
+        self._active = True
+        # None marks the end of a poll
+        self._queue: asyncio.Queue[Optional[List[OlxAd]]] = asyncio.Queue(maxsize=max(1, queue_size))
+        self._consumer = asyncio.create_task(self._consume())
+
+    def is_running(self) -> bool:
+        return self._active and self._scheduler.is_polling(self.key)
+
+    async def push(self, ads: List[OlxAd]) -> None:
+        if self._active:
+            await self._queue.put(ads)
+
+    async def poll_done(self) -> None:
+        if self._active and self.on_poll_done is not None:
+            await self._queue.put(None)
+
+    async def _consume(self) -> None:
+        while True:
+            ads = await self._queue.get()
+            try:
+                maybe_future = self.on_new_ads(ads) if ads is not None else self.on_poll_done()
+                if maybe_future is not None:
+                    await maybe_future
+            except Exception:
+                logging.exception("Subscriber callback failed for %s", self.key)
+            finally:
+                self._queue.task_done()
+
+    async def _close(self, drain_sec: float = 0) -> None:
+        """Stops the consumer, first letting it finish queued pages for up to ``drain_sec``."""
+        self._active = False
+        if drain_sec > 0 and not self._consumer.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_sec)
+            except asyncio.TimeoutError:
+                logging.info("Dropping %d queued pages for %s", self._queue.qsize(), self.key)
+        self._consumer.cancel()
+        # a producer blocked on a full queue must not wait for a consumer that is gone
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    async def stop(self):
+        if self._active:
+            await self._scheduler.unsubscribe(self)
+            await self._close()
+
+
+class _Feed:
+    def __init__(self, url: str, tracker: Tracker):
+        self.url = url
+        self.tracker = tracker
+        self.subscribers: List[Subscription] = []
+
+
+class ScrapeScheduler:
+    """Polls every unique listing URL once per interval and fans the ads out to all subscribers.
+
+    ``max_workers`` bounds how many fetches run at the same time across all feeds.
+    When ``schedule_factory`` is given, each feed gets its own adaptive interval.
+    Ads flow page by page: with a ``streamer`` (or the default Selenium path) the first
+    page reaches subscribers while later pages are still loading; a plain ``fetcher``
+    delivers a poll as one page.
+
+    Fetches go through a per-host ``breaker``: while a host backs off, polls are refused
+    before they take a worker slot, and a slot freed by a failure goes to a feed that
+    can make progress.
+    """
+
+    def __init__(
+        self,
+        interval_sec: int = 60,
+        max_workers: int = 3,
+        pool: Optional[DriverPool] = None,
+        fetcher: Optional[Fetcher] = None,
+        schedule_factory: Optional[Callable[[], AdaptiveInterval]] = None,
+        watermark_size: int = 100,
+        max_pages: int = 1,
+        page_concurrency: int = 2,
+        streamer: Optional[Streamer] = None,
+        queue_size: int = 4,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._interval = interval_sec
+        self._watermark_size = watermark_size
+        self._max_pages = max_pages
+        self._page_concurrency = page_concurrency
+        self._schedule_factory = schedule_factory
+        self._pool = pool
+        self._fetcher = fetcher
+        self._streamer = streamer
+        self._queue_size = queue_size
+        self._breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max(1, max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._feeds: Dict[str, _Feed] = {}
+        self._lock = asyncio.Lock()
+        ACTIVE_FEEDS.set_function(lambda: len(self._feeds))
+        ACTIVE_SUBSCRIPTIONS.set_function(lambda: sum(len(f.subscribers) for f in list(self._feeds.values())))
+
+    def is_polling(self, key: str) -> bool:
+        feed = self._feeds.get(key)
+        return feed is not None and feed.tracker.is_running()
+
+    def feed_count(self) -> int:
+        return len(self._feeds)
+
+    async def subscribe(self, url: str, on_new_ads: OnNewAds, start_delay: float = 0,
+                        on_poll_done: Optional[OnPollDone] = None) -> Subscription:
+        """Adds a subscriber to the feed for ``url``, starting the feed if needed.
+
+        ``start_delay`` postpones the first poll of a new feed (used to spread out restores);
+        with a delay, joining a running feed waits for its next regular poll.
+        """
+        key = normalize_url(url)
+        async with self._lock:
+            feed = self._feeds.get(key)
+            if feed is not None and not feed.tracker.is_running():
+                await feed.tracker.stop()
+                feed = None
+            subscription = Subscription(self, key, on_new_ads, self._queue_size, on_poll_done)
+            if feed is None:
+                schedule = self._schedule_factory() if self._schedule_factory else None
+                feed = _Feed(url, Tracker(interval_sec=self._interval, streamer=self._stream, schedule=schedule,
+                                          watermark_size=self._watermark_size))
+                feed.subscribers.append(subscription)
+                self._feeds[key] = feed
+                await feed.tracker.start(url, lambda ads, f=feed: self._dispatch(f, ads), initial_delay=start_delay,
+                                         on_poll_done=lambda f=feed: self._dispatch_poll_done(f))
+                logging.info("Started feed %s", key)
+            else:
+                feed.subscribers.append(subscription)
+                # give the newcomer a full page now instead of after a full interval
+                feed.tracker.reset_watermark()
+                if not start_delay:
+                    feed.tracker.wake()
+                logging.info("Joined feed %s (%d subscribers)", key, len(feed.subscribers))
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        async with self._lock:
+            feed = self._feeds.get(subscription.key)
+            if feed is None:
+                return
+            if subscription in feed.subscribers:
+                feed.subscribers.remove(subscription)
+            if feed.subscribers:
+                return
+            self._feeds.pop(subscription.key, None)
+        await feed.tracker.stop()
+        logging.info("Stopped feed %s", subscription.key)
+
+    async def close(self, drain_sec: float = 5) -> None:
+        """Stops all feeds, then gives subscribers ``drain_sec`` to finish pages already queued."""
+        async with self._lock:
+            feeds = list(self._feeds.values())
+            self._feeds.clear()
+        for feed in feeds:
+            await feed.tracker.stop()
+        await asyncio.gather(*(s._close(drain_sec) for feed in feeds for s in feed.subscribers))
+        self._executor.shutdown(wait=False)
+
+    def _pages(self, url: str, known_ids: Optional[Collection[str]]) -> AsyncIterator[List[OlxAd]]:
+        if self._streamer is not None:
+            return self._streamer(url, known_ids=known_ids)
+        if self._fetcher is not None:
+            return single_batch(self._fetcher(url, known_ids=known_ids))
+        return iterate_in_executor(self._executor, iter_today_ads(
+            url, 20, self._pool,
+            known_ids=known_ids,
+            max_pages=self._max_pages,
+            page_concurrency=self._page_concurrency,
+        ))
+
+    async def _stream(self, url: str, known_ids: Optional[Collection[str]] = None) -> AsyncIterator[List[OlxAd]]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first = True
+        # raises CircuitOpen while the host backs off, before a worker slot is taken
+        self._breaker.check(url)
+        settled = False
+        try:
+            with FETCH_SECONDS.time():
+                async with self._semaphore:
+                    async with aclosing(self._pages(url, known_ids)) as pages:
+                        async for ads in pages:
+                            if first:
+                                FIRST_PAGE_SECONDS.observe(loop.time() - started)
+                                first = False
+                                self._breaker.success(url)
+                                settled = True
+                            yield ads
+            if not settled:
+                self._breaker.success(url)
+                settled = True
+        except Exception as e:
+            FETCH_ERRORS.inc()
+            self._breaker.failure(url, e)
+            settled = True
+            raise
+        finally:
+            if not settled:
+                self._breaker.release(url)
+
+    async def _dispatch(self, feed: _Feed, ads: List[OlxAd]) -> None:
+        # one page, shared by all subscribers: OlxAd is immutable
+        await asyncio.gather(*(s.push(ads) for s in list(feed.subscribers)))
+
+    async def _dispatch_poll_done(self, feed: _Feed) -> None:
+        await asyncio.gather(*(s.poll_done() for s in list(feed.subscribers)))
@@ -1,9 +1,19 @@
 from __future__ import annotations
 
 import json
+import logging
+import sqlite3
 import threading
+import time
 from pathlib import Path
-from typing import Dict, Set
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from . import metrics
+from .bloom import RotatingBloomFilter
+
+SEEN_OP_SECONDS = metrics.histogram(
+    "olx_seen_op_seconds", "Seen-storage call latency", ("backend", "op"),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
 
 
 class SeenStorage:
@@ -33,6 +43,7 @@ class SeenStorage:
             serializable = {k: sorted(list(v)) for k, v in data.items()}
             self._path.write_text(json.dumps(serializable, ensure_ascii=False, indent=2), encoding="utf-8")
 
+    @SEEN_OP_SECONDS.timed(backend="json", op="add_many")
     def add_many(self, filter_name: str, ad_ids: Set[str]) -> None:
         with self._lock:
             data = self._load()
@@ -41,10 +52,375 @@ class SeenStorage:
             data[filter_name] = updated
             self._save(data)
 
+    @SEEN_OP_SECONDS.timed(backend="json", op="unseen_only")
     def unseen_only(self, filter_name: str, ad_ids: Set[str]) -> Set[str]:
         with self._lock:
             data = self._load()
             existing = data.get(filter_name, set())
             return set(ad_ids) - existing
 
+    def adopt_legacy(self, legacy_key: str, key: str) -> bool:
+        """Copies the IDs under ``legacy_key`` to ``key`` if ``key`` has none yet.
+
+        Seen IDs used to be kept per bare filter name; now they are per chat and filter.
+        """
+        with self._lock:
+            data = self._load()
+            if data.get(key) or not data.get(legacy_key):
+                return False
+            data[key] = set(data[legacy_key])
+            self._save(data)
+            return True
+
+    def close(self) -> None:
+        pass
+
+
+def _open_db(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def _legacy_keys(filter_name: str, owners: Optional[Dict[str, Iterable[int]]]) -> List[str]:
+    """Keys a legacy filter's IDs are imported under: the per-chat key of each chat that has
+    or tracks the filter, plus the bare name for chats that adopt it later."""
+    return [f"{chat_id}:{filter_name}" for chat_id in (owners or {}).get(filter_name, ())] + [filter_name]
+
+
+def _pending_json_import(conn: sqlite3.Connection, json_path: Optional[str], flag: str) -> Dict[str, Set[str]]:
+    """Returns legacy JSON contents if they still need importing under ``flag``."""
+    if not json_path or not Path(json_path).exists():
+        return {}
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (flag,)).fetchone():
+        return {}
+    return SeenStorage(json_path)._load()
+
+
+class SqliteSeenStorage:
+    """SeenStorage backed by SQLite in WAL mode with an in-memory set cache per filter.
+
+    Lookups are served from memory and ``add_many`` only writes the IDs that are new.
+    IDs older than ``max_age_days`` or beyond the newest ``max_per_filter`` are evicted
+    (0 keeps them forever); a filter is trimmed once it holds ``TRIM_MARGIN`` more IDs
+    than the cap or ``TRIM_INTERVAL_SEC`` after its last trim, not on every add.
+    On first open, IDs from a legacy JSON file are imported once, under the per-chat
+    keys of the chats in ``legacy_owners`` (filter name -> chat IDs).
+    """
+
+    TRIM_MARGIN = 100
+    TRIM_INTERVAL_SEC = 600
+
+    def __init__(
+        self,
+        db_path: str,
+        legacy_json_path: Optional[str] = None,
+        max_age_days: float = 0,
+        max_per_filter: int = 0,
+        legacy_owners: Optional[Dict[str, Iterable[int]]] = None,
+    ):
+        self._path = Path(db_path)
+        self._lock = threading.RLock()
+        self._cache: Dict[str, Set[str]] = {}
+        self._max_age_sec = max_age_days * 86400
+        self._max_per_filter = max_per_filter
+        self._trim_margin = max(self.TRIM_MARGIN, max_per_filter // 10)
+        # filter -> when it was last trimmed
+        self._trimmed: Dict[str, float] = {}
+        self._conn = _open_db(str(self._path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " filter TEXT NOT NULL,"
+            " ad_id TEXT NOT NULL,"
+            " first_seen REAL NOT NULL,"
+            " PRIMARY KEY (filter, ad_id)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_age ON seen (filter, first_seen)")
+        self._migrate_json(legacy_json_path, legacy_owners)
+
+    def _migrate_json(self, json_path: Optional[str], owners: Optional[Dict[str, Iterable[int]]]) -> None:
+        with self._lock:
+            legacy = _pending_json_import(self._conn, json_path, "migrated_json")
+            if not legacy:
+                return
+            now = time.time()
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for filter_name, ids in legacy.items():
+                    for key in _legacy_keys(filter_name, owners):
+                        self._conn.executemany(
+                            "INSERT OR IGNORE INTO seen (filter, ad_id, first_seen) VALUES (?, ?, ?)",
+                            ((key, ad_id, now) for ad_id in ids),
+                        )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (json_path,))
+            logging.info("Migrated %d filters from %s", len(legacy), json_path)
+
+    def _ids(self, filter_name: str) -> Set[str]:
+        ids = self._cache.get(filter_name)
+        if ids is None:
+            cutoff = time.time() - self._max_age_sec if self._max_age_sec else 0
+            rows = self._conn.execute(
+                "SELECT ad_id FROM seen WHERE filter = ? AND first_seen >= ?", (filter_name, cutoff))
+            ids = {row[0] for row in rows}
+            self._cache[filter_name] = ids
+        return ids
+
+    def _trim_due(self, filter_name: str, count: int, now: float) -> bool:
+        if not (self._max_age_sec or self._max_per_filter):
+            return False
+        if self._max_per_filter and count > self._max_per_filter + self._trim_margin:
+            return True
+        return now - self._trimmed.get(filter_name, 0) >= self.TRIM_INTERVAL_SEC
+
+    def _evict(self, filter_name: str, now: float) -> Set[str]:
+        self._trimmed[filter_name] = now
+        expired: Set[str] = set()
+        if self._max_age_sec:
+            rows = self._conn.execute(
+                "SELECT ad_id FROM seen WHERE filter = ? AND first_seen < ?",
+                (filter_name, now - self._max_age_sec),
+            )
+            expired.update(row[0] for row in rows)
+        if self._max_per_filter:
+            rows = self._conn.execute(
+                "SELECT ad_id FROM seen WHERE filter = ? ORDER BY first_seen DESC LIMIT -1 OFFSET ?",
+                (filter_name, self._max_per_filter),
+            )
+            expired.update(row[0] for row in rows)
+        if expired:
+            self._conn.executemany(
+                "DELETE FROM seen WHERE filter = ? AND ad_id = ?",
+                ((filter_name, ad_id) for ad_id in expired),
+            )
+        return expired
+
+    @SEEN_OP_SECONDS.timed(backend="sqlite", op="add_many")
+    def add_many(self, filter_name: str, ad_ids: Set[str]) -> None:
+        with self._lock:
+            existing = self._ids(filter_name)
+            new_ids = set(ad_ids) - existing
+            if not new_ids:
+                return
+            now = time.time()
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO seen (filter, ad_id, first_seen) VALUES (?, ?, ?)",
+                    ((filter_name, ad_id, now) for ad_id in new_ids),
+                )
+                expired = set()
+                if self._trim_due(filter_name, len(existing) + len(new_ids), now):
+                    expired = self._evict(filter_name, now)
+            existing.update(new_ids)
+            existing.difference_update(expired)
+
+    @SEEN_OP_SECONDS.timed(backend="sqlite", op="unseen_only")
+    def unseen_only(self, filter_name: str, ad_ids: Set[str]) -> Set[str]:
+        with self._lock:
+            return set(ad_ids) - self._ids(filter_name)
+
+    def adopt_legacy(self, legacy_key: str, key: str) -> bool:
+        """Copies the IDs under ``legacy_key`` to ``key`` if ``key`` has none yet."""
+        with self._lock:
+            if self._ids(key) or not self._ids(legacy_key):
+                return False
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO seen (filter, ad_id, first_seen)"
+                    " SELECT ?, ad_id, first_seen FROM seen WHERE filter = ?", (key, legacy_key))
+            self._cache[key] = set(self._ids(legacy_key))
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class BloomSeenStorage:
+    """Compact SeenStorage: a rotating Bloom filter per filter name, persisted to SQLite.
+
+    Memory per filter is constant (two generations of ``capacity`` IDs each). A false
+    positive means a genuinely new ad is treated as seen, at roughly ``error_rate``.
+    New IDs are appended to a log and replayed on load; a filter's blob is only rewritten
+    once ``SNAPSHOT_EVERY`` IDs have piled up in its log, and on close.
+    Legacy JSON IDs are imported like SqliteSeenStorage does.
+    """
+
+    SNAPSHOT_EVERY = 1000
+
+    def __init__(
+        self,
+        db_path: str,
+        capacity: int = 20000,
+        error_rate: float = 0.001,
+        legacy_json_path: Optional[str] = None,
+        legacy_owners: Optional[Dict[str, Iterable[int]]] = None,
+    ):
+        self._lock = threading.RLock()
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._cache: Dict[str, RotatingBloomFilter] = {}
+        # filter -> IDs in its log since the last blob was written
+        self._logged: Dict[str, int] = {}
+        self._conn = _open_db(db_path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bloom (filter TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bloom_log (filter TEXT NOT NULL, ad_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bloom_log_filter ON bloom_log (filter)")
+        self._migrate_json(legacy_json_path, legacy_owners)
+
+    def _migrate_json(self, json_path: Optional[str], owners: Optional[Dict[str, Iterable[int]]]) -> None:
+        with self._lock:
+            legacy = _pending_json_import(self._conn, json_path, "migrated_json_bloom")
+            if not legacy:
+                return
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for filter_name, ids in legacy.items():
+                    for key in _legacy_keys(filter_name, owners):
+                        bloom = self._bloom(key)
+                        bloom.update(ids)
+                        self._store(key, bloom)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json_bloom', ?)", (json_path,))
+            logging.info("Migrated %d filters from %s into Bloom storage", len(legacy), json_path)
+
+    def _bloom(self, filter_name: str) -> RotatingBloomFilter:
+        bloom = self._cache.get(filter_name)
+        if bloom is None:
+            row = self._conn.execute("SELECT data FROM bloom WHERE filter = ?", (filter_name,)).fetchone()
+            if row is not None:
+                bloom = RotatingBloomFilter.from_bytes(row[0])
+            else:
+                bloom = RotatingBloomFilter(self._capacity, self._error_rate)
+            # replaying in insertion order rebuilds the same generations
+            logged = [row[0] for row in self._conn.execute(
+                "SELECT ad_id FROM bloom_log WHERE filter = ? ORDER BY rowid", (filter_name,))]
+            bloom.update(logged)
+            self._logged[filter_name] = len(logged)
+            self._cache[filter_name] = bloom
+        return bloom
+
+    def _store(self, filter_name: str, bloom: RotatingBloomFilter) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO bloom (filter, data) VALUES (?, ?)", (filter_name, bloom.to_bytes()))
+        self._conn.execute("DELETE FROM bloom_log WHERE filter = ?", (filter_name,))
+        self._logged[filter_name] = 0
+
+    @SEEN_OP_SECONDS.timed(backend="bloom", op="add_many")
+    def add_many(self, filter_name: str, ad_ids: Set[str]) -> None:
+        with self._lock:
+            bloom = self._bloom(filter_name)
+            new_ids = [ad_id for ad_id in ad_ids if ad_id not in bloom]
+            if not new_ids:
+                return
+            bloom.update(new_ids)
+            with self._conn:
+                self._conn.execute("BEGIN")
+                if self._logged.get(filter_name, 0) + len(new_ids) >= self.SNAPSHOT_EVERY:
+                    self._store(filter_name, bloom)
+                else:
+                    self._conn.executemany(
+                        "INSERT INTO bloom_log (filter, ad_id) VALUES (?, ?)",
+                        ((filter_name, ad_id) for ad_id in new_ids),
+                    )
+                    self._logged[filter_name] = self._logged.get(filter_name, 0) + len(new_ids)
+
+    @SEEN_OP_SECONDS.timed(backend="bloom", op="unseen_only")
+    def unseen_only(self, filter_name: str, ad_ids: Set[str]) -> Set[str]:
+        with self._lock:
+            bloom = self._bloom(filter_name)
+            return {ad_id for ad_id in ad_ids if ad_id not in bloom}
+
+    def _stored(self, filter_name: str) -> bool:
+        return filter_name in self._cache or self._conn.execute(
+            "SELECT 1 FROM bloom WHERE filter = ?", (filter_name,)).fetchone() is not None
+
+    def adopt_legacy(self, legacy_key: str, key: str) -> bool:
+        """Copies the filter under ``legacy_key`` to ``key`` if ``key`` has none yet."""
+        with self._lock:
+            if self._stored(key) or not self._stored(legacy_key):
+                return False
+            bloom = RotatingBloomFilter.from_bytes(self._bloom(legacy_key).to_bytes())
+            self._cache[key] = bloom
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._store(key, bloom)
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for filter_name, logged in self._logged.items():
+                    if logged:
+                        self._store(filter_name, self._cache[filter_name])
+            self._conn.close()
+
+
+class KVSeenStorage:
+    """SeenStorage on a shared key-value store, so a feed that moves to another replica
+    keeps its history: a sorted set per filter, ad ID -> first seen.
+
+    Retention matches SqliteSeenStorage. IDs in the SQLite database at ``legacy_db_path``
+    are imported by the first replica that starts against an empty store.
+    """
+
+    def __init__(
+        self,
+        kv: Any,
+        legacy_db_path: Optional[str] = None,
+        max_age_days: float = 0,
+        max_per_filter: int = 0,
+    ):
+        self._kv = kv
+        self._max_age_sec = max_age_days * 86400
+        self._max_per_filter = max_per_filter
+        if legacy_db_path and Path(legacy_db_path).exists() and kv.set("imported:seen", legacy_db_path, only_new=True):
+            self._import_sqlite(legacy_db_path)
+
+    def _import_sqlite(self, db_path: str) -> None:
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("SELECT filter, ad_id, first_seen FROM seen").fetchall()
+        except sqlite3.Error:
+            rows = []
+        finally:
+            conn.close()
+        by_filter: Dict[str, Dict[str, float]] = {}
+        for filter_name, ad_id, first_seen in rows:
+            by_filter.setdefault(filter_name, {})[ad_id] = first_seen
+        for filter_name, ids in by_filter.items():
+            self._kv.zadd_new(f"seen:{filter_name}", ids)
+        logging.info("Imported seen IDs of %d filters from %s", len(by_filter), db_path)
+
+    @SEEN_OP_SECONDS.timed(backend="kv", op="add_many")
+    def add_many(self, filter_name: str, ad_ids: Set[str]) -> None:
+        now = time.time()
+        key = f"seen:{filter_name}"
+        if self._max_age_sec:
+            # before adding, so an expired ID seen again gets a fresh timestamp
+            self._kv.ztrim(key, min_score=now - self._max_age_sec)
+        if self._kv.zadd_new(key, {ad_id: now for ad_id in ad_ids}) and self._max_per_filter:
+            self._kv.ztrim(key, self._max_per_filter)
+
+    @SEEN_OP_SECONDS.timed(backend="kv", op="unseen_only")
+    def unseen_only(self, filter_name: str, ad_ids: Set[str]) -> Set[str]:
+        ids = list(ad_ids)
+        cutoff = time.time() - self._max_age_sec if self._max_age_sec else None
+        return {ad_id for ad_id, seen_at in zip(ids, self._kv.zscores(f"seen:{filter_name}", ids))
+                if seen_at is None or (cutoff is not None and seen_at < cutoff)}
+
+    def adopt_legacy(self, legacy_key: str, key: str) -> bool:
+        """Copies the IDs under ``legacy_key`` to ``key`` if ``key`` has none yet."""
+        if self._kv.zcard(f"seen:{key}") or not self._kv.zcard(f"seen:{legacy_key}"):
+            return False
+        self._kv.zcopy(f"seen:{legacy_key}", f"seen:{key}")
+        return True
 
+    def close(self) -> None:
+        pass
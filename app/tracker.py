@@ -1,49 +1,262 @@
 from __future__ import annotations
 
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Optional
+import logging
+import random
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Collection, Dict, Iterator, List, Optional, Set, TypeVar
 
-from .parser import fetch_today_ads, OlxAd
+from .driver_pool import DriverPool
+from .parser import is_newest_first, iter_today_ads, OlxAd
+from .resilience import CircuitOpen, backoff_delay
+
+# async (listing_url, known_ids=None) -> today's ads; lets callers swap the Selenium path for another engine
+Fetcher = Callable[..., Awaitable[List[OlxAd]]]
+# async (listing_url, known_ids=None) -> today's ads page by page, each page as soon as it is read
+Streamer = Callable[..., AsyncIterator[List[OlxAd]]]
+
+T = TypeVar("T")
+
+
+async def iterate_in_executor(executor: Executor, items: Iterator[T]) -> AsyncIterator[T]:
+    """Steps a blocking iterator (e.g. parser.iter_today_ads) in ``executor``, one item at a time."""
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, items, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            try:
+                # closing runs the iterator's cleanup, which may block too
+                await loop.run_in_executor(executor, close)
+            except ValueError:
+                # another executor thread is still running a step; it finishes on its own
+                pass
+
+
+async def single_batch(ads: Awaitable[List[OlxAd]]) -> AsyncIterator[List[OlxAd]]:
+    """A list Fetcher's result as a one-page stream."""
+    yield await ads
+
+
+async def _call(callback: Callable[..., Awaitable[None] | None], *args) -> None:
+    # a subscriber's failure is its own; the feed goes on
+    maybe_future = callback(*args)
+    if maybe_future is not None:
+        try:
+            await maybe_future
+        except Exception:
+            pass
+
+
+class AdaptiveInterval:
+    """Polling delay that follows a feed's observed rate of new ads.
+
+    Aims for about ``target_new_per_poll`` new ads per poll: busy searches are polled
+    more often, quiet ones back off towards ``max_sec``. Each delay gets +/- ``jitter``
+    (a fraction) so feeds don't fire in lockstep.
+    """
+
+    def __init__(
+        self,
+        base_sec: float = 60,
+        min_sec: float = 20,
+        max_sec: float = 600,
+        target_new_per_poll: float = 1.0,
+        jitter: float = 0.15,
+        smoothing: float = 0.3,
+    ):
+        self._base = base_sec
+        self._min = min_sec
+        self._max = max(max_sec, min_sec)
+        self._target = target_new_per_poll
+        self._jitter = jitter
+        self._smoothing = smoothing
+        # EWMA of new ads per second; None until the first observation
+        self._rate: Optional[float] = None
+
+    def observe(self, new_count: int, elapsed_sec: float) -> None:
+        if elapsed_sec <= 0:
+            return
+        sample = new_count / elapsed_sec
+        if self._rate is None:
+            self._rate = sample
+        else:
+            self._rate += self._smoothing * (sample - self._rate)
+
+    def current(self) -> float:
+        if self._rate is None:
+            delay = self._base
+        elif self._rate <= 0:
+            delay = self._max
+        else:
+            delay = self._target / self._rate
+        return min(self._max, max(self._min, delay))
+
+    def next_delay(self) -> float:
+        delay = self.current()
+        if self._jitter:
+            delay *= random.uniform(1 - self._jitter, 1 + self._jitter)
+        return delay
 
 
 class Tracker:
-    """Runs periodic scraping in a background task per chat/filter."""
+    """Runs periodic scraping in a background task per chat/filter.
 
-    def __init__(self, interval_sec: int = 60):
+    A failed poll doesn't end the task: the next one is retried after a jittered
+    backoff that grows with consecutive failures (from ``retry_base_sec`` up to
+    ``retry_max_sec``), or once the host's circuit lets fetches through again.
+    """
+
+    def __init__(
+        self,
+        interval_sec: int = 60,
+        pool: Optional[DriverPool] = None,
+        fetcher: Optional[Fetcher] = None,
+        schedule: Optional[AdaptiveInterval] = None,
+        watermark_size: int = 100,
+        streamer: Optional[Streamer] = None,
+        retry_base_sec: float = 10,
+        retry_max_sec: float = 600,
+    ):
         self._interval = interval_sec
+        self._retry_base = retry_base_sec
+        self._retry_max = retry_max_sec
+        self._schedule = schedule
+        # most recently returned ad IDs, oldest first; lets the parser stop at known cards
+        self._watermark: Dict[str, None] = {}
+        self._watermark_size = watermark_size
+        self._full_scan = False
+        self._pool = pool
+        self._fetcher = fetcher
+        self._streamer = streamer
         self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
         self._executor = ThreadPoolExecutor(max_workers=1)
         self._running = False
 
     def is_running(self) -> bool:
         return self._running and self._task is not None and not self._task.done()
 
-    async def start(self, url: str, on_new_ads: Callable[[list[OlxAd]], asyncio.Future | None]):
+    async def start(self, url: str, on_new_ads: Callable[[list[OlxAd]], asyncio.Future | None],
+                    initial_delay: float = 0,
+                    on_poll_done: Optional[Callable[[], asyncio.Future | None]] = None):
+        """Starts polling ``url``; the first poll waits ``initial_delay`` seconds (``wake`` cuts it short).
+
+        ``on_new_ads`` is called once per result page as pages arrive, not once per poll;
+        ``on_poll_done`` is called after the last page of each poll, failed ones included.
+        """
         if self.is_running():
             return
         self._running = True
+        self._wake = asyncio.Event()
         loop = asyncio.get_running_loop()
 
+        def stream(listing_url: str, known_ids: Optional[Collection[str]] = None) -> AsyncIterator[List[OlxAd]]:
+            if self._streamer is not None:
+                return self._streamer(listing_url, known_ids=known_ids)
+            if self._fetcher is not None:
+                return single_batch(self._fetcher(listing_url, known_ids=known_ids))
+            return iterate_in_executor(
+                self._executor, iter_today_ads(listing_url, 20, self._pool, known_ids=known_ids))
+
+        use_watermark = self._watermark_size > 0 and is_newest_first(url)
+
         async def _runner():
+            last_poll: Optional[float] = None
+            # IDs of the last poll, to count new ads by when the watermark is off
+            previous: Set[str] = set()
+            failures = 0
             try:
+                if initial_delay > 0:
+                    await self._sleep(initial_delay)
                 while self._running:
-                    ads = await loop.run_in_executor(self._executor, fetch_today_ads, url)
-                    if ads:
-                        maybe_future = on_new_ads(ads)
-                        if maybe_future is not None:
-                            try:
-                                await maybe_future
-                            except Exception:
-                                pass
-                    await asyncio.sleep(self._interval)
+                    started = loop.time()
+                    known = None
+                    full_scan = self._full_scan
+                    if use_watermark and self._watermark and not full_scan:
+                        known = set(self._watermark)
+                    self._full_scan = False
+                    polled: List[OlxAd] = []
+                    try:
+                        async with aclosing(stream(url, known_ids=known)) as pages:
+                            async for ads in pages:
+                                if not ads:
+                                    continue
+                                polled.extend(ads)
+                                await _call(on_new_ads, ads)
+                                if not self._running:
+                                    break
+                    except Exception as e:
+                        if on_poll_done is not None:
+                            await _call(on_poll_done)
+                        # pages that did arrive were delivered; the rest waits for the retry
+                        self._remember(polled)
+                        self._full_scan = self._full_scan or full_scan
+                        refused = isinstance(e, CircuitOpen)
+                        if not refused:
+                            failures += 1
+                        delay = self._retry_delay(e, failures)
+                        logging.log(logging.INFO if refused else logging.WARNING,
+                                    "Poll of %s failed (%s: %s); retrying in %.0fs",
+                                    url, type(e).__name__, e, delay)
+                        await self._sleep(delay)
+                        continue
+                    if on_poll_done is not None:
+                        await _call(on_poll_done)
+                    failures = 0
+                    if self._schedule is not None and last_poll is not None:
+                        # an empty poll counts too: it is what lets quiet feeds back off
+                        recent = self._watermark if self._watermark_size else previous
+                        new_count = sum(1 for a in polled if a.ad_id not in recent)
+                        self._schedule.observe(new_count, started - last_poll)
+                    last_poll = started
+                    previous = {a.ad_id for a in polled}
+                    self._remember(polled)
+                    await self._sleep(self._schedule.next_delay() if self._schedule else self._interval)
             finally:
                 self._running = False
 
         self._task = asyncio.create_task(_runner())
 
+    def _retry_delay(self, error: Exception, failures: int) -> float:
+        if isinstance(error, CircuitOpen):
+            # spread the wake-ups: only one feed gets to probe the host anyway
+            return error.retry_after * random.uniform(1, 1.2)
+        return backoff_delay(failures, self._retry_base, self._retry_max)
+
+    def _remember(self, ads: List[OlxAd]) -> None:
+        for ad in reversed(ads):
+            self._watermark.pop(ad.ad_id, None)
+            self._watermark[ad.ad_id] = None
+        while len(self._watermark) > self._watermark_size:
+            del self._watermark[next(iter(self._watermark))]
+
+    def reset_watermark(self) -> None:
+        """Makes the next poll parse the whole page (e.g. for a newly joined subscriber)."""
+        self._full_scan = True
+
+    async def _sleep(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def wake(self) -> None:
+        """Cuts the current sleep short so the next poll starts right away."""
+        if self._wake is not None:
+            self._wake.set()
+
     async def stop(self):
         self._running = False
+        self.wake()
         if self._task:
             try:
                 await asyncio.wait_for(self._task, timeout=5)
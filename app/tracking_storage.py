@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+from .jsonfile import write_json_atomic
+
+
+class TrackedFilter(NamedTuple):
+    filter_name: str
+    url: str
+    started_at: float
+
+
+class TrackingStorage:
+    """Which filter each chat is tracking, so tracking survives restarts and deploys."""
+
+    def __init__(self, file_path: str):
+        self._path = Path(file_path)
+        self._lock = threading.Lock()
+        self._entries: Dict[int, TrackedFilter] = self._load()
+
+    def _load(self) -> Dict[int, TrackedFilter]:
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except Exception:
+            logging.exception("Could not read %s; starting with no tracked filters", self._path)
+            return {}
+        entries: Dict[int, TrackedFilter] = {}
+        for chat_id, entry in (data.items() if isinstance(data, dict) else ()):
+            try:
+                entries[int(chat_id)] = TrackedFilter(
+                    str(entry["filter"]), str(entry["url"]), float(entry.get("started_at", 0)))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+        return entries
+
+    def _save(self) -> None:
+        write_json_atomic(self._path, {
+            str(chat_id): {"filter": e.filter_name, "url": e.url, "started_at": e.started_at}
+            for chat_id, e in self._entries.items()
+        })
+
+    def all(self) -> Dict[int, TrackedFilter]:
+        with self._lock:
+            return dict(self._entries)
+
+    def get(self, chat_id: int) -> Optional[TrackedFilter]:
+        with self._lock:
+            return self._entries.get(chat_id)
+
+    def set(self, chat_id: int, filter_name: str, url: str) -> None:
+        with self._lock:
+            self._entries[chat_id] = TrackedFilter(filter_name, url, time.time())
+            self._save()
+
+    def remove(self, chat_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(chat_id, None) is not None:
+                self._save()
+
+
+def _entry_json(entry: TrackedFilter) -> str:
+    return json.dumps({"filter": entry.filter_name, "url": entry.url, "started_at": entry.started_at},
+                      ensure_ascii=False)
+
+
+def _parse_entry(raw: Optional[str]) -> Optional[TrackedFilter]:
+    try:
+        entry = json.loads(raw)
+        return TrackedFilter(str(entry["filter"]), str(entry["url"]), float(entry.get("started_at", 0)))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+class KVTrackingStorage:
+    """TrackingStorage on a shared key-value store (one hash, chat -> entry), so every
+    replica sees every chat's tracking. ``legacy_file`` is imported by the first replica
+    that starts against an empty store."""
+
+    KEY = "tracking"
+
+    def __init__(self, kv: Any, legacy_file: Optional[str] = None):
+        self._kv = kv
+        if legacy_file and Path(legacy_file).exists() and kv.set("imported:tracking", legacy_file, only_new=True):
+            entries = TrackingStorage(legacy_file).all()
+            kv.hset_many(self.KEY, {str(chat_id): _entry_json(e) for chat_id, e in entries.items()})
+            logging.info("Imported %d tracked chats from %s", len(entries), legacy_file)
+
+    def all(self) -> Dict[int, TrackedFilter]:
+        entries: Dict[int, TrackedFilter] = {}
+        for chat_id, raw in self._kv.hgetall(self.KEY).items():
+            entry = _parse_entry(raw)
+            if entry is not None:
+                entries[int(chat_id)] = entry
+        return entries
+
+    def get(self, chat_id: int) -> Optional[TrackedFilter]:
+        raw = self._kv.hget(self.KEY, str(chat_id))
+        return _parse_entry(raw) if raw is not None else None
+
+    def set(self, chat_id: int, filter_name: str, url: str) -> None:
+        self._kv.hset(self.KEY, str(chat_id), _entry_json(TrackedFilter(filter_name, url, time.time())))
+
+    def remove(self, chat_id: int) -> None:
+        self._kv.hdel(self.KEY, str(chat_id))
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Any, Callable, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+HealthCheck = Callable[[], Dict[str, Any]]
+
+
+def make_app(
+    bot: Bot,
+    dp: Dispatcher,
+    path: str,
+    secret: str,
+    health: Optional[HealthCheck] = None,
+) -> web.Application:
+    """aiohttp app that feeds Telegram updates posted to ``path`` into ``dp``.
+
+    Requests without the matching ``X-Telegram-Bot-Api-Secret-Token`` header are
+    rejected. ``GET /healthz`` answers 200 with ``health()`` details, or 503 once the
+    app is shutting down so a load balancer stops routing to it.
+    """
+    app = web.Application()
+    # mutable holder: the app's own mapping is frozen once it starts
+    app["status"] = {"shutting_down": False}
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+
+    async def healthz(request: web.Request) -> web.Response:
+        if request.app["status"]["shutting_down"]:
+            return web.json_response({"status": "shutting_down"}, status=503)
+        details = health() if health is not None else {}
+        return web.json_response({"status": "ok", **details})
+
+    app.router.add_get("/healthz", healthz)
+    # runs the dispatcher's startup/shutdown hooks with the app
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(
+    bot: Bot,
+    dp: Dispatcher,
+    base_url: str,
+    path: str = "/telegram/webhook",
+    secret: str = "",
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    register: bool = True,
+    health: Optional[HealthCheck] = None,
+    drain_sec: float = 5,
+) -> None:
+    """Serves updates over a webhook until SIGINT/SIGTERM.
+
+    With ``register`` the webhook is (re)set at Telegram on start; several instances
+    behind one load balancer must share ``base_url`` and ``secret``. The webhook is
+    left in place on shutdown so the other instances keep receiving updates.
+    On shutdown /healthz reports 503 for ``drain_sec`` before the listener closes.
+    """
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        logging.warning("WEBHOOK_SECRET is not set; using a random one (fine for a single instance only)")
+    app = make_app(bot, dp, path, secret, health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logging.info("Webhook server listening on %s:%s%s", host, port, path)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        if register:
+            await bot.set_webhook(
+                base_url.rstrip("/") + path,
+                secret_token=secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logging.info("Webhook registered at %s%s", base_url.rstrip("/"), path)
+        await stop.wait()
+        logging.info("Stopping webhook server")
+        app["status"]["shutting_down"] = True
+        if drain_sec > 0:
+            await asyncio.sleep(drain_sec)
+    finally:
+        app["status"]["shutting_down"] = True
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+        # stops accepting connections and lets in-flight updates finish
+        await runner.cleanup()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from functools import partial
+from typing import Any, List
+
+# Support running both as module (python -m app.worker) and as script (python app/worker.py)
+try:
+    from . import metrics
+    from .config import Config, load_config
+    from .driver_pool import DriverPool
+    from .http_fetch import HttpFetcher
+    from .jobqueue import RedisBroker, SocketBrokerClient, ad_to_dict, redis_client
+    from .parser import OlxAd, fetch_today_ads
+except Exception:  # noqa: E722
+    import os
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    from app import metrics
+    from app.config import Config, load_config
+    from app.driver_pool import DriverPool
+    from app.http_fetch import HttpFetcher
+    from app.jobqueue import RedisBroker, SocketBrokerClient, ad_to_dict, redis_client
+    from app.parser import OlxAd, fetch_today_ads
+
+
+JOBS_DONE = metrics.counter("olx_worker_jobs_total", "Fetch jobs handled by this worker", ("outcome",))
+
+
+def _connect(cfg: Config) -> Any:
+    if cfg.job_broker == "redis":
+        return RedisBroker(redis_client(cfg.redis_url))
+    if cfg.job_broker == "socket":
+        return SocketBrokerClient(cfg.job_broker_address, cfg.job_broker_authkey.encode("utf-8"))
+    raise RuntimeError("Set JOB_BROKER=socket or JOB_BROKER=redis to run scraper workers")
+
+
+async def _consume(cfg: Config, fetch) -> None:
+    broker = _connect(cfg)
+    try:
+        while True:
+            job = await asyncio.to_thread(broker.take, 5)
+            if job is None:
+                continue
+            if job.get("expires_at") and job["expires_at"] < time.time():
+                logging.info("Skipping expired job for %s", job["url"])
+                JOBS_DONE.inc(outcome="expired")
+                continue
+            try:
+                ads: List[OlxAd] = await fetch(job["url"], job.get("timeout_sec", 20), job.get("known_ids"))
+                result = {"ads": [ad_to_dict(ad) for ad in ads]}
+                JOBS_DONE.inc(outcome="ok")
+            except Exception as e:
+                logging.exception("Job for %s failed", job["url"])
+                result = {"error": f"{type(e).__name__}: {e}"}
+                JOBS_DONE.inc(outcome="error")
+            await asyncio.to_thread(broker.complete, job["id"], result)
+    finally:
+        broker.close()
+
+
+def _log_warm_up_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        # jobs still get drivers, just started on demand
+        logging.error("Pre-warming Chrome sessions failed", exc_info=task.exception())
+
+
+async def run_worker(index: int = 0):
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s [worker] %(message)s")
+    cfg = load_config(require_token=False)
+    metrics_server = None
+    if cfg.worker_metrics_port:
+        metrics_server = metrics.start_http_server(cfg.worker_metrics_port + index, cfg.metrics_host)
+    pool = DriverPool(size=cfg.driver_pool_size,
+                      max_pages=cfg.driver_max_pages,
+                      max_rss_mb=cfg.driver_max_rss_mb,
+                      block_resources=cfg.driver_block_resources,
+                      chromedriver_cache=cfg.chromedriver_cache or None)
+    http_fetcher = None
+    if cfg.fetch_engine == "http":
+        http_fetcher = HttpFetcher(pool=pool,
+                                   max_connections=cfg.http_max_connections,
+                                   max_pages=cfg.max_pages,
+                                   page_concurrency=cfg.page_concurrency,
+                                   hedge_after_sec=cfg.fetch_hedge_sec)
+    loop = asyncio.get_running_loop()
+    # referenced until shutdown so the task isn't garbage-collected mid-run
+    warm_up = asyncio.create_task(asyncio.to_thread(
+        pool.warm, cfg.driver_prewarm if cfg.fetch_engine == "selenium" else 0))
+    warm_up.add_done_callback(_log_warm_up_failure)
+
+    async def fetch(url: str, timeout_sec: int, known_ids) -> List[OlxAd]:
+        known = set(known_ids) if known_ids is not None else None
+        if http_fetcher is not None:
+            return await http_fetcher.fetch_today_ads(url, timeout_sec, known_ids=known)
+        return await loop.run_in_executor(None, partial(
+            fetch_today_ads, url, timeout_sec, pool,
+            known_ids=known,
+            max_pages=cfg.max_pages,
+            page_concurrency=cfg.page_concurrency,
+        ))
+
+    logging.info("Scraper worker started (%s broker, %d consumers)", cfg.job_broker, cfg.worker_concurrency)
+    try:
+        await asyncio.gather(*(_consume(cfg, fetch) for _ in range(max(1, cfg.worker_concurrency))))
+    finally:
+        if http_fetcher is not None:
+            await http_fetcher.close()
+        if not warm_up.done():
+            logging.info("Shutting down while Chrome sessions are still starting")
+        pool.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+
+def _worker_process(index: int = 0) -> None:
+    asyncio.run(run_worker(index))
+
+
+def main() -> None:
+    processes = max(1, load_config(require_token=False).worker_processes)
+    if processes == 1:
+        _worker_process()
+        return
+    children = [multiprocessing.Process(target=_worker_process, args=(i,), daemon=True) for i in range(processes)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+
+if __name__ == "__main__":
+    main()
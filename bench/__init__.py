@@ -0,0 +1 @@
+"""Offline benchmarks. Each bench_* module prints one JSON document to stdout."""
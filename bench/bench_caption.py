@@ -0,0 +1,40 @@
+"""Caption formatting benchmark: format_ad_caption over a page of parsed ads.
+
+    python -m bench.bench_caption
+"""
+from __future__ import annotations
+
+import argparse
+
+from bench.common import emit, measure
+from bench.fixtures import listing_html
+
+from app.bot import format_ad_caption
+from app.http_fetch import parse_listing_html
+
+
+def run(repeat: int = 5) -> dict:
+    ads = parse_listing_html(listing_html(cards=40, today=1.0)) or []
+
+    def format_page():
+        for ad in ads:
+            format_ad_caption(ad)
+
+    page = measure(format_page, number=50, repeat=repeat)
+    return {
+        "ads_per_page": len(ads),
+        "page": page,
+        "per_ad_us": round(page["median_ms"] * 1000 / max(1, len(ads)), 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+    emit("caption", run(args.repeat), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Listing fetch benchmark: small, 40-card and heavy pages through each engine.
+
+    python -m bench.bench_fetch                      # HTML parsing + http engine
+    python -m bench.bench_fetch --selenium           # also the Chrome path (needs Chrome)
+    python -m bench.bench_fetch --pages-dir saved/   # saved OLX pages instead of synthetic ones
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from bench.common import emit, measure
+from bench.fixtures import PageServer, default_pages, pages_from_dir
+
+from app.http_fetch import HttpFetcher, parse_listing_html
+from app.parser import fetch_today_ads
+
+
+def _parse_cases(html: str, repeat: int) -> dict:
+    ads = parse_listing_html(html) or []
+    # a typical steady-state poll: everything after the first few new ads is already known
+    known = {ad.ad_id for ad in ads[4:]}
+    return {
+        "bytes": len(html.encode("utf-8")),
+        "ads_today": len(ads),
+        "parse": measure(lambda: parse_listing_html(html), number=5, repeat=repeat),
+        "parse_watermark": measure(lambda: parse_listing_html(html, known_ids=known), number=5, repeat=repeat),
+    }
+
+
+def _http_case(url: str, repeat: int) -> dict:
+    loop = asyncio.new_event_loop()
+    fetcher = HttpFetcher()
+    try:
+        result = measure(lambda: loop.run_until_complete(fetcher.fetch_today_ads(url)), number=3, repeat=repeat)
+    finally:
+        loop.run_until_complete(fetcher.close())
+        loop.close()
+    return result
+
+
+def _selenium_cases(server: PageServer, kinds, repeat: int) -> dict:
+    from app.driver_pool import DriverPool
+    from app.parser import _build_driver
+
+    started = time.perf_counter()
+    _build_driver().quit()
+    results = {"driver_build_ms": round((time.perf_counter() - started) * 1000, 1)}
+    pool = DriverPool(size=1)
+    try:
+        for kind in kinds:
+            url = server.url(kind)
+            results[kind] = {
+                extraction: measure(lambda: fetch_today_ads(url, pool=pool, extraction=extraction), repeat=repeat)
+                for extraction in ("script", "webdriver")
+            }
+    finally:
+        pool.close()
+    return results
+
+
+def run(pages: dict, repeat: int = 5, selenium: bool = False) -> dict:
+    results = {kind: _parse_cases(html, repeat) for kind, html in pages.items()}
+    with PageServer(pages) as server:
+        for kind in pages:
+            results[kind]["http"] = _http_case(server.url(kind), repeat)
+        if selenium:
+            try:
+                results["selenium"] = _selenium_cases(server, list(pages), repeat)
+            except Exception as e:
+                results["selenium"] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages-dir", help="directory of saved listing pages (*.html)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--selenium", action="store_true", help="include fetch_today_ads through headless Chrome")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+    pages = pages_from_dir(args.pages_dir) if args.pages_dir else default_pages()
+    emit("fetch", run(pages, args.repeat, args.selenium), args.out)
+
+
+if __name__ == "__main__":
+    main()
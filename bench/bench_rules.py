@@ -0,0 +1,111 @@
+"""Post-filter benchmark: price/area normalization and AdRules.apply over 100k-ad batches.
+
+    python -m bench.bench_rules --ads 100000 --keywords 10,100,1000
+
+Keyword rules are timed through the Aho–Corasick automaton and, as a baseline,
+through a plain ``any(word in title ...)`` scan.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+
+from bench.common import emit, measure
+
+from app.ad_rules import AdRules
+from app.parser import OlxAd, parse_area, parse_price
+
+WORDS = ("квартира", "будинок", "кімната", "оренда", "продаж", "центр", "метро", "балкон", "ремонт",
+         "євроремонт", "новобудова", "подобово", "терміново", "власник", "без", "комісії", "парк",
+         "студія", "двокімнатна", "трикімнатна", "гараж", "паркінг", "тераса", "меблі", "техніка")
+
+
+def make_ads(count: int, seed: int = 1) -> tuple[list[OlxAd], list[str], list[str]]:
+    rng = random.Random(seed)
+    ads, prices, sizes = [], [], []
+    for i in range(count):
+        if rng.random() < 0.3:
+            price = f"{rng.randrange(20, 200) * 1000:,} $".replace(",", " ")
+        elif rng.random() < 0.1:
+            price = "Договірна"
+        else:
+            price = f"{rng.randrange(5, 60) * 1000:,} грн.".replace(",", " ")
+        size = f"{rng.randrange(15, 150)} м²" if rng.random() < 0.9 else None
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(4, 9))).capitalize()
+        value, currency = parse_price(price)
+        ads.append(OlxAd(str(800_000_000 + i), title, price, "Київ - Сьогодні о 12:00", size,
+                         f"https://www.olx.ua/d/uk/obyavlenie/{i}.html", None,
+                         value, currency, parse_area(size)))
+        prices.append(price)
+        sizes.append(size)
+    return ads, prices, sizes
+
+
+def _exclusions(count: int, rng: random.Random) -> list[str]:
+    # one word that does occur, the rest made-up stems that never match: the worst case
+    # for a scan, which has to try every word on every title
+    words = ["подобово"]
+    while len(words) < count:
+        words.append("".join(rng.choice("абвгдеєжзиіклмнопрстуфхцчшщюя") for _ in range(rng.randrange(4, 10))))
+    return words
+
+
+def _per_sec(result: dict, count: int) -> dict:
+    result["ads_per_sec"] = round(result["ops_per_sec"] * count, 1)
+    return result
+
+
+def run(count: int, keyword_counts: list[int], repeat: int = 5) -> dict:
+    ads, prices, sizes = make_ads(count)
+    rng = random.Random(2)
+
+    def normalize():
+        for price, size in zip(prices, sizes):
+            parse_price(price)
+            parse_area(size)
+
+    numeric = AdRules(max_price=60000, currency="USD", min_area=40)
+    results = {
+        "ads": count,
+        "normalize": _per_sec(measure(normalize, repeat=repeat), count),
+        "price_area": _per_sec(measure(lambda: numeric.apply(ads), repeat=repeat), count),
+        "kept_by_price_area": len(numeric.apply(ads)),
+        "keywords": {},
+    }
+    include = ["квартира", "студія"]
+    for n in keyword_counts:
+        exclude = _exclusions(n, rng)
+        rules = AdRules(include=include, exclude=exclude)
+
+        def naive():
+            kept = []
+            for a in ads:
+                title = a.title.lower()
+                if not any(w in title for w in exclude) and any(w in title for w in include):
+                    kept.append(a)
+            return kept
+
+        results["keywords"][str(n)] = {
+            "automaton": _per_sec(measure(lambda: rules.apply(ads), repeat=repeat), count),
+            "naive_scan": _per_sec(measure(naive, repeat=repeat), count),
+            "kept": len(rules.apply(ads)),
+        }
+    return results
+
+
+def _int_list(value: str) -> list[int]:
+    return sorted(int(v) for v in value.split(",") if v)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ads", type=int, default=100_000)
+    ap.add_argument("--keywords", type=_int_list, default=[10, 100, 1000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+    emit("rules", run(args.ads, args.keywords, args.repeat), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Seen-ID storage benchmark: memory per 1M IDs and lookup throughput per backend.
+
+    python -m bench.bench_seen --ids 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.seen_storage import BloomSeenStorage, SqliteSeenStorage  # noqa: E402
+
+FILTER = "bench"
+BATCH = 1000
+LOOKUP_BATCH = 40  # one listing page
+
+
+def _ids(n: int, offset: int = 0) -> list[str]:
+    return [str(800_000_000 + offset + i) for i in range(n)]
+
+
+def _fill(storage, ids: list[str]) -> float:
+    started = time.perf_counter()
+    for i in range(0, len(ids), BATCH):
+        storage.add_many(FILTER, set(ids[i:i + BATCH]))
+    return time.perf_counter() - started
+
+
+def _resident_bytes(open_storage) -> int:
+    """Bytes allocated to load a filter's seen IDs from disk into memory."""
+    gc.collect()
+    tracemalloc.start()
+    storage = open_storage()
+    storage.unseen_only(FILTER, {"warmup"})
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    storage.close()
+    return current
+
+
+def _lookups(storage, known: list[str], lookups: int) -> dict:
+    rng = random.Random(1)
+    batches = []
+    for _ in range(lookups // LOOKUP_BATCH):
+        half = LOOKUP_BATCH // 2
+        batch = set(rng.sample(known, half)) | set(_ids(half, offset=10_000_000 + rng.randrange(10_000_000)))
+        batches.append(batch)
+    started = time.perf_counter()
+    false_positives = 0
+    for batch in batches:
+        unseen = storage.unseen_only(FILTER, batch)
+        false_positives += sum(1 for ad_id in batch if int(ad_id) >= 810_000_000 and ad_id not in unseen)
+    elapsed = time.perf_counter() - started
+    fresh = len(batches) * (LOOKUP_BATCH // 2)
+    return {
+        "lookups_per_sec": round(len(batches) * LOOKUP_BATCH / elapsed),
+        "false_positive_rate": false_positives / fresh if fresh else 0.0,
+    }
+
+
+def run(n_ids: int, lookups: int, bloom_error_rate: float) -> dict:
+    ids = _ids(n_ids)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "sqlite": lambda: SqliteSeenStorage(os.path.join(tmp, "sqlite.db")),
+            "bloom": lambda: BloomSeenStorage(
+                os.path.join(tmp, "bloom.db"), capacity=n_ids, error_rate=bloom_error_rate),
+        }
+        for name, open_storage in backends.items():
+            storage = open_storage()
+            fill_sec = _fill(storage, ids)
+            storage.close()
+            resident = _resident_bytes(open_storage)
+            storage = open_storage()
+            lookup = _lookups(storage, ids, lookups)
+            storage.close()
+            results[name] = {
+                "ids": n_ids,
+                "insert_ids_per_sec": round(n_ids / fill_sec),
+                "memory_bytes": resident,
+                "memory_mb_per_1m_ids": round(resident / n_ids * 1_000_000 / 2**20, 2),
+                **lookup,
+            }
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--ids", type=int, default=1_000_000)
+    ap.add_argument("--lookups", type=int, default=200_000)
+    ap.add_argument("--bloom-error-rate", type=float, default=0.001)
+    args = ap.parse_args()
+    print(json.dumps({"benchmark": "seen_storage", "results": run(args.ids, args.lookups, args.bloom_error_rate)},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
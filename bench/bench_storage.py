@@ -0,0 +1,150 @@
+"""Storage benchmark: seen-ID calls as history grows, FiltersStorage calls as filters pile up,
+and fingerprint diffs of a listing page.
+
+    python -m bench.bench_storage --sizes 10000,100000,1000000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+
+from bench.common import emit, measure
+
+from app.filters_storage import FiltersStorage
+from app.fingerprints import FingerprintStore, FingerprintTable
+from app.parser import OlxAd
+from app.seen_storage import BloomSeenStorage, SeenStorage, SqliteSeenStorage
+
+FILTER = "bench"
+BATCH = 1000
+PAGE = 40  # IDs on one listing page
+FILTERS_PER_CHAT = 5
+
+
+def _ids(start: int, count: int) -> list[str]:
+    return [str(800_000_000 + i) for i in range(start, start + count)]
+
+
+def _seen_backend(open_storage, sizes: list[int], repeat: int) -> dict:
+    storage = open_storage()
+    results = {}
+    filled = 0
+    fresh = 50_000_000
+    try:
+        for size in sizes:
+            while filled < size:
+                count = min(BATCH, size - filled)
+                storage.add_many(FILTER, set(_ids(filled, count)))
+                filled += count
+            half = PAGE // 2
+            lookup = set(_ids(max(0, size - half), half)) | set(_ids(fresh, half))
+
+            def add_page():
+                nonlocal fresh
+                storage.add_many(FILTER, set(_ids(fresh, PAGE)))
+                fresh += PAGE
+
+            results[str(size)] = {
+                "unseen_only": measure(lambda: storage.unseen_only(FILTER, lookup), number=20, repeat=repeat),
+                "add_many": measure(add_page, number=5, repeat=repeat),
+            }
+    finally:
+        storage.close()
+    return results
+
+
+def _filters(tmp: str, counts: list[int], repeat: int) -> dict:
+    results = {}
+    for count in counts:
+        path = os.path.join(tmp, f"filters_{count}.json")
+        storage = FiltersStorage(path)
+        # a handful of filters per chat, as real users have
+        for i in range(count):
+            storage.upsert(f"filter {i}", f"https://www.olx.ua/uk/nedvizhimost/kvartiry/?page={i}",
+                           chat_id=i // FILTERS_PER_CHAT)
+        results[str(count)] = {
+            "read": measure(lambda: storage.read(0), number=20, repeat=repeat),
+            "get": measure(lambda: storage.get("filter 0", 0), number=20, repeat=repeat),
+            "upsert": measure(lambda: storage.upsert("filter 0", "https://www.olx.ua/uk/", chat_id=0),
+                              number=5, repeat=repeat),
+        }
+    return results
+
+
+def _ad(i: int, price: float) -> OlxAd:
+    return OlxAd(str(800_000_000 + i), f"Квартира {i % 97} кімнати біля метро", f"{price:.0f} $",
+                 "Київ, Поділ - Сьогодні о 12:00", "45 м²", f"https://www.olx.ua/d/uk/obyavlenie/{i}.html",
+                 None, price, "USD", 45.0)
+
+
+def _fingerprints(tmp: str, capacity: int, repeat: int) -> dict:
+    base = [_ad(i, 50_000) for i in range(capacity)]
+    table = FingerprintTable(capacity)
+    table.diff(base)
+    fresh = capacity
+
+    def diff_page():
+        # a page of mostly known ads with a few price cuts and a few new ones
+        nonlocal fresh
+        page = base[-30:] + [_ad(i, 49_000 + fresh % 7) for i in range(capacity - 40, capacity - 35)]
+        page += [_ad(fresh + i, 50_000) for i in range(5)]
+        fresh += 5
+        table.diff(page)
+
+    store = FingerprintStore(os.path.join(tmp, "fingerprints.sqlite3"), capacity=capacity)
+    store.diff("bench", base)
+    store_fresh = capacity
+
+    def store_page():
+        nonlocal store_fresh
+        store.diff("bench", base[-35:] + [_ad(store_fresh + i, 50_000) for i in range(5)])
+        store_fresh += 5
+
+    try:
+        return {
+            "capacity": capacity,
+            "table_bytes": table.nbytes(),
+            "diff_page": measure(diff_page, number=20, repeat=repeat),
+            "store_diff_page": measure(store_page, number=20, repeat=repeat),
+        }
+    finally:
+        store.close()
+
+
+def run(sizes: list[int], json_max: int, filter_counts: list[int], repeat: int = 5) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "json": lambda: SeenStorage(os.path.join(tmp, "seen.json")),
+            "sqlite": lambda: SqliteSeenStorage(os.path.join(tmp, "seen.sqlite3")),
+            "bloom": lambda: BloomSeenStorage(os.path.join(tmp, "seen_bloom.sqlite3"), capacity=max(sizes)),
+        }
+        seen = {}
+        for name, open_storage in backends.items():
+            # the JSON backend rewrites the whole file on every add; keep it to sizes it can finish
+            backend_sizes = [s for s in sizes if name != "json" or s <= json_max]
+            seen[name] = _seen_backend(open_storage, backend_sizes, repeat)
+        return {
+            "seen": seen,
+            "filters": _filters(tmp, filter_counts, repeat),
+            "fingerprints": _fingerprints(tmp, 1000, repeat),
+        }
+
+
+def _int_list(value: str) -> list[int]:
+    return sorted(int(v) for v in value.split(",") if v)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=_int_list, default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--json-max", type=int, default=100_000, help="largest history tried with the JSON backend")
+    ap.add_argument("--filters", type=_int_list, default=[10, 100, 1000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+    emit("storage", run(args.sizes, args.json_max, args.filters, args.repeat), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Timing helpers and the JSON envelope shared by the benchmark modules."""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+
+def measure(fn: Callable[[], Any], number: int = 1, repeat: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """Runs ``fn`` ``number`` times per sample; reports per-call latency over ``repeat`` samples."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+        "ops_per_sec": round(1 / median, 1) if median else 0.0,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def emit(benchmark: str, results: Dict[str, Any], out: Optional[str] = None) -> Dict[str, Any]:
+    doc = {"benchmark": benchmark, "environment": environment(), "results": results}
+    text = json.dumps(doc, indent=2, ensure_ascii=False)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return doc
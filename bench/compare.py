@@ -0,0 +1,60 @@
+"""Compares two benchmark JSON files metric by metric.
+
+    python -m bench.compare before.json after.json [--threshold 5]
+
+Prints one line per latency/throughput value with the relative change;
+``--threshold`` hides changes smaller than that many percent.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Any, Dict, Iterator, Tuple
+
+# metrics where a bigger number is better
+_HIGHER_IS_BETTER = ("ops_per_sec", "per_sec")
+
+
+def _flatten(node: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from _flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, float(node)
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    old = dict(_flatten(before.get("results", before)))
+    new = dict(_flatten(after.get("results", after)))
+    changes = {}
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(("_ms", "_us", "per_sec")) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        better = change > 0 if key.endswith(_HIGHER_IS_BETTER) else change < 0
+        changes[key] = {"before": old[key], "after": new[key], "change_pct": round(change, 1), "better": better}
+    return changes
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("before")
+    ap.add_argument("after")
+    ap.add_argument("--threshold", type=float, default=0.0)
+    ap.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = ap.parse_args()
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    changes = {k: v for k, v in compare(before, after).items() if abs(v["change_pct"]) >= args.threshold}
+    if args.json:
+        print(json.dumps(changes, indent=2))
+        return
+    for key, c in changes.items():
+        mark = "+" if c["better"] else "-" if c["change_pct"] else " "
+        print(f"{mark} {key:<60} {c['before']:>12g} -> {c['after']:>12g}  ({c['change_pct']:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
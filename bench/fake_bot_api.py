@@ -0,0 +1,161 @@
+"""A local stand-in for the Telegram Bot API that records what the bot sends.
+
+Point the bot at it with ``TELEGRAM_API_URL=http://127.0.0.1:<port>``. Sends are held
+to Telegram's flood limits (per chat and overall, albums counting one per photo); going
+over answers 429 with ``retry_after`` the way Telegram does. ``getUpdates`` long-polls
+a queue the load test fills with commands from simulated chats.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from bench.replay_updates import text_update
+
+# ad links in captions: https://www.olx.ua/d/uk/obyavlenie/kvartira-900000123.html
+AD_LINK_RE = re.compile(r"obyavlenie/[^\"'\s]*?(\d+)\.html")
+SEND_METHODS = frozenset({"sendMessage", "sendPhoto", "sendMediaGroup"})
+
+
+class _Bucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def wait_for(self, cost: float, now: float) -> float:
+        """Seconds until ``cost`` tokens are available; 0 if they are now."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return max(0.0, min(cost, self.capacity) - self.tokens) / self.rate
+
+    def take(self, cost: float) -> None:
+        self.tokens -= min(cost, self.capacity)
+
+
+class FakeBotApi:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3):
+        self._global_rate = global_rate
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._global: Optional[_Bucket] = None
+        self._chats: Dict[int, _Bucket] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.port = 0
+        self._updates: List[dict] = []
+        self._next_update_id = 1
+        self._new_update = asyncio.Event()
+        self._message_id = 0
+        # (chat, ad ID, monotonic time) for every ad that reached a chat
+        self.deliveries: List[Tuple[int, int, float]] = []
+        # chat -> when its last command was issued, until the bot answers
+        self._awaiting_reply: Dict[int, float] = {}
+        self.reply_latencies: List[float] = []
+        self.calls: Dict[str, int] = {}
+        self.flood_rejections: Dict[str, int] = {}
+        self.bytes_received = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self) -> None:
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def send_command(self, chat_id: int, text: str) -> None:
+        """Queues a message from ``chat_id`` for the bot's next getUpdates."""
+        self._updates.append(text_update(self._next_update_id, chat_id, text))
+        self._next_update_id += 1
+        self._awaiting_reply.setdefault(chat_id, time.monotonic())
+        self._new_update.set()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.bytes_received += request.content_length or 0
+        params: Dict[str, Any] = dict(await request.post()) if request.body_exists else {}
+        if method == "getUpdates":
+            return _ok(await self._get_updates(params))
+        if method == "getMe":
+            return _ok({"id": 1, "is_bot": True, "first_name": "Load test", "username": "load_test_bot"})
+        if method not in SEND_METHODS:
+            return _ok(True)
+
+        chat_id = int(params["chat_id"])
+        media = json.loads(params["media"]) if method == "sendMediaGroup" else []
+        cost = max(1, len(media))
+        now = time.monotonic()
+        if self._global is None:
+            self._global = _Bucket(self._global_rate, self._global_rate, now)
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = _Bucket(self._chat_rate, self._chat_burst, now)
+        wait = max(bucket.wait_for(cost, now), self._global.wait_for(cost, now))
+        if wait > 0:
+            self.flood_rejections[method] = self.flood_rejections.get(method, 0) + 1
+            retry_after = max(1, math.ceil(wait))
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+        bucket.take(cost)
+        self._global.take(cost)
+
+        texts = [m.get("caption") or "" for m in media] or [str(params.get("text") or params.get("caption") or "")]
+        ad_ids = [int(m) for text in texts for m in AD_LINK_RE.findall(text)]
+        for ad_id in ad_ids:
+            self.deliveries.append((chat_id, ad_id, now))
+        if not ad_ids and chat_id in self._awaiting_reply:
+            self.reply_latencies.append(now - self._awaiting_reply.pop(chat_id))
+        if method == "sendMediaGroup":
+            return _ok([self._message(chat_id, photo=True) for _ in media])
+        return _ok(self._message(chat_id, photo=method == "sendPhoto"))
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[dict]:
+        offset = int(params.get("offset") or 0)
+        if offset:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    def _message(self, chat_id: int, photo: bool) -> dict:
+        self._message_id += 1
+        message: Dict[str, Any] = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if photo:
+            message["photo"] = [{"file_id": f"photo-{self._message_id}", "file_unique_id": f"u{self._message_id}",
+                                 "width": 1, "height": 1}]
+        return message
+
+
+def _ok(result: Any) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
@@ -0,0 +1,143 @@
+"""A local stand-in for OLX listing pages whose feeds gain new ads while a load test runs.
+
+Feed ``n`` lives at ``/feed/<n>/?search[order]=created_at:desc`` and publishes ads as a
+Poisson process at ``ads_per_min``. Pages list today's ads newest first, padded with
+older cards so the parsers see where today ends, and are rendered once per change.
+Each ad is recorded with the monotonic time it was published; ``image_share`` of the
+ads carry a photo served from ``/img/<id>.jpg``.
+"""
+from __future__ import annotations
+
+import heapq
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from bench.fixtures import LOCATIONS, TITLES, card_html, page_html
+
+CARDS_PER_PAGE = 40
+# JPEG markers around filler: the bot only checks the content type and the fake Bot API
+# never decodes it
+FAKE_JPEG = b"\xff\xd8\xff\xe0" + bytes(2048) + b"\xff\xd9"
+
+
+class _Feed:
+    __slots__ = ("ads", "pages", "old_cards")
+
+    def __init__(self, old_cards: List[str]):
+        # newest first: (ad_id, card html)
+        self.ads: List[Tuple[int, str]] = []
+        self.pages: Dict[int, bytes] = {}
+        self.old_cards = old_cards
+
+
+class FakeOlx:
+    def __init__(self, feeds: int, ads_per_min: float, image_share: float = 0.8,
+                 padding_kb: int = 150, seed: int = 1):
+        self._rng = random.Random(seed)
+        self._rate = ads_per_min / 60
+        self._image_share = image_share
+        self._padding_kb = padding_kb
+        self._next_id = 900_000_000
+        self._feeds = [_Feed(self._old_cards(n)) for n in range(feeds)]
+        self._due: List[Tuple[float, int]] = []
+        self._runner: Optional[web.AppRunner] = None
+        self.port = 0
+        self.publishing = False
+        # ad ID -> (feed, monotonic publish time)
+        self.published: Dict[int, Tuple[int, float]] = {}
+        self.requests = 0
+        self.pages_served = 0
+        self.bytes_served = 0
+        self.images_served = 0
+
+    def _old_cards(self, feed: int) -> List[str]:
+        return [card_html(ad_id=800_000_000 + feed * 100 + i, title=self._rng.choice(TITLES), price="9 000",
+                          location=self._rng.choice(LOCATIONS), date="12 травня 2024 р.", size=40)
+                for i in range(CARDS_PER_PAGE)]
+
+    def url(self, feed: int) -> str:
+        return f"http://127.0.0.1:{self.port}/feed/{feed}/?search%5Border%5D=created_at%3Adesc"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/feed/{feed}/", self._listing)
+        app.router.add_get("/img/{name}", self._image)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def start_publishing(self) -> None:
+        now = time.monotonic()
+        self._due = [(now + self._rng.expovariate(self._rate), n) for n in range(len(self._feeds))] if self._rate else []
+        heapq.heapify(self._due)
+        self.publishing = True
+
+    def stop_publishing(self) -> None:
+        self.publishing = False
+
+    def tick(self) -> int:
+        """Publishes every ad that is due; call it often (the load test does, every 50 ms)."""
+        if not self.publishing:
+            return 0
+        now = time.monotonic()
+        count = 0
+        while self._due and self._due[0][0] <= now:
+            due, n = heapq.heappop(self._due)
+            self._publish(n, due)
+            heapq.heappush(self._due, (due + self._rng.expovariate(self._rate), n))
+            count += 1
+        return count
+
+    def _publish(self, n: int, when: float) -> None:
+        ad_id = self._next_id
+        self._next_id += 1
+        image = (f"http://127.0.0.1:{self.port}/img/{ad_id}.jpg"
+                 if self._rng.random() < self._image_share else None)
+        # the ID in the title keeps fingerprints from taking a new ad for a re-post
+        card = card_html(ad_id=ad_id, title=f"{self._rng.choice(TITLES)} #{ad_id}",
+                         price=f"{self._rng.randrange(6, 40) * 1000:,}".replace(",", " "),
+                         location=self._rng.choice(LOCATIONS), date=f"Сьогодні о {datetime.now():%H:%M}",
+                         size=self._rng.randrange(20, 120), image_url=image, photo=image is not None)
+        feed = self._feeds[n]
+        feed.ads.insert(0, (ad_id, card))
+        # four pages of today's ads; polls stop long before that
+        del feed.ads[4 * CARDS_PER_PAGE:]
+        feed.pages.clear()
+        self.published[ad_id] = (n, when)
+
+    def _page(self, n: int, page: int) -> bytes:
+        feed = self._feeds[n]
+        body = feed.pages.get(page)
+        if body is None:
+            start = (page - 1) * CARDS_PER_PAGE
+            cards = [card for _, card in feed.ads[start:start + CARDS_PER_PAGE]]
+            cards += feed.old_cards[:CARDS_PER_PAGE - len(cards)]
+            body = feed.pages[page] = page_html(cards, self._padding_kb).encode("utf-8")
+        return body
+
+    async def _listing(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        try:
+            n = int(request.match_info["feed"])
+            page = max(1, int(request.query.get("page", "1")))
+            body = self._page(n, page)
+        except (ValueError, IndexError):
+            raise web.HTTPNotFound()
+        self.pages_served += 1
+        self.bytes_served += len(body)
+        return web.Response(body=body, content_type="text/html", charset="utf-8")
+
+    async def _image(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.images_served += 1
+        return web.Response(body=FAKE_JPEG, content_type="image/jpeg")
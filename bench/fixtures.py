@@ -0,0 +1,152 @@
+"""Synthetic OLX listing pages and a local HTTP server to fetch them from.
+
+Pages use the same markup the parsers look for (``l-card`` cards, ``location-date``,
+``ad-price``...). Real pages saved from the browser can be served instead with
+``pages_from_dir``; each ``<name>.html`` file becomes page kind ``<name>``.
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# cards per page, share of today's ads, padding that stands in for scripts/styles/state
+PAGE_KINDS = {
+    "small": {"cards": 8, "today": 1.0, "padding_kb": 20},
+    "standard": {"cards": 40, "today": 0.5, "padding_kb": 150},
+    "heavy": {"cards": 40, "today": 0.5, "padding_kb": 1500},
+}
+
+_CARD = """
+<div data-cy="l-card" data-testid="l-card" data-visually-ready-trigger-element="true" id="{ad_id}" class="css-1sw7q4x">
+  <div type="list" class="css-1apmciz">
+    <div class="css-1ut25fa">{featured}
+      <a class="css-1tqlkj0" href="/d/uk/obyavlenie/kvartira-{ad_id}.html">
+        <div class="css-gl6djm">{image}</div>
+      </a>
+    </div>
+    <div class="css-u2ayx9">
+      <div data-cy="ad-card-title" class="css-u2ayx9"><a class="css-z3gu2d" href="/d/uk/obyavlenie/kvartira-{ad_id}.html">
+        <h4 class="css-1s3qyje">{title}</h4></a></div>
+      <p data-testid="ad-price" class="css-13afqrm">{price} грн.<span class="css-1ygi4b4">Договірна</span></p>
+    </div>
+    <div class="css-odp1qd">
+      <p data-testid="location-date" class="css-1mwdrlh">{location} - {date}</p>
+      <div class="css-1kfqt7f"><svg width="16" height="16" viewBox="0 0 24 24"><path d="M1 1h22v22H1z"></path></svg>
+        <span class="css-643j0o">{size} м²</span></div>
+    </div>
+  </div>
+</div>"""
+
+_IMAGE = """<img src="{url}"
+             srcset="" alt="{title}" class="css-8wsg1m">"""
+
+_FEATURED = '<div data-testid="adCard-featured" class="css-1jh69qu"><span>ТОП</span></div>'
+
+TITLES = ["Оренда 1-кімнатної квартири", "Здам 2к квартиру біля метро", "Квартира з ремонтом, новобудова",
+           "Довгострокова оренда, центр", "Затишна квартира для сім'ї", "Студія з балконом"]
+LOCATIONS = ["Київ, Печерський", "Київ, Оболонський", "Львів, Франківський", "Одеса, Приморський"]
+
+
+def card_html(ad_id: int, title: str, price: str, location: str, date: str, size: int,
+              promoted: bool = False, image_url: Optional[str] = None, photo: bool = True) -> str:
+    """One ``l-card``; ``image_url`` defaults to a CDN-style path, ``photo=False`` leaves the image out."""
+    url = image_url or f"https://ireland.apollo.olxcdn.com/v1/files/{ad_id}/image;s=216x152"
+    return _CARD.format(
+        ad_id=ad_id,
+        featured=_FEATURED if promoted else "",
+        image=_IMAGE.format(url=url, title=title) if photo else "",
+        title=title,
+        price=price,
+        location=location,
+        date=date,
+        size=size,
+    )
+
+
+def page_html(cards: List[str], padding_kb: int = 150) -> str:
+    """A listing page around rendered cards."""
+    # inline bundles and page state make up most of a real page's bytes
+    blob = json.dumps({"chunk": "x" * 1000, "items": list(range(50))})
+    padding = "\n".join(f"<script>window.__bench_{i} = {blob};</script>"
+                        for i in range(max(0, padding_kb * 1024 // (len(blob) + 40))))
+    return (
+        "<!DOCTYPE html><html lang=\"uk\"><head><meta charset=\"utf-8\"><title>Квартири - OLX.ua</title>"
+        f"<style>{'.c{color:#000}' * 200}</style></head><body><div id=\"root\">"
+        "<div data-testid=\"listing-grid\" class=\"css-j0t2x2\">"
+        + "".join(cards)
+        + f"</div></div>{padding}</body></html>"
+    )
+
+
+def listing_html(cards: int = 40, today: float = 0.5, padding_kb: int = 150,
+                 promoted: int = 2, seed: int = 1, first_id: int = 880_000_000) -> str:
+    """Listing page with ``promoted`` pinned cards, then today's ads, then older ones."""
+    rng = random.Random(seed)
+    today_count = round((cards - promoted) * today)
+    parts = []
+    for i in range(cards):
+        is_promoted = i < promoted
+        is_today = is_promoted or i < promoted + today_count
+        parts.append(card_html(
+            ad_id=first_id - i,
+            title=rng.choice(TITLES),
+            price=f"{rng.randrange(6, 40) * 1000:,}".replace(",", " "),
+            location=rng.choice(LOCATIONS),
+            date=f"Сьогодні о {rng.randrange(0, 24):02d}:{rng.randrange(0, 60):02d}" if is_today
+            else f"{rng.randrange(1, 28)} травня 2024 р.",
+            size=rng.randrange(20, 120),
+            promoted=is_promoted,
+        ))
+    return page_html(parts, padding_kb)
+
+
+def default_pages() -> Dict[str, str]:
+    return {kind: listing_html(**params) for kind, params in PAGE_KINDS.items()}
+
+
+def pages_from_dir(path: str) -> Dict[str, str]:
+    return {p.stem: p.read_text(encoding="utf-8") for p in sorted(Path(path).glob("*.html"))}
+
+
+class PageServer:
+    """Serves ``/<kind>/`` (any query string, including ``page=N``) from memory on 127.0.0.1."""
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = {kind: html.encode("utf-8") for kind, html in pages.items()}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def __enter__(self) -> PageServer:
+        pages = self.pages
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = pages.get(self.path.split("?", 1)[0].strip("/"))
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def url(self, kind: str) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{kind}/?search%5Border%5D=created_at:desc"
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
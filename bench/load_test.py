@@ -0,0 +1,322 @@
+"""End-to-end load test: the real bot process against a fake OLX and a fake Bot API.
+
+    python -m bench.load_test --chats 2000 --feeds 200 --ads-per-min 1 --duration 300
+    python -m bench.load_test --chats 500 --env SCRAPE_WORKERS=6 --env MAX_PAGES=1 --out run.json
+
+Every simulated chat tracks one of ``--feeds`` searches on the fake OLX, saved as if
+the chats had set tracking up before a restart, so the bot resumes them all on start.
+The fake OLX publishes ads while the test runs and the fake Bot API records which ad
+reached which chat and when, holding the bot to Telegram's flood limits. Simulated
+chats also send commands through getUpdates, so the dispatcher is under load too.
+
+Only ads published after ``--warmup`` count. Publishing stops after ``--duration`` and
+deliveries are awaited for ``--settle`` more seconds. The report gives publish-to-
+delivery latency percentiles, how many expected deliveries arrived, command reply
+latency, scrape throughput, Bot API calls and 429s, and the bot process's CPU and RSS
+(read from /proc, so Linux only). Extra bot settings go in ``--env NAME=VALUE``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from bench.common import ROOT, emit
+from bench.fake_bot_api import FakeBotApi
+from bench.fake_olx import FakeOlx
+
+COMMANDS = ("/start", "/help", "/rules")
+# bot metrics copied into the report
+BOT_METRICS = ("olx_fetch_seconds_count", "olx_fetch_seconds_sum", "olx_fetch_errors_total",
+               "olx_fetch_failures_total", "olx_new_ads_total", "olx_send_failures_total",
+               "olx_delivery_pending", "olx_cards_parsed_total")
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def rank(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+    return {"count": len(values), "p50": rank(0.5), "p90": rank(0.9), "p95": rank(0.95),
+            "p99": rank(0.99), "max": round(values[-1], 3)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ProcessSampler:
+    """CPU time and RSS of one process from /proc."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self.rss_samples: List[float] = []
+
+    def cpu_seconds(self) -> float:
+        try:
+            with open(f"/proc/{self.pid}/stat", "rb") as f:
+                fields = f.read().decode("utf-8", "replace").rsplit(")", 1)[1].split()
+        except OSError:
+            return 0.0
+        # utime and stime: fields 14 and 15 of stat, 12 and 13 after the command name
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def memory_mb(self) -> Dict[str, float]:
+        found: Dict[str, float] = {}
+        try:
+            with open(f"/proc/{self.pid}/status", encoding="utf-8") as f:
+                for line in f:
+                    key = line.split(":", 1)[0]
+                    if key in ("VmRSS", "VmHWM"):
+                        found[key] = int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return found
+
+    def sample(self) -> None:
+        rss = self.memory_mb().get("VmRSS")
+        if rss is not None:
+            self.rss_samples.append(rss)
+
+
+def write_state(workdir: str, olx: FakeOlx, chats: int, feeds: int) -> List[int]:
+    """filters.json and tracking.json for ``chats`` chats spread over ``feeds`` searches."""
+    chat_ids = [100_000 + i for i in range(chats)]
+    filters = {"version": 2, "chats": {str(c): {"load": olx.url(i % feeds)} for i, c in enumerate(chat_ids)}}
+    tracking = {str(c): {"filter": "load", "url": olx.url(i % feeds), "started_at": i}
+                for i, c in enumerate(chat_ids)}
+    with open(os.path.join(workdir, "filters.json"), "w", encoding="utf-8") as f:
+        json.dump(filters, f)
+    with open(os.path.join(workdir, "tracking.json"), "w", encoding="utf-8") as f:
+        json.dump(tracking, f)
+    return chat_ids
+
+
+def bot_env(args: argparse.Namespace, workdir: str, api: FakeBotApi, metrics_port: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "BOT_TOKEN": "123456:LOAD-TEST",
+        "TELEGRAM_API_URL": api.base_url,
+        "FETCH_ENGINE": "http",
+        "JOB_BROKER": "",
+        "WEBHOOK_URL": "",
+        "FILTERS_FILE": os.path.join(workdir, "filters.json"),
+        "TRACKING_FILE": os.path.join(workdir, "tracking.json"),
+        "SEEN_FILE": os.path.join(workdir, "seen_ads.json"),
+        "SEEN_DB": os.path.join(workdir, "seen_ads.sqlite3"),
+        "FINGERPRINT_DB": os.path.join(workdir, "fingerprints.sqlite3"),
+        "IMAGE_CACHE_DIR": os.path.join(workdir, "image_cache"),
+        "CHROMEDRIVER_CACHE": os.path.join(workdir, "chromedriver.json"),
+        "DRIVER_PREWARM": "0",
+        "RESTORE_WINDOW_SEC": str(args.restore_window),
+        "POLL_INTERVAL_SEC": str(args.poll_sec),
+        "POLL_ADAPTIVE": "0",
+        "METRICS_PORT": str(metrics_port),
+        "METRICS_HOST": "127.0.0.1",
+    })
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    return env
+
+
+def scrape_metrics(port: int) -> Dict[str, float]:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            text = resp.read().decode("utf-8")
+    except OSError:
+        return {}
+    totals: Dict[str, float] = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line.strip():
+            continue
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name in BOT_METRICS:
+            # labelled series summed per metric
+            totals[name] = totals.get(name, 0.0) + float(line.rsplit(" ", 1)[1])
+    return {k: round(v, 3) for k, v in totals.items()}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="olx-load-")
+    olx = FakeOlx(args.feeds, args.ads_per_min, image_share=args.image_share, padding_kb=args.padding_kb)
+    api = FakeBotApi(global_rate=args.api_global_rate, chat_rate=args.api_chat_rate)
+    await olx.start()
+    await api.start()
+    chat_ids = write_state(workdir, olx, args.chats, args.feeds)
+    chats_per_feed = [0] * args.feeds
+    for i in range(args.chats):
+        chats_per_feed[i % args.feeds] += 1
+    metrics_port = _free_port()
+    log_path = os.path.join(workdir, "bot.log")
+    harness_cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen([sys.executable, "-m", "app.bot"], cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+                                env=bot_env(args, workdir, api, metrics_port))
+    sampler = ProcessSampler(proc.pid)
+    rng = random.Random(7)
+    try:
+        started = time.monotonic()
+        while "getUpdates" not in api.calls:
+            if proc.poll() is not None:
+                raise RuntimeError(f"bot exited with code {proc.returncode}; see {log_path}")
+            if time.monotonic() - started > 120:
+                raise RuntimeError(f"bot did not start polling within 120s; see {log_path}")
+            await asyncio.sleep(0.1)
+        startup_sec = time.monotonic() - started
+
+        olx.start_publishing()
+        t0 = time.monotonic()
+        window_start, window_end = t0 + args.warmup, t0 + args.warmup + args.duration
+        stop_at = window_end + args.settle
+        snapshot: Dict[str, float] = {}
+        commands_due = 0.0
+        last = next_sample = t0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            if proc.poll() is not None:
+                raise RuntimeError(f"bot exited with code {proc.returncode}; see {log_path}")
+            if now >= window_end and olx.publishing:
+                olx.stop_publishing()
+                snapshot.update(cpu_end=sampler.cpu_seconds(), pages_end=olx.pages_served,
+                                bytes_end=olx.bytes_served)
+            if now >= window_start and "cpu_start" not in snapshot:
+                snapshot.update(cpu_start=sampler.cpu_seconds(), pages_start=olx.pages_served,
+                                bytes_start=olx.bytes_served)
+            olx.tick()
+            if olx.publishing:
+                commands_due += args.commands_per_sec * (now - last)
+                while commands_due >= 1:
+                    commands_due -= 1
+                    api.send_command(rng.choice(chat_ids), rng.choice(COMMANDS))
+            if now >= next_sample:
+                sampler.sample()
+                next_sample = now + 1
+            last = now
+            await asyncio.sleep(0.05)
+
+        bot_metrics = await asyncio.to_thread(scrape_metrics, metrics_port)
+        memory = sampler.memory_mb()
+    finally:
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.to_thread(proc.wait, 30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        await api.close()
+        await olx.close()
+    harness_cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    window_ads = {ad_id: (feed, when) for ad_id, (feed, when) in olx.published.items()
+                  if window_start <= when < window_end}
+    expected = sum(chats_per_feed[feed] for feed, _ in window_ads.values())
+    latencies: List[float] = []
+    delivered = set()
+    duplicates = 0
+    for chat_id, ad_id, at in api.deliveries:
+        published = window_ads.get(ad_id)
+        if published is None:
+            continue
+        if (chat_id, ad_id) in delivered:
+            duplicates += 1
+            continue
+        delivered.add((chat_id, ad_id))
+        latencies.append(at - published[1])
+    sends = sum(api.calls.get(m, 0) for m in ("sendMessage", "sendPhoto", "sendMediaGroup"))
+    duration = args.duration
+    result = {
+        "config": {
+            "chats": args.chats, "feeds": args.feeds, "ads_per_min_per_feed": args.ads_per_min,
+            "poll_sec": args.poll_sec, "warmup_sec": args.warmup, "duration_sec": duration,
+            "settle_sec": args.settle, "commands_per_sec": args.commands_per_sec,
+            "image_share": args.image_share, "env": args.env,
+        },
+        "startup_sec": round(startup_sec, 2),
+        "delivery": {
+            "ads_published": len(window_ads),
+            "expected": expected,
+            "delivered": len(delivered),
+            "delivered_share": round(len(delivered) / expected, 4) if expected else None,
+            "duplicates": duplicates,
+            "latency_sec": percentiles(latencies),
+        },
+        "commands": {
+            "sent": api._next_update_id - 1,
+            "reply_latency_sec": percentiles(api.reply_latencies),
+        },
+        "scrape": {
+            "pages_per_sec": round((snapshot.get("pages_end", olx.pages_served) - snapshot.get("pages_start", 0))
+                                   / duration, 2),
+            "mb_per_sec": round((snapshot.get("bytes_end", olx.bytes_served) - snapshot.get("bytes_start", 0))
+                                / duration / 1e6, 3),
+            "images_served": olx.images_served,
+        },
+        "bot_api": {
+            "calls": dict(sorted(api.calls.items())),
+            "sends_per_sec": round(sends / (duration + args.warmup + args.settle), 2),
+            "flood_rejections": api.flood_rejections,
+        },
+        "bot_process": {
+            "cpu_percent": round(100 * (snapshot.get("cpu_end", 0) - snapshot.get("cpu_start", 0)) / duration, 1),
+            "rss_mb_peak": round(max(sampler.rss_samples, default=0), 1),
+            "rss_mb_end": round(memory.get("VmRSS", 0), 1),
+            "rss_mb_high_water": round(memory.get("VmHWM", 0), 1),
+        },
+        "bot_metrics": bot_metrics,
+        "harness_cpu_sec": round((harness_cpu_end.ru_utime + harness_cpu_end.ru_stime)
+                                 - (harness_cpu_start.ru_utime + harness_cpu_start.ru_stime), 2),
+        "log": log_path if args.keep else None,
+    }
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chats", type=int, default=1000)
+    ap.add_argument("--feeds", type=int, default=100, help="distinct searches the chats are spread over")
+    ap.add_argument("--ads-per-min", type=float, default=1, help="new ads per feed per minute")
+    ap.add_argument("--poll-sec", type=int, default=30, help="POLL_INTERVAL_SEC for the bot")
+    ap.add_argument("--restore-window", type=int, default=10, help="RESTORE_WINDOW_SEC for the bot")
+    ap.add_argument("--warmup", type=float, default=60, help="seconds before ads start to count")
+    ap.add_argument("--duration", type=float, default=180, help="seconds of measured publishing")
+    ap.add_argument("--settle", type=float, default=60, help="seconds to wait for deliveries afterwards")
+    ap.add_argument("--commands-per-sec", type=float, default=2, help="commands sent by simulated chats")
+    ap.add_argument("--image-share", type=float, default=0.8, help="share of ads with a photo")
+    ap.add_argument("--padding-kb", type=int, default=150, help="extra bytes per listing page, like a real one")
+    ap.add_argument("--api-global-rate", type=float, default=30, help="fake Bot API limit, messages/s overall")
+    ap.add_argument("--api-chat-rate", type=float, default=1, help="fake Bot API limit, messages/s per chat")
+    ap.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra bot setting")
+    ap.add_argument("--keep", action="store_true", help="keep the work directory and bot log")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+    if args.feeds < 1 or args.chats < 1:
+        ap.error("--chats and --feeds must be positive")
+    emit("load_test", asyncio.run(run(args)), args.out)
+
+
+if __name__ == "__main__":
+    main()
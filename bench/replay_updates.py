@@ -0,0 +1,98 @@
+"""Posts recorded Telegram updates to a locally running bot in webhook mode.
+
+    WEBHOOK_URL=http://localhost:8080 WEBHOOK_REGISTER=0 WEBHOOK_SECRET=test python -m app.bot
+    python -m bench.replay_updates updates/*.json --secret test
+    python -m bench.replay_updates --text /start --chat-id 123456
+
+Each file holds one update object or a list of them (the shape getUpdates returns).
+Prints the HTTP status and latency of every post, then a JSON summary.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from bench.common import emit
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_updates(paths: list[str]) -> list[dict]:
+    updates: list[dict] = []
+    for path in paths:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if isinstance(data, dict) and "result" in data:
+            data = data["result"]
+        updates.extend(data if isinstance(data, list) else [data])
+    return updates
+
+
+def text_update(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+               if text.startswith("/") else {}),
+        },
+    }
+
+
+def post(url: str, update: dict, secret: str, timeout: float) -> tuple[int, float]:
+    req = urllib.request.Request(url, data=json.dumps(update).encode("utf-8"), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    if secret:
+        req.add_header(SECRET_HEADER, secret)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*", help="JSON files with recorded updates")
+    ap.add_argument("--url", default="http://127.0.0.1:8080/telegram/webhook")
+    ap.add_argument("--secret", default="", help="the bot's WEBHOOK_SECRET")
+    ap.add_argument("--text", action="append", default=[], help="also post a message with this text")
+    ap.add_argument("--chat-id", type=int, default=1)
+    ap.add_argument("--timeout", type=float, default=10)
+    ap.add_argument("--out", help="write the summary JSON here instead of stdout")
+    args = ap.parse_args()
+
+    updates = load_updates(args.files)
+    first_id = max((u.get("update_id", 0) for u in updates), default=0) + 1
+    updates += [text_update(first_id + i, args.chat_id, text) for i, text in enumerate(args.text)]
+    if not updates:
+        ap.error("nothing to post: pass update files or --text")
+
+    latencies, statuses = [], {}
+    for update in updates:
+        status, elapsed = post(args.url, update, args.secret, args.timeout)
+        print(f"update {update.get('update_id')}: HTTP {status} in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        latencies.append(elapsed)
+    latencies.sort()
+    emit("replay_updates", {
+        "url": args.url,
+        "updates": len(updates),
+        "statuses": statuses,
+        "median_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
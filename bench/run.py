@@ -0,0 +1,37 @@
+"""Runs the fetch, storage, caption and rules benchmarks and writes one JSON document.
+
+    python -m bench.run --out before.json
+    python -m bench.run --quick --out after.json
+    python -m bench.compare before.json after.json
+"""
+from __future__ import annotations
+
+import argparse
+
+from bench.common import emit
+from bench.fixtures import default_pages, pages_from_dir
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--quick", action="store_true", help="smaller histories and fewer samples")
+    ap.add_argument("--selenium", action="store_true", help="include the Chrome path (needs Chrome)")
+    ap.add_argument("--pages-dir", help="directory of saved listing pages (*.html)")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args()
+
+    from bench import bench_caption, bench_fetch, bench_rules, bench_storage
+
+    repeat = 3 if args.quick else 5
+    sizes = [10_000, 100_000] if args.quick else [10_000, 100_000, 1_000_000]
+    pages = pages_from_dir(args.pages_dir) if args.pages_dir else default_pages()
+    emit("all", {
+        "fetch": bench_fetch.run(pages, repeat, args.selenium),
+        "storage": bench_storage.run(sizes, json_max=100_000, filter_counts=[10, 100, 1000], repeat=repeat),
+        "caption": bench_caption.run(repeat),
+        "rules": bench_rules.run(100_000, [10, 100, 1000], repeat),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tests import app and bench from the repository root, also when run as plain `pytest`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
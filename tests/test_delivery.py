@@ -0,0 +1,66 @@
+"""DeliveryQueue against bench.fake_bot_api, which enforces Telegram's flood limits."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from app.delivery import DeliveryQueue
+from app.parser import OlxAd
+from bench.fake_bot_api import FakeBotApi
+
+
+def _ad(n: int) -> OlxAd:
+    ad_id = str(900000000 + n)
+    return OlxAd(ad_id=ad_id, title=f"Ad {n}", price="1 000 грн", location_date="Київ - Сьогодні", size=None,
+                 url=f"https://www.olx.ua/d/uk/obyavlenie/ad-{ad_id}.html", image_url=None)
+
+
+async def _deliver(api_global: float, queue_global: float, chats: int, per_chat: int):
+    api = FakeBotApi(global_rate=api_global, chat_rate=20, chat_burst=3)
+    await api.start()
+    bot = Bot(token="1:test", session=AiohttpSession(api=TelegramAPIServer.from_base(api.base_url)))
+    queue = DeliveryQueue(bot, lambda ad: ad.url, global_rate=queue_global, per_chat_rate=10)
+    try:
+        started = time.monotonic()
+        for chat_id in range(1, chats + 1):
+            assert queue.enqueue_ads(chat_id, [_ad(chat_id * 1000 + i) for i in range(per_chat)])
+        await queue.close(timeout=60)
+        return api, time.monotonic() - started
+    finally:
+        await bot.session.close()
+        await api.close()
+
+
+def test_throughput_stays_under_flood_limits():
+    api, elapsed = asyncio.run(_deliver(api_global=30, queue_global=25, chats=5, per_chat=20))
+    assert len(api.deliveries) == 100
+    assert api.flood_rejections == {}
+    # 100 messages at 25/s, less the initial burst
+    assert elapsed < 100 / 25 + 1.5
+
+
+def test_global_flood_slows_every_chat():
+    # the queue believes it may send three times faster than the server allows
+    api, _ = asyncio.run(_deliver(api_global=10, queue_global=30, chats=20, per_chat=3))
+    assert len(api.deliveries) == 60
+    # each chat backing off on its own keeps the herd hitting the limit (about 75 rejections)
+    assert sum(api.flood_rejections.values()) < 40
+
+
+def test_full_queue_refuses_instead_of_dropping():
+    async def run():
+        bot = Bot(token="1:test")
+        queue = DeliveryQueue(bot, lambda ad: ad.url, max_pending=5)
+        assert queue.enqueue_ads(1, [_ad(i) for i in range(4)])
+        assert not queue.has_room(2)
+        assert not queue.enqueue_ads(2, [_ad(i) for i in range(2)])
+        assert queue.pending() == 4
+        for task in list(queue._tasks.values()):
+            task.cancel()
+        await bot.session.close()
+
+    asyncio.run(run())
@@ -0,0 +1,38 @@
+"""FingerprintTable: new ads, price changes and re-posts."""
+from __future__ import annotations
+
+from app.fingerprints import NEW, PRICE_CHANGED, REPOST, FingerprintTable
+from app.parser import OlxAd
+
+
+def _ad(ad_id: str, title: str = "2-кімнатна квартира", price: float = 15000) -> OlxAd:
+    return OlxAd(ad_id=ad_id, title=title, price=f"{price:.0f} грн", location_date="Київ, Поділ - Сьогодні",
+                 size="45 м²", url=f"https://www.olx.ua/d/uk/obyavlenie/ad-{ad_id}.html", image_url=None,
+                 price_value=price, currency="UAH", area_m2=45.0)
+
+
+def _kinds(table: FingerprintTable, ads) -> list:
+    return [event.kind for event in table.diff(ads)]
+
+
+def test_same_wording_in_one_batch_stays_new():
+    table = FingerprintTable(100)
+    assert _kinds(table, [_ad("1"), _ad("2"), _ad("3")]) == [NEW, NEW, NEW]
+
+
+def test_repost_needs_the_old_ad_gone():
+    table = FingerprintTable(100)
+    _kinds(table, [_ad("1"), _ad("9", title="Будинок")])
+    # the original is still listed next to the new one: a second ad, not a re-post
+    assert _kinds(table, [_ad("2"), _ad("1")]) == [NEW]
+    # both earlier ads have disappeared
+    events = table.diff([_ad("3", price=14000)])
+    assert [e.kind for e in events] == [REPOST]
+    assert events[0].old_price == 15000
+
+
+def test_price_change_of_a_known_ad():
+    table = FingerprintTable(100)
+    _kinds(table, [_ad("1")])
+    assert _kinds(table, [_ad("1", price=14500)]) == [PRICE_CHANGED]
+    assert _kinds(table, [_ad("1", price=14500)]) == []
@@ -0,0 +1,78 @@
+"""ImageCache downloads against a local aiohttp server."""
+from __future__ import annotations
+
+import asyncio
+
+from aiohttp import web
+
+from app import image_cache
+from app.image_cache import ImageCache
+
+CHUNK = 16 * 1024
+
+
+async def _chunked(request: web.Request) -> web.StreamResponse:
+    # no Content-Length: the body arrives in Transfer-Encoding: chunked pieces
+    resp = web.StreamResponse(headers={"Content-Type": "image/jpeg"})
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    for i in range(int(request.query["chunks"])):
+        await resp.write(bytes([i % 256]) * CHUNK)
+        await asyncio.sleep(0)
+    await resp.write_eof()
+    return resp
+
+
+async def _big(_request: web.Request) -> web.Response:
+    return web.Response(body=b"x" * (CHUNK * 5), content_type="image/jpeg")
+
+
+async def _status(request: web.Request) -> web.Response:
+    return web.Response(status=int(request.match_info["code"]), text="no image")
+
+
+async def _download(tmp_path, path: str) -> tuple[ImageCache, str, object]:
+    app = web.Application()
+    app.router.add_get("/chunked", _chunked)
+    app.router.add_get("/big", _big)
+    app.router.add_get("/status/{code}", _status)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{path}"
+    cache = ImageCache(str(tmp_path))
+    try:
+        cache.prefetch([url])
+        return cache, url, await cache.source(url)
+    finally:
+        await cache.close()
+        await runner.cleanup()
+
+
+def test_chunked_image_is_read_whole(tmp_path):
+    # 1 MB in 16 KB chunks
+    cache, url, source = asyncio.run(_download(tmp_path, "/chunked?chunks=64"))
+    assert str(source.path) == str(tmp_path / cache._name(url))
+    data = (tmp_path / cache._name(url)).read_bytes()
+    assert len(data) == 64 * CHUNK
+    assert data == b"".join(bytes([i]) * CHUNK for i in range(64))
+
+
+def test_oversized_images_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "MAX_IMAGE_BYTES", 4 * CHUNK)
+    # announced by Content-Length
+    _, _, source = asyncio.run(_download(tmp_path, "/big"))
+    assert source is None
+    # only found out while reading a chunked body
+    _, _, source = asyncio.run(_download(tmp_path, "/chunked?chunks=6"))
+    assert source is None
+    assert not list(tmp_path.glob("*.img"))
+
+
+def test_only_client_errors_are_remembered_as_failed(tmp_path):
+    for code, failed in ((404, True), (429, False), (503, False)):
+        cache, url, source = asyncio.run(_download(tmp_path, f"/status/{code}"))
+        # a retryable error still lets the send try the URL itself
+        assert source == (None if failed else url), code
+        assert (url in cache._failed) is failed, code
@@ -0,0 +1,37 @@
+"""SocketBroker against raw connections that send what SocketBrokerClient would not."""
+from __future__ import annotations
+
+from multiprocessing.connection import Client
+
+import pytest
+
+from app.jobqueue import SocketBroker, SocketBrokerClient, _send
+
+AUTHKEY = b"test"
+
+
+@pytest.fixture
+def broker():
+    broker = SocketBroker("127.0.0.1:0", AUTHKEY)
+    broker.start()
+    yield broker
+    broker.close()
+
+
+def _address(broker: SocketBroker) -> str:
+    host, port = broker._listener.address
+    return f"{host}:{port}"
+
+
+@pytest.mark.parametrize("frame", [[], {"op": "take"}, ["take"], ["take", "5"], ["done", "job"], ["stop", 1], 7])
+def test_bad_frames_drop_the_connection_not_the_broker(broker, frame, caplog):
+    with Client(broker._listener.address, authkey=AUTHKEY) as conn:
+        _send(conn, frame)
+        with pytest.raises(EOFError):
+            conn.recv_bytes()
+    assert "dropped a worker" in caplog.text
+    client = SocketBrokerClient(_address(broker), AUTHKEY)
+    try:
+        assert client.take(0) is None
+    finally:
+        client.close()
@@ -0,0 +1,79 @@
+"""Both Selenium extraction paths must turn the same page into the same ads."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from app.http_fetch import _parse_page, parse_listing_html
+from app.parser import _build_driver, _extract_cards_script, _extract_cards_webdriver, _Watermark
+from bench.fixtures import card_html, page_html
+
+
+def _cards() -> list[str]:
+    cards = [
+        card_html(ad_id=900_000_001, title="Оренда 1к квартири", price="12 000", location="Київ, Печерський",
+                  date="Сьогодні о 10:15", size=40, promoted=True),
+        card_html(ad_id=900_000_002, title="Студія з балконом", price="9 500", location="Львів, Франківський",
+                  date="Сьогодні о 09:40", size=25),
+        card_html(ad_id=900_000_003, title="Квартира без фото", price="15 000", location="Одеса, Приморський",
+                  date="Сьогодні о 09:05", size=55, photo=False),
+        card_html(ad_id=900_000_004, title="Вчорашня квартира", price="11 000", location="Київ, Оболонський",
+                  date="12 травня 2024 р.", size=38),
+        card_html(ad_id=900_000_005, title="Ще старіша квартира", price="8 000", location="Київ, Оболонський",
+                  date="11 травня 2024 р.", size=30),
+    ]
+    # one absolute link next to the relative ones
+    cards[1] = cards[1].replace('href="/d/uk/', 'href="https://www.olx.ua/d/uk/')
+    return cards
+
+
+def _page() -> str:
+    # the base makes the browser resolve relative links the way it does on olx.ua
+    return page_html(_cards(), padding_kb=5).replace("<head>", '<head><base href="https://www.olx.ua/">', 1)
+
+
+@pytest.fixture(scope="module")
+def driver(tmp_path_factory):
+    try:
+        drv = _build_driver(block_resources=False)
+    except Exception as e:
+        pytest.skip(f"Chrome is not available: {e}")
+    path: Path = tmp_path_factory.mktemp("listing") / "listing.html"
+    path.write_text(_page(), encoding="utf-8")
+    drv.get(path.as_uri())
+    yield drv
+    drv.quit()
+
+
+@pytest.mark.parametrize("known", [None, set(), {"900000002"}, {"900000002", "900000003"}])
+def test_script_and_webdriver_paths_agree(driver, known):
+    script_mark = _Watermark(known, 1) if known is not None else None
+    webdriver_mark = _Watermark(known, 1) if known is not None else None
+    by_script = _extract_cards_script(driver, script_mark)
+    by_webdriver = _extract_cards_webdriver(driver, webdriver_mark)
+    assert by_script == by_webdriver
+    if known is not None:
+        # a stopped scan is what keeps the next pages from loading
+        html_mark = _Watermark(known, 1)
+        _parse_page(_page(), html_mark)
+        assert script_mark.stopped == webdriver_mark.stopped == html_mark.stopped
+    if known is None:
+        assert [ad.ad_id for ad in by_script] == ["900000001", "900000002", "900000003"]
+        assert all(ad.url.startswith("https://www.olx.ua/d/uk/obyavlenie/") for ad in by_script)
+        assert by_script[2].image_url is None
+
+
+def test_html_parser_matches_browser_fields():
+    ads = parse_listing_html(_page())
+    assert [ad.ad_id for ad in ads] == ["900000001", "900000002", "900000003"]
+    assert [ad.url for ad in ads] == [f"https://www.olx.ua/d/uk/obyavlenie/kvartira-90000000{i}.html" for i in (1, 2, 3)]
+    assert [ad.area_m2 for ad in ads] == [40, 25, 55]
+    assert ads[0].price_value == 12000 and ads[2].image_url is None
+
+
+@pytest.mark.parametrize("known, ids", [(set(), ["900000001", "900000002", "900000003"]), ({"900000002"}, ["900000001"])])
+def test_html_parser_stops_at_the_watermark(known, ids):
+    watermark = _Watermark(known, 1)
+    assert [ad.ad_id for ad in _parse_page(_page(), watermark)] == ids
+    assert watermark.stopped
@@ -0,0 +1,36 @@
+"""ScrapeScheduler fan-out: pages in order, then the end-of-poll signal."""
+from __future__ import annotations
+
+import asyncio
+
+from app.parser import OlxAd
+from app.scheduler import ScrapeScheduler
+
+
+def _ad(n: int) -> OlxAd:
+    ad_id = str(900000000 + n)
+    return OlxAd(ad_id=ad_id, title=f"Ad {n}", price="1 000 грн", location_date="Київ - Сьогодні", size=None,
+                 url=f"https://www.olx.ua/d/uk/obyavlenie/ad-{ad_id}.html", image_url=None)
+
+
+def test_poll_done_follows_the_last_page_of_each_poll():
+    async def run():
+        async def stream(url, known_ids=None):
+            yield [_ad(1), _ad(2)]
+            yield [_ad(3)]
+
+        scheduler = ScrapeScheduler(interval_sec=3600, streamer=stream, watermark_size=0)
+        seen = []
+        done = asyncio.Event()
+
+        def on_poll_done():
+            seen.append("done")
+            done.set()
+
+        await scheduler.subscribe("https://www.olx.ua/uk/nedvizhimost/", lambda ads: seen.append(len(ads)),
+                                  on_poll_done=on_poll_done)
+        await asyncio.wait_for(done.wait(), 5)
+        await scheduler.close()
+        return seen
+
+    assert asyncio.run(run()) == [2, 1, "done"]
@@ -0,0 +1,102 @@
+"""Shared state on MemoryKV: feed leases moving between replicas, concurrent filter edits."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from app import leases as leases_module
+from app.filters_storage import KVFiltersStorage
+from app.kvstore import MemoryKV
+from app.leases import LeaseManager
+
+FEEDS = {f"feed:{i}" for i in range(40)}
+TTL = 30
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    # heartbeats use wall time, lease expiry the store's clock; drive both from one clock
+    monkeypatch.setattr(leases_module.time, "time", clock)
+    return clock
+
+
+def _pair(clock: Clock):
+    kv = MemoryKV(clock=clock)
+    a, b = LeaseManager(kv, "a", ttl_sec=TTL), LeaseManager(kv, "b", ttl_sec=TTL)
+    # the second sync is when each replica has seen the other's heartbeat
+    for _ in range(2):
+        a.balance(FEEDS)
+        b.balance(FEEDS)
+    return kv, a, b
+
+
+def test_replicas_split_the_feeds(clock):
+    _, a, b = _pair(clock)
+    assert a.held() | b.held() == FEEDS
+    assert not a.held() & b.held()
+    assert a.held() and b.held()
+
+
+def test_feeds_move_once_a_dead_replica_lease_expires(clock):
+    _, a, b = _pair(clock)
+    a_feeds = a.held()
+    # "a" stops renewing; its leases are still valid for a while
+    clock.now += TTL / 3
+    b.balance(FEEDS)
+    assert not b.held() & a_feeds
+    clock.now += TTL
+    assert b.balance(FEEDS) == FEEDS
+
+
+def test_released_feeds_move_at_the_next_sync(clock):
+    _, a, b = _pair(clock)
+    a.release_all()
+    assert b.balance(FEEDS) == FEEDS
+
+
+def test_returning_replica_gets_its_share_back(clock):
+    _, a, b = _pair(clock)
+    a_feeds = a.held()
+    a.release_all()
+    b.balance(FEEDS)
+    # "a" is back: nothing is free yet, so it waits for "b" to hand its share over
+    assert not a.balance(FEEDS)
+    b.balance(FEEDS)
+    assert a.balance(FEEDS) == a_feeds
+    assert not a.held() & b.held()
+
+
+class SlowReadKV(MemoryKV):
+    """Gives other threads time to write between a read and the write that follows it."""
+
+    def hget(self, key, field):
+        value = super().hget(key, field)
+        time.sleep(0.001)
+        return value
+
+
+def test_concurrent_filter_edits_are_not_lost():
+    kv = SlowReadKV()
+    replicas = [KVFiltersStorage(kv), KVFiltersStorage(kv)]
+
+    def edit(storage: KVFiltersStorage, prefix: str) -> None:
+        for i in range(30):
+            storage.upsert(f"{prefix}{i}", f"https://www.olx.ua/{prefix}{i}/", chat_id=7)
+
+    threads = [threading.Thread(target=edit, args=(s, p)) for s, p in zip(replicas, "ab")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(replicas[0].list_names(7)) == 60